@@ -1,5 +1,4 @@
 import logging
-from gym.envs.registration import register
 
 logger = logging.getLogger(__name__)
 
@@ -7,6 +6,9 @@ logger = logging.getLogger(__name__)
 def pass_params(env_name, sumo_params, sumo_binary, 
                         type_params, env_params, net_params,
                         cfg_params, initial_config, scenario):
+    # gym is only imported when needed, since it is slow to import
+    from gym.envs.registration import register
+
     num_steps = 500
     if "num_steps" in env_params.additional_params:
         num_steps = env_params.get_additional_param["num_steps"]
@@ -0,0 +1,14 @@
+"""Throughput benchmarks of the scenarios shipped with flow.
+
+Every benchmark (see flow.benchmarks.scenarios.BENCHMARKS) builds one of the
+canonical scenario/environment pairs of examples/sumo at a given size (e.g.
+a number of vehicles or a scaling factor of the network), and runs it
+without the gui for a fixed horizon. The time taken to build the scenario
+and the environment, the latency of a reset, the number of steps per second,
+and the peak memory used are reported as json. Results may be compared with
+those of a previous run in order to detect regressions (see
+flow.benchmarks.run).
+
+The time taken to import flow in a new process, as a worker would, is
+measured separately by flow.benchmarks.imports.
+"""
@@ -0,0 +1,158 @@
+"""Measures the time taken to import flow in a new process.
+
+Every benchmark (see IMPORT_BENCHMARKS) runs an import statement in a new
+python interpreter, as a worker process would when it is spawned, and
+reports the time taken by the statement along with the heavy dependencies
+(see HEAVY_MODULES) it loaded. The time taken to start the interpreter
+itself is not included.
+
+Attributes
+----------
+EXAMPLE_USAGE : str
+    Example call to the script, which is
+    ::
+        python -m flow.benchmarks.imports --output imports.json
+
+parser : ArgumentParser
+    Command-line argument parser
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+EXAMPLE_USAGE = """
+example usage:
+    python -m flow.benchmarks.imports
+    python -m flow.benchmarks.imports one_env --repeats 10
+
+The first call measures the time taken by all import statements, and the
+second call the time taken by a worker to import a single environment.
+"""
+
+# default number of new processes every import statement is timed in
+DEFAULT_REPEATS = 5
+
+# Key = name of the benchmark, Element = import statement
+IMPORT_BENCHMARKS = {
+    "flow": "import flow",
+    "one_env": "from flow.envs import AccelEnv",
+    "all_envs": "from flow.envs import *",
+    "one_scenario": "from flow.scenarios import LoopScenario",
+    "all_scenarios": "from flow.scenarios import *",
+    "controllers": "from flow.controllers import *",
+}
+
+# dependencies of flow that are slow to import
+HEAVY_MODULES = ["gym", "scipy", "traci", "sumolib", "lxml", "ray", "rllab",
+                 "matplotlib", "tensorflow"]
+
+# script run by the new processes, which prints the time taken by the import
+# statement and the heavy modules it loaded as json
+_SCRIPT = """
+import json, sys, time
+t = time.perf_counter()
+{statement}
+duration = time.perf_counter() - t
+print(json.dumps({{"time": duration, "modules": [
+    m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement, repeats=DEFAULT_REPEATS):
+    """Times an import statement, each time in a new python interpreter.
+
+    Parameters
+    ----------
+    statement : str
+        import statement
+    repeats : int, optional
+        number of new interpreters the statement is timed in
+
+    Returns
+    -------
+    dict
+        the statement, the minimum and median times taken by the statement
+        (in s), and the heavy modules it loaded ("modules")
+    """
+    times = []
+    modules = []
+    for _ in range(repeats):
+        output = subprocess.check_output(
+            [sys.executable, "-c",
+             _SCRIPT.format(statement=statement, modules=HEAVY_MODULES)])
+        # the result is printed last, after anything printed by flow
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        times.append(result["time"])
+        modules = result["modules"]
+
+    times.sort()
+    return {"statement": statement,
+            "min_time": times[0],
+            "median_time": times[len(times) // 2],
+            "modules": modules}
+
+
+def run_import_benchmarks(names=None, repeats=DEFAULT_REPEATS):
+    """Runs several import benchmarks.
+
+    Parameters
+    ----------
+    names : list<str>, optional
+        names of the benchmarks, defaults to all benchmarks
+    repeats : int, optional
+        number of new interpreters every statement is timed in
+
+    Returns
+    -------
+    list<dict>
+        the name of every benchmark, along with its results (see
+        time_import)
+    """
+    names = list(IMPORT_BENCHMARKS) if names is None else names
+    unknown = [name for name in names if name not in IMPORT_BENCHMARKS]
+    if unknown:
+        raise ValueError("Unknown benchmarks: {}. Available benchmarks are: "
+                         "{}.".format(unknown, list(IMPORT_BENCHMARKS)))
+
+    results = []
+    for name in names:
+        result = time_import(IMPORT_BENCHMARKS[name], repeats)
+        result["name"] = name
+        print("{name}: {median_time:.3f} s ({statement}), loads {modules}"
+              .format(**result))
+        results.append(result)
+    return results
+
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="[Flow] Measures the time taken to import flow in a new "
+                "process.", epilog=EXAMPLE_USAGE)
+
+parser.add_argument("benchmarks", type=str, nargs="*",
+                    help="Benchmarks to run, defaults to all of them. "
+                         "Available benchmarks are: {}."
+                         .format(", ".join(IMPORT_BENCHMARKS)))
+parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                    help="Number of new processes every import statement is "
+                         "timed in.")
+parser.add_argument("--output", type=str,
+                    help="Path to the json file the results are written to.")
+
+
+def main(args=None):
+    args = parser.parse_args(args)
+
+    results = run_import_benchmarks(names=args.benchmarks or None,
+                                    repeats=args.repeats)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Runs the throughput benchmarks of flow, and detects regressions.
+
+Attributes
+----------
+EXAMPLE_USAGE : str
+    Example call to the script, which is
+    ::
+        python -m flow.benchmarks.run --output results.json
+
+parser : ArgumentParser
+    Command-line argument parser
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import sys
+import time
+
+from flow.core.params import SumoParams
+from flow.benchmarks.scenarios import BENCHMARKS
+
+EXAMPLE_USAGE = """
+example usage:
+    python -m flow.benchmarks.run --output baseline.json
+    python -m flow.benchmarks.run sugiyama grid --horizon 500 \\
+        --baseline baseline.json
+
+The first call runs all benchmarks at their default sizes, and stores the
+results in baseline.json. The second call runs two of the benchmarks, and
+exits with a non-zero status if any of their results regressed with respect
+to the results stored in baseline.json.
+"""
+
+# default number of steps every benchmark is run for
+DEFAULT_HORIZON = 1000
+
+# default number of resets whose latency is averaged
+DEFAULT_NUM_RESETS = 3
+
+# default relative change in a result that is considered a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Key = result of a benchmark, Element = whether larger values are better
+METRICS = {
+    "build_time": False,
+    "start_time": False,
+    "reset_latency": False,
+    "steps_per_sec": True,
+    "peak_rss": False,
+}
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the current process (in MB), or
+    None if it is not available on this platform."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # the peak rss is given in bytes on macOS, and in kB elsewhere
+    if sys.platform == "darwin":
+        return peak_rss / 1024 ** 2
+    return peak_rss / 1024
+
+
+def run_benchmark(name, size, horizon=DEFAULT_HORIZON,
+                  num_resets=DEFAULT_NUM_RESETS):
+    """Runs a benchmark at a given size.
+
+    Parameters
+    ----------
+    name : str
+        name of the benchmark (see flow.benchmarks.scenarios.BENCHMARKS)
+    size : int
+        size of the scenario
+    horizon : int, optional
+        number of steps the environment is run for
+    num_resets : int, optional
+        number of resets whose latency is averaged
+
+    Returns
+    -------
+    dict
+        the name and size of the benchmark, the time taken to build the
+        scenario ("build_time") and to start the environment ("start_time"),
+        the average duration of a reset ("reset_latency"), the number of
+        steps performed and the number of steps per second, all times being
+        in s, and the peak resident set size of the process ("peak_rss", in
+        MB)
+    """
+    build, _, sim_step = BENCHMARKS[name]
+
+    t = time.perf_counter()
+    scenario, env_class, env_params = build(size, horizon)
+    build_time = time.perf_counter() - t
+
+    t = time.perf_counter()
+    env = env_class(env_params,
+                    SumoParams(sim_step=sim_step, sumo_binary="sumo"),
+                    scenario)
+    start_time = time.perf_counter() - t
+
+    try:
+        t = time.perf_counter()
+        for _ in range(num_resets):
+            env.reset()
+        reset_latency = (time.perf_counter() - t) / max(num_resets, 1)
+
+        num_steps = 0
+        t = time.perf_counter()
+        for _ in range(horizon):
+            _, _, done, _ = env.step(rl_actions=[])
+            num_steps += 1
+            if done:
+                break
+        duration = time.perf_counter() - t
+    finally:
+        env.terminate()
+
+    return {
+        "name": name,
+        "size": size,
+        "build_time": build_time,
+        "start_time": start_time,
+        "reset_latency": reset_latency,
+        "num_steps": num_steps,
+        "steps_per_sec": num_steps / duration if duration > 0 else 0,
+        "peak_rss": get_peak_rss(),
+    }
+
+
+def run_benchmarks(names=None, sizes=None, horizon=DEFAULT_HORIZON,
+                   num_resets=DEFAULT_NUM_RESETS, isolate=True):
+    """Runs several benchmarks, each at several sizes.
+
+    Parameters
+    ----------
+    names : list<str>, optional
+        names of the benchmarks, defaults to all benchmarks
+    sizes : list<int>, optional
+        sizes the benchmarks are run at, defaults to the sizes of every
+        benchmark in flow.benchmarks.scenarios.BENCHMARKS
+    horizon : int, optional
+        number of steps every environment is run for
+    num_resets : int, optional
+        number of resets whose latency is averaged
+    isolate : bool, optional
+        specifies whether every benchmark is run in a new process, so that
+        its peak memory is measured separately and it is not affected by the
+        previous benchmarks
+
+    Returns
+    -------
+    list<dict>
+        the results of every benchmark, see run_benchmark. The results of
+        the benchmarks that failed only contain their name, size, and the
+        error raised ("error").
+    """
+    names = list(BENCHMARKS) if names is None else names
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError("Unknown benchmarks: {}. Available benchmarks are: "
+                         "{}.".format(unknown, list(BENCHMARKS)))
+
+    results = []
+    for name in names:
+        for size in (BENCHMARKS[name][1] if sizes is None else sizes):
+            try:
+                if isolate:
+                    with concurrent.futures.ProcessPoolExecutor(
+                            max_workers=1,
+                            mp_context=multiprocessing.get_context("spawn")) \
+                            as executor:
+                        result = executor.submit(run_benchmark, name, size,
+                                                 horizon, num_resets).result()
+                else:
+                    result = run_benchmark(name, size, horizon, num_resets)
+            except Exception as e:
+                # keep running the other benchmarks
+                result = {"name": name, "size": size, "error": repr(e)}
+                print("{} (size {}) failed: {!r}".format(name, size, e))
+            else:
+                print("{name} (size {size}): {steps_per_sec:.1f} steps/s, "
+                      "reset {reset_latency:.3f} s, build {build_time:.3f} s"
+                      .format(**result))
+            results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compares the results of benchmarks with those of a previous run.
+
+    Parameters
+    ----------
+    results : list<dict>
+        results of the benchmarks, see run_benchmarks
+    baseline : list<dict>
+        results of a previous run of the benchmarks. Benchmarks that are not
+        in the baseline (with the same name and size) are not compared.
+    tolerance : float, optional
+        relative change in a result that is considered a regression
+
+    Returns
+    -------
+    list<dict>
+        the regressions, each with the name and size of the benchmark, the
+        metric that regressed, and its value in the results and the baseline
+    """
+    baseline = {(b["name"], b["size"]): b for b in baseline}
+
+    regressions = []
+    for result in results:
+        base = baseline.get((result["name"], result["size"]))
+        if base is None:
+            continue
+        if "error" in result and "error" not in base:
+            regressions.append({"name": result["name"],
+                                "size": result["size"],
+                                "metric": "error",
+                                "value": result["error"],
+                                "baseline": None})
+            continue
+        for metric, larger_is_better in METRICS.items():
+            value, base_value = result.get(metric), base.get(metric)
+            if value is None or base_value is None:
+                continue
+            if larger_is_better:
+                regressed = value < base_value * (1 - tolerance)
+            else:
+                regressed = value > base_value * (1 + tolerance)
+            if regressed:
+                regressions.append({"name": result["name"],
+                                    "size": result["size"],
+                                    "metric": metric,
+                                    "value": value,
+                                    "baseline": base_value})
+    return regressions
+
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    description="[Flow] Measures the throughput of the scenarios shipped "
+                "with flow.", epilog=EXAMPLE_USAGE)
+
+parser.add_argument("benchmarks", type=str, nargs="*",
+                    help="Benchmarks to run, defaults to all of them. "
+                         "Available benchmarks are: {}."
+                         .format(", ".join(BENCHMARKS)))
+parser.add_argument("--sizes", type=int, nargs="+",
+                    help="Sizes of the scenarios (e.g. number of vehicles), "
+                         "defaults to the sizes of every benchmark.")
+parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON,
+                    help="Number of steps every scenario is run for.")
+parser.add_argument("--num_resets", type=int, default=DEFAULT_NUM_RESETS,
+                    help="Number of resets whose latency is averaged.")
+parser.add_argument("--output", type=str,
+                    help="Path to the json file the results are written to.")
+parser.add_argument("--baseline", type=str,
+                    help="Path to the results of a previous run. The exit "
+                         "status is non-zero if any result regressed.")
+parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                    help="Relative change in a result considered a "
+                         "regression.")
+parser.add_argument("--no_isolate", action="store_true",
+                    help="Runs all benchmarks in the current process.")
+
+
+def main(args=None):
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(names=args.benchmarks or None,
+                             sizes=args.sizes,
+                             horizon=args.horizon,
+                             num_resets=args.num_resets,
+                             isolate=not args.no_isolate)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION {name} (size {size}): {metric} = {value}, "
+                  "baseline {baseline}".format(**r))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""Scenario/environment pairs benchmarked by flow.benchmarks.run.
+
+Every function below mirrors the corresponding script in examples/sumo, with
+the size of the scenario (a number of vehicles, an inflow rate, or a scaling
+factor of the network, see BENCHMARKS) left as a parameter. The networks are
+made larger as the number of vehicles grows, so that the density of traffic
+remains close to that of the example. The functions return the scenario,
+along with the class and parameters of the environment, so that the time
+taken to build the scenario and to start the environment may be measured
+separately.
+"""
+
+from flow.controllers import IDMController, ContinuousRouter, \
+    StaticLaneChanger, SumoLaneChangeController
+from flow.controllers.routing_controllers import GridRouter
+from flow.core.params import EnvParams, NetParams, \
+    InitialConfig, InFlows, SumoCarFollowingParams, SumoLaneChangeParams
+from flow.core.vehicles import Vehicles
+from flow.envs.loop.loop_accel import AccelEnv, \
+    ADDITIONAL_ENV_PARAMS as ACCEL_ENV_PARAMS
+from flow.envs.merge import WaveAttenuationMergePOEnv, \
+    ADDITIONAL_ENV_PARAMS as MERGE_ENV_PARAMS
+from flow.envs.bottleneck_env import BottleneckEnv
+from flow.scenarios.loop.gen import CircleGenerator
+from flow.scenarios.loop.loop_scenario import LoopScenario, \
+    ADDITIONAL_NET_PARAMS as LOOP_NET_PARAMS
+from flow.scenarios.figure8.gen import Figure8Generator
+from flow.scenarios.figure8.figure8_scenario import Figure8Scenario, \
+    ADDITIONAL_NET_PARAMS as FIGURE8_NET_PARAMS
+from flow.scenarios.grid.gen import SimpleGridGenerator
+from flow.scenarios.grid.grid_scenario import SimpleGridScenario
+from flow.scenarios.highway.gen import HighwayGenerator
+from flow.scenarios.highway.scenario import HighwayScenario, \
+    ADDITIONAL_NET_PARAMS as HIGHWAY_NET_PARAMS
+from flow.scenarios.merge.gen import MergeGenerator
+from flow.scenarios.merge.scenario import MergeScenario, \
+    ADDITIONAL_NET_PARAMS as MERGE_NET_PARAMS
+from flow.scenarios.bridge_toll.gen import BBTollGenerator
+from flow.scenarios.bridge_toll.scenario import BBTollScenario
+from flow.scenarios.loop_merge.gen import TwoLoopOneMergingGenerator
+from flow.scenarios.loop_merge.scenario import TwoLoopsOneMergingScenario, \
+    ADDITIONAL_NET_PARAMS as LOOP_MERGE_NET_PARAMS
+
+
+def sugiyama(size, horizon):
+    """Ring road with "size" IDM vehicles (22 in the example)."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="idm",
+                 acceleration_controller=(IDMController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=size)
+
+    additional_net_params = LOOP_NET_PARAMS.copy()
+    additional_net_params["length"] = max(230, 230 * size / 22)
+
+    scenario = LoopScenario(name="sugiyama",
+                            generator_class=CircleGenerator,
+                            vehicles=vehicles,
+                            net_params=NetParams(
+                                additional_params=additional_net_params),
+                            initial_config=InitialConfig(bunching=20))
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=ACCEL_ENV_PARAMS)
+    return scenario, AccelEnv, env_params
+
+
+def figure_eight(size, horizon):
+    """Figure eight with "size" IDM vehicles (14 in the example)."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="idm",
+                 acceleration_controller=(IDMController, {}),
+                 lane_change_controller=(StaticLaneChanger, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 initial_speed=0,
+                 num_vehicles=size)
+
+    additional_net_params = FIGURE8_NET_PARAMS.copy()
+    additional_net_params["radius_ring"] = max(30, 30 * size / 14)
+
+    scenario = Figure8Scenario(name="figure8",
+                               generator_class=Figure8Generator,
+                               vehicles=vehicles,
+                               net_params=NetParams(
+                                   no_internal_links=False,
+                                   additional_params=additional_net_params))
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=ACCEL_ENV_PARAMS)
+    return scenario, AccelEnv, env_params
+
+
+def grid(size, horizon):
+    """2x3 grid with "size" vehicles starting on every outer edge (20 in the
+    example)."""
+    row_num, col_num = 2, 3
+    grid_array = {"short_length": max(300, 15 * size), "inner_length": 300,
+                  "long_length": 500,
+                  "row_num": row_num, "col_num": col_num,
+                  "cars_left": size, "cars_right": size,
+                  "cars_top": size, "cars_bot": size}
+
+    vehicles = Vehicles()
+    vehicles.add(veh_id="human",
+                 routing_controller=(GridRouter, {}),
+                 num_vehicles=2 * size * (row_num + col_num))
+
+    additional_net_params = {"grid_array": grid_array, "speed_limit": 35,
+                             "horizontal_lanes": 1, "vertical_lanes": 1,
+                             "traffic_lights": True}
+
+    scenario = SimpleGridScenario(name="grid-intersection",
+                                  generator_class=SimpleGridGenerator,
+                                  vehicles=vehicles,
+                                  net_params=NetParams(
+                                      no_internal_links=False,
+                                      additional_params=additional_net_params),
+                                  initial_config=InitialConfig())
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=ACCEL_ENV_PARAMS)
+    return scenario, AccelEnv, env_params
+
+
+def highway(size, horizon):
+    """Four-lane highway with "size" initial vehicles (40 in the example),
+    and inflows."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="human",
+                 acceleration_controller=(IDMController, {}),
+                 num_vehicles=size // 2)
+    vehicles.add(veh_id="human2",
+                 acceleration_controller=(IDMController, {}),
+                 num_vehicles=size - size // 2)
+
+    inflow = InFlows()
+    inflow.add(veh_type="human", edge="highway", probability=0.25,
+               departLane="free", departSpeed=20)
+    inflow.add(veh_type="human2", edge="highway", probability=0.25,
+               departLane="free", departSpeed=20)
+
+    additional_net_params = HIGHWAY_NET_PARAMS.copy()
+    additional_net_params["length"] = max(1000, 25 * size)
+
+    scenario = HighwayScenario(name="highway",
+                               generator_class=HighwayGenerator,
+                               vehicles=vehicles,
+                               net_params=NetParams(
+                                   in_flows=inflow,
+                                   additional_params=additional_net_params),
+                               initial_config=InitialConfig(
+                                   spacing="uniform",
+                                   lanes_distribution=4,
+                                   shuffle=True))
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=ACCEL_ENV_PARAMS)
+    return scenario, AccelEnv, env_params
+
+
+def merge(size, horizon):
+    """Merge with an inflow of "size" veh/hr on the highway (1800 in the
+    example)."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="human",
+                 acceleration_controller=(IDMController, {"noise": 0.2}),
+                 num_vehicles=5)
+
+    inflow = InFlows()
+    inflow.add(veh_type="human", edge="inflow_highway", vehs_per_hour=size,
+               departLane="free", departSpeed=10)
+    inflow.add(veh_type="human", edge="inflow_merge", vehs_per_hour=100,
+               departLane="free", departSpeed=7.5)
+
+    additional_net_params = MERGE_NET_PARAMS.copy()
+    additional_net_params["merge_lanes"] = 1
+    additional_net_params["highway_lanes"] = 1
+    additional_net_params["pre_merge_length"] = 500
+
+    scenario = MergeScenario(name="merge-baseline",
+                             generator_class=MergeGenerator,
+                             vehicles=vehicles,
+                             net_params=NetParams(
+                                 in_flows=inflow,
+                                 no_internal_links=False,
+                                 additional_params=additional_net_params),
+                             initial_config=InitialConfig(
+                                 spacing="uniform",
+                                 perturbation=5.0,
+                                 lanes_distribution=float("inf")))
+    env_params = EnvParams(horizon=horizon, sims_per_step=5,
+                           additional_params=MERGE_ENV_PARAMS)
+    return scenario, WaveAttenuationMergePOEnv, env_params
+
+
+def bottleneck(size, horizon):
+    """Bay bridge toll bottleneck, whose number of lanes is scaled by "size"
+    (1 in the example), with an inflow of 1800 veh/hr per unit of scaling."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="human",
+                 speed_mode=25,
+                 lane_change_controller=(SumoLaneChangeController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 lane_change_mode=1621,
+                 num_vehicles=1)
+
+    additional_env_params = {"target_velocity": 40,
+                             "max_accel": 1,
+                             "max_decel": 1,
+                             "lane_change_duration": 5,
+                             "add_rl_if_exit": False,
+                             "disable_tb": True,
+                             "disable_ramp_metering": True}
+
+    inflow = InFlows()
+    inflow.add(veh_type="human", edge="1", vehs_per_hour=1800 * size,
+               departLane="random", departSpeed=10)
+
+    scenario = BBTollScenario(name="bay_bridge_toll",
+                              generator_class=BBTollGenerator,
+                              vehicles=vehicles,
+                              net_params=NetParams(
+                                  in_flows=inflow,
+                                  no_internal_links=False,
+                                  additional_params={"scaling": size}),
+                              initial_config=InitialConfig(
+                                  spacing="random", min_gap=5,
+                                  lanes_distribution=float("inf"),
+                                  edges_distribution=["2", "3", "4", "5"]))
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=additional_env_params)
+    return scenario, BottleneckEnv, env_params
+
+
+def two_loops_merge_straight(size, horizon):
+    """Two loops connected by a merge, with "size" vehicles in the inner
+    loop and 10 / 7 * size merging vehicles (7 and 10 in the example)."""
+    vehicles = Vehicles()
+    vehicles.add(veh_id="idm",
+                 acceleration_controller=(IDMController, {}),
+                 lane_change_controller=(SumoLaneChangeController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=size,
+                 sumo_car_following_params=SumoCarFollowingParams(
+                     minGap=0.0, tau=0.5),
+                 sumo_lc_params=SumoLaneChangeParams())
+    vehicles.add(veh_id="merge-idm",
+                 acceleration_controller=(IDMController, {}),
+                 lane_change_controller=(SumoLaneChangeController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=int(round(10 / 7 * size)),
+                 sumo_car_following_params=SumoCarFollowingParams(
+                     minGap=0.01, tau=0.5),
+                 sumo_lc_params=SumoLaneChangeParams())
+
+    additional_net_params = LOOP_MERGE_NET_PARAMS.copy()
+    additional_net_params["ring_radius"] = max(50, 50 * size / 7)
+    additional_net_params["inner_lanes"] = 1
+    additional_net_params["outer_lanes"] = 1
+    additional_net_params["lane_length"] = 75
+
+    scenario = TwoLoopsOneMergingScenario(
+        name="two-loop-one-merging",
+        generator_class=TwoLoopOneMergingGenerator,
+        vehicles=vehicles,
+        net_params=NetParams(no_internal_links=False,
+                             additional_params=additional_net_params),
+        initial_config=InitialConfig(
+            x0=50, spacing="uniform",
+            additional_params={"merge_bunching": 0}))
+    env_params = EnvParams(horizon=horizon,
+                           additional_params=ACCEL_ENV_PARAMS)
+    return scenario, AccelEnv, env_params
+
+
+# Key = name of the benchmark
+# Element = (function building the scenario and environment, sizes of the
+# scenario benchmarked by default, duration of a simulation step)
+BENCHMARKS = {
+    "sugiyama": (sugiyama, [22, 88, 220], 0.1),
+    "figure_eight": (figure_eight, [14, 56], 0.1),
+    "grid": (grid, [20, 80], 0.1),
+    "highway": (highway, [40, 160], 0.1),
+    "merge": (merge, [1800, 3600], 0.2),
+    "bottleneck": (bottleneck, [1, 2], 0.5),
+    "two_loops_merge_straight": (two_loops_merge_straight, [7, 28], 0.1),
+}
@@ -3,4 +3,4 @@ Contains default config variables, which may be overridden by a user config.
 """
 
 PYTHON_COMMAND = "python"
-SUMO_SLEEP = 1.0  # Delay between initializing SUMO and connecting with TraCI
+NET_CACHE_PATH = None  # Directory of the net cache, ~/.cache/flow/net if None
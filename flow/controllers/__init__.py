@@ -1,24 +1,9 @@
-# RL controller
-from flow.controllers.rlcontroller import RLController
+"""Controllers of the vehicles of flow.
 
-# acceleration controllers
-from flow.controllers.base_controller import BaseController
-from flow.controllers.car_following_models import CFMController, \
-    BCMController, OVMController, LinearOVM, IDMController, \
-    SumoCarFollowingController
-from flow.controllers.velocity_controllers import FollowerStopper, \
-    PISaturation, HandTunedVelocityController
-
-# lane change controllers
-from flow.controllers.base_lane_changing_controller import \
-    BaseLaneChangeController
-from flow.controllers.lane_change_controllers import StaticLaneChanger, \
-    SumoLaneChangeController
-
-# routing controllers
-from flow.controllers.base_routing_controller import BaseRouter
-from flow.controllers.routing_controllers import ContinuousRouter, \
-    GridRouter, BayBridgeRouter
+The controllers are imported from their modules the first time they are
+accessed (see flow.core.lazy_import).
+"""
+from flow.core.lazy_import import lazy_attributes
 
 __all__ = ["RLController", "BaseController", "BaseLaneChangeController",
            "BaseRouter", "CFMController", "BCMController", "OVMController",
@@ -26,3 +11,32 @@ __all__ = ["RLController", "BaseController", "BaseLaneChangeController",
            "FollowerStopper", "PISaturation", "HandTunedVelocityController",
            "StaticLaneChanger", "SumoLaneChangeController", "ContinuousRouter",
            "GridRouter", "BayBridgeRouter"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, globals(), {
+    # RL controller
+    "RLController": "flow.controllers.rlcontroller",
+
+    # acceleration controllers
+    "BaseController": "flow.controllers.base_controller",
+    "CFMController": "flow.controllers.car_following_models",
+    "BCMController": "flow.controllers.car_following_models",
+    "OVMController": "flow.controllers.car_following_models",
+    "LinearOVM": "flow.controllers.car_following_models",
+    "IDMController": "flow.controllers.car_following_models",
+    "SumoCarFollowingController": "flow.controllers.car_following_models",
+    "FollowerStopper": "flow.controllers.velocity_controllers",
+    "PISaturation": "flow.controllers.velocity_controllers",
+    "HandTunedVelocityController": "flow.controllers.velocity_controllers",
+
+    # lane change controllers
+    "BaseLaneChangeController":
+        "flow.controllers.base_lane_changing_controller",
+    "StaticLaneChanger": "flow.controllers.lane_change_controllers",
+    "SumoLaneChangeController": "flow.controllers.lane_change_controllers",
+
+    # routing controllers
+    "BaseRouter": "flow.controllers.base_routing_controller",
+    "ContinuousRouter": "flow.controllers.routing_controllers",
+    "GridRouter": "flow.controllers.routing_controllers",
+    "BayBridgeRouter": "flow.controllers.routing_controllers",
+})
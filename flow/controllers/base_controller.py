@@ -2,6 +2,12 @@ import numpy as np
 
 
 class BaseController:
+
+    # names of the attributes, besides those of the BaseController, that
+    # parametrize the acceleration computed by get_accel_batch. Controllers
+    # whose attributes are all equal share a batch (see batch_key)
+    batch_params = ()
+
     def __init__(self,
                  veh_id,
                  sumo_cf_params,
@@ -58,6 +64,111 @@ class BaseController:
         """Returns the acceleration of the controller"""
         raise NotImplementedError
 
+    def batch_key(self):
+        """Returns a key shared by all controllers whose actions may be
+        computed in a single batch (see get_action_batch).
+
+        Controllers share a batch if they are of the same class and have the
+        same parameters.
+        """
+        return (type(self), self.accel_noise, self.delay, self.fail_safe,
+                self.max_accel, self.max_deaccel) + \
+            tuple(getattr(self, name) for name in self.batch_params)
+
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        """Returns the accelerations of several vehicles using this
+        controller class and sharing the same parameters.
+
+        By default, the get_accel method of each vehicle's controller is
+        called. Controllers can overwrite this method to compute the
+        accelerations of all vehicles in a single vectorized operation.
+
+        Parameters
+        ----------
+        env: Env Type
+            state of the environment at the current time step
+        veh_ids: list<str>
+            names of the vehicles
+
+        Returns
+        -------
+        list<float> or np.ndarray
+            acceleration of every vehicle
+        """
+        return [env.vehicles.get_acc_controller(veh_id).get_accel(env)
+                for veh_id in veh_ids]
+
+    @classmethod
+    def get_action_batch(cls, env, veh_ids):
+        """Converts the get_accel_batch() accelerations into actions.
+
+        This is the batch equivalent of get_action, and is used by the
+        environment to compute the actions of all vehicles that share a
+        controller class and parameters (see batch_key) at once. Noise and
+        failsafes are applied to all accelerations in a single vectorized
+        operation.
+
+        If the controller class does not provide a vectorized get_accel_batch
+        (or overwrites get_accel or get_action of a class that does), the
+        get_action method of each vehicle's controller is called instead.
+
+        Parameters
+        ----------
+        env: Env Type
+            state of the environment at the current time step
+        veh_ids: list<str>
+            names of the vehicles
+
+        Returns
+        -------
+        list<float>
+            the modified form of the acceleration of every vehicle
+        """
+        if len(veh_ids) == 0:
+            return []
+
+        if not cls._has_vectorized_accel():
+            return [env.vehicles.get_acc_controller(veh_id).get_action(env)
+                    for veh_id in veh_ids]
+
+        # all vehicles share the parameters of the first controller
+        controller = env.vehicles.get_acc_controller(veh_ids[0])
+
+        accel = np.array(cls.get_accel_batch(env, veh_ids), dtype=float)
+
+        # add noise to the accelerations, if requested
+        if controller.accel_noise > 0:
+            accel += np.random.normal(0, controller.accel_noise, len(accel))
+
+        # run the failsafes, if requested
+        if controller.fail_safe == 'instantaneous':
+            accel = cls.get_safe_action_instantaneous_batch(
+                env, veh_ids, accel)
+        elif controller.fail_safe == 'safe_velocity':
+            accel = cls.get_safe_velocity_action_batch(
+                env, veh_ids, accel, controller.delay)
+
+        return accel.tolist()
+
+    @classmethod
+    def _has_vectorized_accel(cls):
+        """Checks whether the class provides a vectorized get_accel_batch
+        that is consistent with its get_accel and get_action methods."""
+        for klass in cls.__mro__:
+            if klass is BaseController:
+                return False
+            if "get_accel_batch" in vars(klass):
+                return True
+            if "get_accel" in vars(klass) or "get_action" in vars(klass):
+                return False
+        return False
+
+    @staticmethod
+    def has_leader(lead_ids):
+        """Returns a boolean array specifying which of the leaders exist."""
+        return np.array([bool(lead_id) for lead_id in lead_ids], dtype=bool)
+
     def get_action(self, env):
         """Converts the get_accel() acceleration into an action.
 
@@ -148,6 +259,45 @@ class BaseController:
         else:
             return action
 
+    @classmethod
+    def get_safe_action_instantaneous_batch(cls, env, veh_ids, action):
+        """Batch equivalent of get_safe_action_instantaneous.
+
+        Parameters
+        ----------
+        env: Environment type
+            current environment, which contains information of the state of the
+            network at the current time step
+        veh_ids: list<str>
+            names of the vehicles
+        action: np.ndarray
+            requested acceleration action of every vehicle
+
+        Returns
+        -------
+        np.ndarray
+            the requested actions if they do not lead to a crash; and stopping
+            actions otherwise
+        """
+        # if there is only one vehicle in the network, all actions are safe
+        if env.vehicles.num_vehicles == 1:
+            return action
+
+        has_lead = cls.has_leader(env.vehicles.get_leader(veh_ids))
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+        sim_step = env.sim_step
+        next_vel = this_vel + action * sim_step
+        h = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+
+        # vehicles that would crash into the vehicle ahead of them in the next
+        # time step (assuming the vehicle ahead of it is not moving) stop
+        # immediately
+        unsafe = has_lead & (next_vel > 0) & \
+            (h < sim_step * next_vel + this_vel * 1e-3 +
+             0.5 * this_vel * sim_step)
+
+        return np.where(unsafe, -this_vel / sim_step, action)
+
     def get_safe_velocity_action(self, env, action):
         """Performs the "safe_velocity" failsafe action.
 
@@ -185,6 +335,43 @@ class BaseController:
             else:
                 return action
 
+    @classmethod
+    def get_safe_velocity_action_batch(cls, env, veh_ids, action, delay):
+        """Batch equivalent of get_safe_velocity_action.
+
+        Parameters
+        ----------
+        env: Environment type
+            current environment, which contains information of the state of the
+            network at the current time step
+        veh_ids: list<str>
+            names of the vehicles
+        action: np.ndarray
+            requested acceleration action of every vehicle
+        delay: float
+            delay in applying the action shared by the vehicles
+
+        Returns
+        -------
+        np.ndarray
+            the requested actions clipped by the safe velocities
+        """
+        # if there is only one vehicle in the network, all actions are safe
+        if env.vehicles.num_vehicles == 1:
+            return action
+
+        safe_velocity = cls.safe_velocity_batch(env, veh_ids, delay)
+
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+        sim_step = env.sim_step
+
+        clipped = np.where(safe_velocity > 0,
+                           (safe_velocity - this_vel) / sim_step,
+                           -this_vel / sim_step)
+
+        return np.where(this_vel + action * sim_step > safe_velocity,
+                        clipped, action)
+
     def safe_velocity(self, env):
         """Finds maximum velocity such that if the lead vehicle were to stop
         entirely, we can bring the following vehicle to rest at the point at
@@ -212,3 +399,32 @@ class BaseController:
         v_safe = 2 * h / env.sim_step + dv - this_vel * (2 * self.delay)
 
         return v_safe
+
+    @classmethod
+    def safe_velocity_batch(cls, env, veh_ids, delay):
+        """Batch equivalent of safe_velocity.
+
+        Parameters
+        ----------
+        env: Environment type
+            current environment, which contains information of the state of the
+            network at the current time step
+        veh_ids: list<str>
+            names of the vehicles
+        delay: float
+            delay in performing the breaking action shared by the vehicles
+
+        Returns
+        -------
+        np.ndarray
+            maximum safe velocity of every vehicle
+        """
+        lead_ids = env.vehicles.get_leader(veh_ids)
+        lead_vel = np.asarray(env.vehicles.get_speed(list(lead_ids)),
+                              dtype=float)
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+
+        h = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+        dv = lead_vel - this_vel
+
+        return 2 * h / env.sim_step + dv - this_vel * (2 * delay)
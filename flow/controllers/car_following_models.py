@@ -2,10 +2,13 @@
 flow-controlled vehicles.
 
 Controllers can have their output delayed by some duration. Each controller
-includes the function:
+includes the functions:
     get_accel(self, env) -> acc
         - using the current state of the world and existing parameters,
         uses the control model to return a vehicle acceleration.
+    get_accel_batch(cls, env, veh_ids) -> [acc]
+        - returns the accelerations of several vehicles that use the same
+        controller class and parameters in a single vectorized operation.
 """
 import math
 import numpy as np
@@ -15,6 +18,8 @@ from flow.controllers.base_controller import BaseController
 
 class CFMController(BaseController):
 
+    batch_params = ("k_d", "k_v", "k_c", "d_des", "v_des")
+
     def __init__(self,
                  veh_id,
                  sumo_cf_params,
@@ -76,9 +81,28 @@ class CFMController(BaseController):
         return self.k_d*(d_l - self.d_des) + self.k_v*(lead_vel - this_vel) + \
             self.k_c*(self.v_des - this_vel)
 
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        c = env.vehicles.get_acc_controller(veh_ids[0])
+        lead_ids = env.vehicles.get_leader(veh_ids)
+        has_lead = cls.has_leader(lead_ids)
+
+        lead_vel = np.asarray(env.vehicles.get_speed(list(lead_ids)),
+                              dtype=float)
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+
+        d_l = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+
+        accel = c.k_d*(d_l - c.d_des) + c.k_v*(lead_vel - this_vel) + \
+            c.k_c*(c.v_des - this_vel)
+
+        return np.where(has_lead, accel, c.max_accel)
+
 
 class BCMController(BaseController):
 
+    batch_params = ("k_d", "k_v", "k_c", "d_des", "v_des")
+
     def __init__(self,
                  veh_id,
                  sumo_cf_params,
@@ -153,9 +177,33 @@ class BCMController(BaseController):
             self.k_v * ((lead_vel - this_vel) - (this_vel - trail_vel)) + \
             self.k_c * (self.v_des - this_vel)
 
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        c = env.vehicles.get_acc_controller(veh_ids[0])
+        lead_ids = env.vehicles.get_leader(veh_ids)
+        has_lead = cls.has_leader(lead_ids)
+
+        lead_vel = np.asarray(env.vehicles.get_speed(list(lead_ids)),
+                              dtype=float)
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+
+        trail_ids = list(env.vehicles.get_follower(veh_ids))
+        trail_vel = np.asarray(env.vehicles.get_speed(trail_ids), dtype=float)
+
+        headway = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+        footway = np.asarray(env.vehicles.get_headway(trail_ids), dtype=float)
+
+        accel = c.k_d * (headway - footway) + \
+            c.k_v * ((lead_vel - this_vel) - (this_vel - trail_vel)) + \
+            c.k_c * (c.v_des - this_vel)
+
+        return np.where(has_lead, accel, c.max_accel)
+
 
 class OVMController(BaseController):
 
+    batch_params = ("v_max", "alpha", "beta", "h_st", "h_go")
+
     def __init__(self,
                  veh_id,
                  sumo_cf_params,
@@ -226,9 +274,35 @@ class OVMController(BaseController):
 
         return self.alpha * (v_h - this_vel) + self.beta * h_dot
 
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        c = env.vehicles.get_acc_controller(veh_ids[0])
+        lead_ids = env.vehicles.get_leader(veh_ids)
+        has_lead = cls.has_leader(lead_ids)
+
+        lead_vel = np.asarray(env.vehicles.get_speed(list(lead_ids)),
+                              dtype=float)
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+        h = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+        h_dot = lead_vel - this_vel
+
+        # V function here - input: h, output : Vh
+        v_h = np.where(
+            h <= c.h_st, 0,
+            np.where(h < c.h_go,
+                     c.v_max / 2 * (1 - np.cos(np.pi * (h - c.h_st) /
+                                               (c.h_go - c.h_st))),
+                     c.v_max))
+
+        accel = c.alpha * (v_h - this_vel) + c.beta * h_dot
+
+        return np.where(has_lead, accel, c.max_accel)
+
 
 class LinearOVM(BaseController):
 
+    batch_params = ("v_max", "adaptation", "h_st")
+
     def __init__(self,
                  veh_id,
                  sumo_cf_params,
@@ -285,9 +359,25 @@ class LinearOVM(BaseController):
 
         return (v_h - this_vel) / self.adaptation
 
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        c = env.vehicles.get_acc_controller(veh_ids[0])
+        this_vel = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+        h = np.asarray(env.vehicles.get_headway(veh_ids), dtype=float)
+
+        # V function here - input: h, output : Vh
+        alpha = 1.689  # the average value from Nakayama paper
+        v_h = np.where(h < c.h_st, 0,
+                       np.where(h <= c.h_st + c.v_max/alpha,
+                                alpha * (h - c.h_st), c.v_max))
+
+        return (v_h - this_vel) / c.adaptation
+
 
 class IDMController(BaseController):
 
+    batch_params = ("v0", "T", "a", "b", "delta", "s0", "s1")
+
     def __init__(self,
                  veh_id,
                  v0=30,
@@ -364,6 +454,26 @@ class IDMController(BaseController):
 
         return self.a * (1 - (v/self.v0)**self.delta - (s_star/h)**2)
 
+    @classmethod
+    def get_accel_batch(cls, env, veh_ids):
+        c = env.vehicles.get_acc_controller(veh_ids[0])
+        v = np.asarray(env.vehicles.get_speed(veh_ids), dtype=float)
+        lead_ids = env.vehicles.get_leader(veh_ids)
+        h = np.array(env.vehicles.get_headway(veh_ids), dtype=float)
+
+        # see get_accel for the treatment of near-zero headways
+        h[np.abs(h) < 1e-3] = 1e-3
+
+        lead_vel = np.asarray(env.vehicles.get_speed(list(lead_ids)),
+                              dtype=float)
+        s_star = np.where(
+            cls.has_leader(lead_ids),
+            c.s0 + np.maximum(
+                0, v * c.T + v*(v-lead_vel) / (2*np.sqrt(c.a*c.b))),
+            0)
+
+        return c.a * (1 - (v/c.v0)**c.delta - (s_star/h)**2)
+
 
 class SumoCarFollowingController(BaseController):
 
@@ -0,0 +1,134 @@
+"""Per-step aggregates of the states of the vehicles, shared by the reward
+functions.
+
+The reward functions of flow.core.rewards read the speeds, headways, edges
+and lanes of the vehicles as numpy arrays from the StepAggregates of the
+environment (env.aggregates), rather than fetching the state of every
+vehicle from the vehicles class. Every array is built the first time it is
+accessed after a simulation step, and reused until the next one, so that a
+reward combining several reward functions (e.g. desired_velocity and
+rl_forward_progress) reads the state of the vehicles only once.
+
+The environment clears the aggregates after every update of the vehicles
+class. The arrays should therefore not be modified by their users.
+"""
+
+import numpy as np
+
+
+class StepAggregates:
+
+    def __init__(self, env):
+        """Instantiates the aggregates of an environment.
+
+        Parameters
+        ----------
+        env : flow.envs.base_env.Env
+            environment whose vehicles are aggregated
+        """
+        self.env = env
+
+        # vehicles class the cached arrays were computed from. The cache is
+        # discarded if the environment replaced its vehicles class (e.g. upon
+        # reset) without clearing the aggregates
+        self._vehicles = None
+        self._cache = {}
+
+        # scenario the maximum speed limit was computed for, and its value
+        self._speed_limit_scenario = None
+        self._max_speed_limit = None
+
+    def clear(self):
+        """Discards the aggregates of the previous step. This is called by
+        the environment after every update of the vehicles class."""
+        self._vehicles = None
+        self._cache = {}
+
+    def _get(self, name, compute):
+        """Returns a cached aggregate, computing it if needed."""
+        vehicles = self.env.vehicles
+        if self._vehicles is not vehicles:
+            self._cache = {}
+            self._vehicles = vehicles
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = compute(vehicles)
+            return value
+
+    @property
+    def ids(self):
+        """Ids of all vehicles in the network, in the order of the arrays
+        below."""
+        return self._get("ids", lambda vehicles: list(vehicles.get_ids()))
+
+    @property
+    def index(self):
+        """Dict mapping the id of every vehicle to its position in the
+        arrays."""
+        return self._get("index", lambda vehicles: {
+            veh_id: i for i, veh_id in enumerate(self.ids)})
+
+    @property
+    def speeds(self):
+        """Speeds of all vehicles (in m/s)."""
+        return self._get("speeds", lambda vehicles: np.asarray(
+            vehicles.get_speed(self.ids), dtype=float))
+
+    @property
+    def headways(self):
+        """Headways of all vehicles (in m)."""
+        return self._get("headways", lambda vehicles: np.asarray(
+            vehicles.get_headway(self.ids), dtype=float))
+
+    @property
+    def lanes(self):
+        """Lanes of all vehicles."""
+        return self._get("lanes", lambda vehicles: np.asarray(
+            vehicles.get_lane(self.ids), dtype=int))
+
+    @property
+    def rl_indices(self):
+        """Positions of the rl vehicles in the arrays."""
+        return self._get("rl_indices", lambda vehicles: self.indices_of(
+            vehicles.get_rl_ids()))
+
+    def indices_of(self, veh_ids):
+        """Returns the positions of some vehicles in the arrays. Vehicles
+        that are not in the network are skipped."""
+        index = self.index
+        return np.fromiter((index[veh_id] for veh_id in veh_ids
+                            if veh_id in index), dtype=np.intp)
+
+    def edge_indices(self, edges):
+        """Returns the positions in the arrays of the vehicles located on an
+        edge or a list of edges."""
+        by_edge = self._get("edge_indices", self._group_by_edge)
+        if isinstance(edges, str):
+            return by_edge.get(edges, np.empty(0, dtype=np.intp))
+        found = [by_edge[edge] for edge in edges if edge in by_edge]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(found)
+
+    def _group_by_edge(self, vehicles):
+        """Groups the positions of the vehicles in the arrays by edge."""
+        edges = vehicles.get_edge(self.ids)
+        groups = {}
+        for i, edge in enumerate(edges):
+            groups.setdefault(edge, []).append(i)
+        return {edge: np.array(indices, dtype=np.intp)
+                for edge, indices in groups.items()}
+
+    @property
+    def max_speed_limit(self):
+        """Largest speed limit over the edges of the network (in m/s). This
+        is only computed again if the scenario of the environment
+        changes."""
+        scenario = self.env.scenario
+        if self._speed_limit_scenario is not scenario:
+            self._max_speed_limit = max(
+                scenario.speed_limit(edge)
+                for edge in scenario.get_edge_list())
+            self._speed_limit_scenario = scenario
+        return self._max_speed_limit
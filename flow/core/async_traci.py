@@ -0,0 +1,167 @@
+"""Asynchronous simulation steps over a TraCI connection.
+
+A TraCI simulationStep sends a command to sumo and blocks until sumo has
+advanced the simulation and replied with the subscription results. The
+AsyncTraCIConnection splits this call in two halves:
+
+- `begin_step` sends the simulationStep command to sumo and returns
+  immediately, while sumo advances the simulation.
+- `finish_step` reads the reply of sumo, and processes it exactly as the
+  blocking call would (updating the subscription results of the connection).
+
+In between, the python process is free to perform other computations, or,
+through the `simulation_step` coroutine, to wait on the sockets of several
+sumo instances within one asyncio event loop. This allows many environments
+in a single process to interleave their waits on sumo (see Env.step_async).
+
+The split relies on the internal socket and message buffer of the traci
+package. If these are not available (e.g. when using the in-process
+simulator of flow.core.fast_sim), simulation steps are performed immediately
+by `begin_step`, and `finish_step` does nothing.
+"""
+
+import asyncio
+
+
+class _StepSent(Exception):
+    """Raised to interrupt a simulationStep call once its command is sent."""
+    pass
+
+
+class _SocketProxy:
+    """Socket forwarding either only the messages sent, or only the messages
+    received, to the socket of a TraCI connection."""
+
+    def __init__(self, sock, send):
+        self._sock = sock
+        self._forward_send = send
+
+    def send(self, data):
+        if self._forward_send:
+            return self._sock.send(data)
+        # the message was already sent by begin_step
+        return len(data)
+
+    def recv(self, size):
+        if self._forward_send:
+            raise _StepSent()
+        return self._sock.recv(size)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class AsyncTraCIConnection:
+
+    def __init__(self, connection):
+        """Instantiates the asynchronous step interface of a TraCI
+        connection.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection
+            connection to the sumo instance
+        """
+        self.connection = connection
+        self.enabled = hasattr(connection, "_socket") \
+            and hasattr(connection, "_string") \
+            and hasattr(connection, "_queue")
+
+        # commands of the message sent by begin_step, whose reply has not
+        # been processed yet
+        self._sent_queue = None
+
+    @property
+    def pending(self):
+        """Whether a simulation step was begun and not yet finished."""
+        return self._sent_queue is not None
+
+    def begin_step(self):
+        """Sends a simulationStep command to sumo without waiting for the
+        reply.
+
+        Any command left in the message buffer of the connection (e.g. set
+        commands deferred by a TraCICommandBatcher) is sent along with it.
+        """
+        if self.pending:
+            raise RuntimeError("The previous simulation step has not been "
+                               "finished.")
+
+        if not self.enabled:
+            self.connection.simulationStep()
+            return
+
+        conn = self.connection
+        sock = conn._socket
+        conn._socket = _SocketProxy(sock, send=True)
+        try:
+            conn.simulationStep()
+        except _StepSent:
+            pass
+        finally:
+            conn._socket = sock
+
+        # the message was sent; the commands it contains are needed to
+        # validate the reply of sumo
+        self._sent_queue = list(conn._queue)
+        conn._string = bytes()
+        conn._queue = []
+
+    def finish_step(self):
+        """Waits for the reply of sumo to the last simulationStep command, and
+        processes it.
+
+        Returns
+        -------
+        list
+            subscription responses, as returned by simulationStep
+        """
+        if not self.pending:
+            return []
+
+        conn = self.connection
+        sock = conn._socket
+        # the simulationStep command is added again to the queue by the call
+        # below, but not sent again
+        conn._queue = self._sent_queue[:-1]
+        self._sent_queue = None
+        conn._socket = _SocketProxy(sock, send=False)
+        try:
+            return conn.simulationStep()
+        finally:
+            if conn._socket is not None:
+                conn._socket = sock
+
+    def fileno(self):
+        """File descriptor of the socket of the connection, or None if the
+        connection does not communicate through a socket."""
+        if not self.enabled or self.connection._socket is None:
+            return None
+        return self.connection._socket.fileno()
+
+    async def wait_readable(self, loop=None):
+        """Waits, without blocking the event loop, until the reply of sumo to
+        the last simulationStep command is available."""
+        fd = self.fileno()
+        if not self.pending or fd is None:
+            return
+
+        loop = loop or asyncio.get_event_loop()
+        future = loop.create_future()
+        loop.add_reader(fd, _set_done, future)
+        try:
+            await future
+        finally:
+            loop.remove_reader(fd)
+
+    async def simulation_step(self, loop=None):
+        """Performs a simulation step, yielding control to the event loop
+        while sumo advances the simulation."""
+        self.begin_step()
+        await self.wait_readable(loop)
+        return self.finish_step()
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
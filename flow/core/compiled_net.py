@@ -0,0 +1,455 @@
+"""Compiled representation of the networks described by .net.xml files.
+
+Generator._import_edges_from_net parses the complete DOM of a .net.xml file
+into nested dictionaries of edges and connections. For large networks (e.g.
+city-scale OpenStreetMap imports) this takes a lot of time and memory, and is
+repeated by every process using the network.
+
+Instead, the .net.xml file may be compiled once into a set of numpy arrays,
+stored in a directory next to the file (<net file>.compiled):
+
+- the ids of the edges (and junctions), in the order of the .net.xml file,
+  and the order in which they are sorted, used to look up edges by id
+- the length, number of lanes, and speed limit of every edge
+- the connections in between lanes, in compressed sparse row (CSR) form:
+  every lane of every edge is given a slot (the slots of edge i start at
+  lane_offset[i]), and the edges and lanes following the lane in slot s are
+  next_edges[next_indptr[s]:next_indptr[s + 1]] and
+  next_lanes[next_indptr[s]:next_indptr[s + 1]] (and similarly for the lanes
+  preceding it)
+
+The arrays are memory-mapped read-only by every process loading the network,
+so that the operating system shares a single copy of them in memory. The
+compiled network is recompiled whenever the .net.xml file changes.
+"""
+
+from collections.abc import Mapping
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from lxml import etree
+
+# version of the layout of the compiled files, stored in the metadata of the
+# compiled networks so that outdated layouts are recompiled
+VERSION = 1
+
+# names of the arrays of every compiled network
+ARRAYS = ["edge_ids", "edge_order", "valid", "length", "lanes", "speed",
+          "lane_offset", "next_indptr", "next_edges", "next_lanes",
+          "prev_indptr", "prev_edges", "prev_lanes"]
+
+# name of the file containing the metadata of a compiled network
+META_FILE = "meta.json"
+
+# speed limit of the edges whose speed is not specified in the .net.xml file
+DEFAULT_SPEED = 30
+
+
+def get_path(net_file):
+    """Returns the directory a .net.xml file is compiled into."""
+    return net_file + ".compiled"
+
+
+def load(net_file, no_internal_links=True):
+    """Loads the compiled representation of a .net.xml file.
+
+    The file is compiled first if it was never compiled, or if it was
+    modified since it was last compiled. If the compiled network cannot be
+    written next to the .net.xml file, it is kept in memory instead.
+
+    Parameters
+    ----------
+    net_file : str
+        path to the .net.xml file
+    no_internal_links : bool, optional
+        whether the network was generated without internal links, in which
+        case connections lead to the "to" edge of every connection rather
+        than its "via" lane
+
+    Returns
+    -------
+    CompiledNetwork
+        compiled network
+    """
+    path = get_path(net_file)
+    meta = _get_meta(net_file, no_internal_links)
+
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            if json.load(f) == meta:
+                return CompiledNetwork(path)
+    except (OSError, ValueError):
+        pass
+
+    arrays = compile_net(net_file, no_internal_links)
+    try:
+        _store(path, arrays, meta)
+    except OSError:
+        logging.warning(" Could not store the compiled network in " + path)
+        return CompiledNetwork(arrays=arrays)
+
+    return CompiledNetwork(path)
+
+
+def compile_net(net_file, no_internal_links=True):
+    """Compiles a .net.xml file into the arrays of a compiled network.
+
+    The file is parsed incrementally, so that its DOM is never held in
+    memory. The edges and connections are interpreted in the same way as in
+    Generator._import_edges_from_net.
+
+    Parameters
+    ----------
+    net_file : str
+        path to the .net.xml file
+    no_internal_links : bool, optional
+        see load
+
+    Returns
+    -------
+    dict <str, numpy ndarray>
+        Key = name of the array (see ARRAYS), Element = array
+    """
+    types_speed = {}
+    edge_ids, lengths, num_lanes, speeds = [], [], [], []
+    connections = []
+
+    for _, elem in etree.iterparse(net_file, events=("end",),
+                                   tag=("type", "edge", "connection"),
+                                   recover=True):
+        attrib = elem.attrib
+        if elem.tag == "type":
+            if "speed" in attrib:
+                types_speed[attrib["id"]] = float(attrib["speed"])
+        elif elem.tag == "edge":
+            # the length of the edge is taken from its first lane, and its
+            # speed from its type, or else from its first lane
+            lane = elem[0] if len(elem) > 0 else None
+            speed = types_speed.get(attrib.get("type"))
+            if speed is None and lane is not None and "speed" in lane.attrib:
+                speed = float(lane.attrib["speed"])
+            edge_ids.append(attrib["id"])
+            lengths.append(float(lane.attrib["length"]) if lane is not None
+                           else np.nan)
+            num_lanes.append(len(elem))
+            speeds.append(DEFAULT_SPEED if speed is None else speed)
+        else:
+            from_edge = attrib["from"]
+            from_lane = int(attrib["fromLane"])
+            if from_edge[0] != ":" and not no_internal_links:
+                # the next edge/lane pair is the internal lane the connection
+                # goes through
+                to_edge, to_lane = attrib["via"].rsplit("_", 1)
+                to_lane = int(to_lane)
+            else:
+                to_edge = attrib["to"]
+                to_lane = int(attrib["toLane"])
+            connections.append((from_edge, from_lane, to_edge, to_lane))
+
+        # free the memory used by the element, and by the elements preceding
+        # it in the tree
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    # edges referred to by connections only are added to the edge arrays,
+    # but are not valid edges
+    index = {edge_id: i for i, edge_id in enumerate(edge_ids)}
+    num_valid = len(edge_ids)
+    for from_edge, _, to_edge, _ in connections:
+        for edge_id in (from_edge, to_edge):
+            if edge_id not in index:
+                index[edge_id] = len(edge_ids)
+                edge_ids.append(edge_id)
+    num_edges = len(edge_ids)
+    num_invalid = num_edges - num_valid
+
+    # every edge has a slot for each of its lanes, and for any other lane
+    # index used by its connections
+    slots = num_lanes + [0] * num_invalid
+    for from_edge, from_lane, to_edge, to_lane in connections:
+        i, j = index[from_edge], index[to_edge]
+        slots[i] = max(slots[i], from_lane + 1)
+        slots[j] = max(slots[j], to_lane + 1)
+    lane_offset = np.zeros(num_edges + 1, dtype=np.int64)
+    np.cumsum(slots, out=lane_offset[1:])
+
+    arrays = {
+        "edge_ids": np.array(edge_ids, dtype=np.str_),
+        "valid": np.arange(num_edges) < num_valid,
+        "length": np.array(lengths + [np.nan] * num_invalid),
+        "lanes": np.array(num_lanes + [0] * num_invalid, dtype=np.int32),
+        "speed": np.array(speeds + [np.nan] * num_invalid),
+        "lane_offset": lane_offset,
+    }
+    arrays["edge_order"] = np.argsort(arrays["edge_ids"], kind="mergesort")
+
+    from_slot = np.array([lane_offset[index[c[0]]] + c[1]
+                          for c in connections], dtype=np.int64)
+    to_slot = np.array([lane_offset[index[c[2]]] + c[3]
+                        for c in connections], dtype=np.int64)
+    from_edge = np.array([index[c[0]] for c in connections], dtype=np.int32)
+    to_edge = np.array([index[c[2]] for c in connections], dtype=np.int32)
+    from_lane = np.array([c[1] for c in connections], dtype=np.int32)
+    to_lane = np.array([c[3] for c in connections], dtype=np.int32)
+
+    for name, slot, edge, lane in (("next", from_slot, to_edge, to_lane),
+                                   ("prev", to_slot, from_edge, from_lane)):
+        # a stable sort keeps the connections of every lane in the order of
+        # the .net.xml file
+        order = np.argsort(slot, kind="mergesort")
+        indptr = np.zeros(lane_offset[-1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(slot, minlength=lane_offset[-1]),
+                  out=indptr[1:])
+        arrays[name + "_indptr"] = indptr
+        arrays[name + "_edges"] = edge[order]
+        arrays[name + "_lanes"] = lane[order]
+
+    return arrays
+
+
+class CompiledNetwork:
+
+    def __init__(self, path=None, arrays=None):
+        """Instantiates a compiled network.
+
+        Parameters
+        ----------
+        path : str, optional
+            directory containing the compiled network, whose arrays are
+            memory-mapped
+        arrays : dict <str, numpy ndarray>, optional
+            arrays of the compiled network, as returned by compile_net, if the
+            network is not stored in a directory
+        """
+        self.path = path
+        if arrays is None:
+            arrays = {name: np.load(os.path.join(path, name + ".npy"),
+                                    mmap_mode="r")
+                      for name in ARRAYS}
+        self._arrays = arrays
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+        # sorted edge ids, used to look up the index of an edge
+        self._sorted_ids = self.edge_ids[self.edge_order]
+
+        # results of the lookups performed so far
+        self._index_cache = {}
+        self._next_cache = {}
+        self._prev_cache = {}
+
+    def __getstate__(self):
+        # networks stored in a directory are memory-mapped again when they
+        # are unpickled, rather than copied
+        if self.path is not None:
+            return {"path": self.path}
+        return {"arrays": self._arrays}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def num_edges(self):
+        """Number of edges and junctions in the network."""
+        return int(self.valid.sum())
+
+    def get_edge_ids(self):
+        """Returns the ids of all edges and junctions of the network, in the
+        order of the .net.xml file."""
+        return [str(edge_id) for edge_id in self.edge_ids[self.valid]]
+
+    def edge_index(self, edge_id):
+        """Returns the index of an edge in the arrays of the network.
+
+        Raises
+        ------
+        KeyError
+            if the edge is not in the network
+        """
+        try:
+            return self._index_cache[edge_id]
+        except KeyError:
+            pass
+        i = np.searchsorted(self._sorted_ids, edge_id)
+        if i == len(self._sorted_ids) or self._sorted_ids[i] != edge_id:
+            raise KeyError(edge_id)
+        index = int(self.edge_order[i])
+        self._index_cache[edge_id] = index
+        return index
+
+    def _valid_index(self, edge_id):
+        index = self.edge_index(edge_id)
+        if not self.valid[index]:
+            raise KeyError(edge_id)
+        return index
+
+    def edge_length(self, edge_id):
+        """Returns the length of an edge (KeyError if it is not found)."""
+        return float(self.length[self._valid_index(edge_id)])
+
+    def speed_limit(self, edge_id):
+        """Returns the speed limit of an edge (KeyError if it is not found).
+        """
+        return float(self.speed[self._valid_index(edge_id)])
+
+    def num_lanes(self, edge_id):
+        """Returns the number of lanes of an edge (KeyError if it is not
+        found)."""
+        return int(self.lanes[self._valid_index(edge_id)])
+
+    def next_edge(self, edge, lane):
+        """Returns the edge/lane pairs following an edge/lane pair.
+
+        Raises
+        ------
+        KeyError
+            if there are no edge/lane pairs in front
+        """
+        return self._connected("next", self._next_cache, edge, lane)
+
+    def prev_edge(self, edge, lane):
+        """Returns the edge/lane pairs preceding an edge/lane pair.
+
+        Raises
+        ------
+        KeyError
+            if there are no edge/lane pairs behind
+        """
+        return self._connected("prev", self._prev_cache, edge, lane)
+
+    def _connected(self, direction, cache, edge, lane):
+        try:
+            return list(cache[edge, lane])
+        except KeyError:
+            pass
+
+        i = self.edge_index(edge)
+        slot = int(self.lane_offset[i]) + lane
+        if lane < 0 or slot >= self.lane_offset[i + 1]:
+            raise KeyError((edge, lane))
+        indptr = getattr(self, direction + "_indptr")
+        start, end = int(indptr[slot]), int(indptr[slot + 1])
+        if start == end:
+            raise KeyError((edge, lane))
+
+        edges = getattr(self, direction + "_edges")[start:end]
+        lanes = getattr(self, direction + "_lanes")[start:end]
+        pairs = [(str(self.edge_ids[e]), int(n)) for e, n in zip(edges, lanes)]
+        cache[edge, lane] = pairs
+        return list(pairs)
+
+    @property
+    def edges(self):
+        """Read-only view of the edges of the network, in the format returned
+        by Generator._import_edges_from_net."""
+        return EdgeView(self)
+
+    @property
+    def connections(self):
+        """Read-only views of the connections of the network, in the format
+        returned by Generator._import_edges_from_net."""
+        return {"next": ConnectionView(self, "next"),
+                "prev": ConnectionView(self, "prev")}
+
+
+class EdgeView(Mapping):
+    """Mapping from the id of every edge of a compiled network to a dict of
+    its speed, number of lanes and length."""
+
+    def __init__(self, net):
+        self._net = net
+
+    def __getitem__(self, edge_id):
+        i = self._net._valid_index(edge_id)
+        return {"speed": float(self._net.speed[i]),
+                "lanes": int(self._net.lanes[i]),
+                "length": float(self._net.length[i])}
+
+    def __iter__(self):
+        return iter(self._net.get_edge_ids())
+
+    def __len__(self):
+        return self._net.num_edges
+
+
+class ConnectionView(Mapping):
+    """Mapping from the id of every edge of a compiled network to a dict
+    mapping each of its lanes to the edge/lane pairs following (or
+    preceding) it."""
+
+    def __init__(self, net, direction):
+        self._net = net
+        self._direction = direction
+
+    def __getitem__(self, edge_id):
+        net = self._net
+        i = net.edge_index(edge_id)
+        lanes = {}
+        for lane in range(int(net.lane_offset[i + 1] - net.lane_offset[i])):
+            try:
+                lanes[lane] = net._connected(
+                    self._direction, {}, edge_id, lane)
+            except KeyError:
+                pass
+        if not lanes:
+            raise KeyError(edge_id)
+        return lanes
+
+    def __iter__(self):
+        net = self._net
+        indptr = getattr(net, self._direction + "_indptr")
+        # number of connections starting from the lanes of every edge
+        counts = indptr[net.lane_offset[1:]] - indptr[net.lane_offset[:-1]]
+        return (str(net.edge_ids[i]) for i in np.flatnonzero(counts))
+
+    def __len__(self):
+        net = self._net
+        indptr = getattr(net, self._direction + "_indptr")
+        counts = indptr[net.lane_offset[1:]] - indptr[net.lane_offset[:-1]]
+        return int(np.count_nonzero(counts))
+
+
+def _get_meta(net_file, no_internal_links):
+    """Returns the metadata identifying the compiled network of a .net.xml
+    file in its current state."""
+    stat = os.stat(net_file)
+    return {"version": VERSION, "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "no_internal_links": bool(no_internal_links)}
+
+
+def _store(path, arrays, meta):
+    """Writes the arrays of a compiled network into a directory.
+
+    The arrays are written into a temporary directory which then replaces
+    the directory, so that other processes never load partially written
+    networks.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), arrays[name])
+        with open(os.path.join(tmp, META_FILE), "w") as f:
+            json.dump(meta, f)
+
+        if os.path.isdir(path):
+            # replace an outdated compiled network
+            old = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.rename(path, os.path.join(old, "net"))
+            shutil.rmtree(old, ignore_errors=True)
+        os.rename(tmp, path)
+        tmp = None
+    except OSError:
+        # the network may have been compiled by another process in the
+        # meantime
+        if not os.path.isdir(path):
+            raise
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -5,4 +5,4 @@ Copy this file to config.py and make any necessary changes.
 """
 
 PYTHON_COMMAND = "python"
-SUMO_SLEEP = 5.0  # Delay between initializing SUMO and connecting with TraCI
+NET_CACHE_PATH = None  # Directory of the net cache, ~/.cache/flow/net if None
@@ -0,0 +1,91 @@
+"""Fixed-capacity history of per-step counts, used by the Vehicles class.
+
+The number of vehicles departing and arriving at every simulation step are
+used to compute the inflow and outflow rates of the network over a recent
+window of time. Storing these counts in ever-growing lists leaks memory over
+long runs, and summing a window of them costs time proportional to the size
+of the window.
+
+The RollingCounter instead keeps the running totals of the counts (prefix
+sums) in a ring buffer of fixed capacity. The sum of the last k counts is the
+difference in between two running totals, and is computed in O(1) for any k
+up to the capacity.
+"""
+
+import numpy as np
+
+# number of counts kept by default (e.g. 10000 seconds of simulation with a
+# sim_step of 0.1)
+DEFAULT_CAPACITY = 100000
+
+
+class RollingCounter:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, dtype=np.int64):
+        """Instantiates an empty history of counts.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            number of most recent counts that are kept
+        dtype : numpy dtype, optional
+            type of the counts, defaults to integers. Floating point values
+            (e.g. sums of speeds) may be kept as well, in which case the sums
+            returned are subject to the rounding errors of the running totals.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive.")
+        self.capacity = int(capacity)
+        self.dtype = dtype
+
+        # running totals of the counts; the total after the first n counts is
+        # stored at index n % (capacity + 1). The buffer is allocated when the
+        # first count is added.
+        self._totals = None
+
+        # number of counts added since the last call to clear
+        self._num_counts = 0
+
+        # most recent count, kept separately so that it is returned exactly
+        self._last = 0
+
+    def append(self, count):
+        """Adds the count of the most recent step."""
+        if self._totals is None:
+            self._totals = np.zeros(self.capacity + 1, dtype=self.dtype)
+        size = self.capacity + 1
+        n = self._num_counts
+        self._totals[(n + 1) % size] = self._totals[n % size] + count
+        self._num_counts = n + 1
+        self._last = count
+
+    def clear(self):
+        """Removes all counts."""
+        self._num_counts = 0
+        self._last = 0
+        if self._totals is not None:
+            self._totals[0] = 0
+
+    def __len__(self):
+        """Number of counts available (at most the capacity)."""
+        return min(self._num_counts, self.capacity)
+
+    def sum(self, num_steps):
+        """Returns the sum of the last num_steps counts.
+
+        If less than num_steps counts are available, the sum of all available
+        counts is returned.
+        """
+        num_steps = min(int(num_steps), len(self))
+        if num_steps <= 0:
+            return 0
+        if num_steps == 1:
+            return self._last
+        size = self.capacity + 1
+        n = self._num_counts
+        return (self._totals[n % size] -
+                self._totals[(n - num_steps) % size]).item()
+
+    def last(self):
+        """Returns the most recent count, or 0 if there are no counts."""
+        return self.sum(1)
@@ -0,0 +1,293 @@
+"""Virtual loop detectors measuring traffic over segments of the network.
+
+A detector covers a segment of the network: a set of edges, optionally
+restricted to some of their lanes and to a range of positions on these
+edges. After every simulation step, the detectors collect the vehicles
+located in their segment from the lane index of the Vehicles class (rather
+than by scanning all vehicles), and add the following quantities to running
+totals kept over a sliding window (see flow.core.counters.RollingCounter):
+
+- the number of vehicles in the segment
+- the number of vehicles that left the segment
+- the sum of the speeds of the vehicles in the segment
+- the sum of the lengths of the vehicles in the segment
+
+From these, the flow, density, occupancy, and mean speed of the segment over
+the window are computed in O(1), so that environments and reward functions
+can read them at every step at no additional cost.
+
+Detectors are declared through the detectors attribute of the environment,
+e.g.
+
+>>> env.detectors.add("bottleneck", edges=["3", "4"], window=10)
+>>> env.detectors["bottleneck"].flow()
+"""
+
+from collections import OrderedDict
+from copy import deepcopy
+
+import numpy as np
+
+from flow.core.counters import RollingCounter
+
+
+class Detector:
+
+    def __init__(self, name, edges, lanes=None, start=0, end=None,
+                 length=1, window_steps=1, sim_step=0.1):
+        """Instantiates a detector. Detectors are usually created through
+        Detectors.add.
+
+        Parameters
+        ----------
+        name : str
+            name of the detector
+        edges : list<str>
+            edges covered by the detector
+        lanes : list<int>, optional
+            lanes of these edges covered by the detector, defaults to all
+            lanes
+        start : float, optional
+            position on the edges at which the segment starts
+        end : float, optional
+            position on the edges at which the segment ends, defaults to the
+            end of the edges
+        length : float, optional
+            length of the segment, summed over its edges (in m)
+        window_steps : int, optional
+            number of simulation steps the aggregates are computed over
+        sim_step : float, optional
+            duration of a simulation step (in s)
+        """
+        self.name = name
+        self.edges = list(edges)
+        self.lanes = None if lanes is None else list(lanes)
+        self.start = start
+        self.end = end
+        self.length = length
+        self.window_steps = window_steps
+        self.sim_step = sim_step
+
+        # vehicles located in the segment after the last update
+        self.ids = set()
+
+        # running totals over the window
+        self._num_vehicles = RollingCounter(window_steps)
+        self._num_exits = RollingCounter(window_steps)
+        self._speeds = RollingCounter(window_steps, dtype=np.float64)
+        self._lengths = RollingCounter(window_steps, dtype=np.float64)
+
+    def update(self, vehicles):
+        """Adds the state of the segment after a simulation step.
+
+        Parameters
+        ----------
+        vehicles : flow.core.vehicles.Vehicles
+            state of the vehicles after the simulation step
+        """
+        if self.lanes is None:
+            ids = vehicles.get_ids_by_edge(self.edges)
+        else:
+            ids = [veh_id for edge in self.edges for lane in self.lanes
+                   for veh_id in vehicles.get_ids_by_lane(edge, lane)]
+
+        if ids and (self.start > 0 or self.end is not None):
+            end = np.inf if self.end is None else self.end
+            ids = [veh_id for veh_id, pos
+                   in zip(ids, vehicles.get_position(ids))
+                   if self.start <= pos <= end]
+
+        current = set(ids)
+        self._num_exits.append(len(self.ids - current))
+        self.ids = current
+
+        self._num_vehicles.append(len(ids))
+        if ids:
+            self._speeds.append(float(sum(vehicles.get_speed(ids))))
+            self._lengths.append(float(sum(vehicles.get_length(ids))))
+        else:
+            self._speeds.append(0.)
+            self._lengths.append(0.)
+
+    def reset(self):
+        """Removes all measurements."""
+        self.ids = set()
+        for counter in (self._num_vehicles, self._num_exits, self._speeds,
+                        self._lengths):
+            counter.clear()
+
+    def restore(self, other):
+        """Replaces the measurements of the detector with those of a copy of
+        it (see Detectors.restore)."""
+        self.ids = other.ids
+        self._num_vehicles = other._num_vehicles
+        self._num_exits = other._num_exits
+        self._speeds = other._speeds
+        self._lengths = other._lengths
+
+    @property
+    def num_steps(self):
+        """Number of simulation steps currently covered by the window."""
+        return len(self._num_vehicles)
+
+    def num_vehicles(self):
+        """Returns the average number of vehicles in the segment over the
+        window."""
+        num_steps = self.num_steps
+        if num_steps == 0:
+            return 0
+        return self._num_vehicles.sum(num_steps) / num_steps
+
+    def density(self):
+        """Returns the average density of the segment over the window (in
+        veh/m)."""
+        return self.num_vehicles() / self.length
+
+    def flow(self):
+        """Returns the rate at which vehicles left the segment over the
+        window (in veh/hr)."""
+        num_steps = self.num_steps
+        if num_steps == 0:
+            return 0
+        return 3600 * self._num_exits.sum(num_steps) / \
+            (num_steps * self.sim_step)
+
+    def occupancy(self):
+        """Returns the average fraction of the segment (summed over its
+        edges) occupied by vehicles over the window."""
+        num_steps = self.num_steps
+        if num_steps == 0:
+            return 0
+        return self._lengths.sum(num_steps) / (num_steps * self.length)
+
+    def mean_speed(self):
+        """Returns the average speed of the vehicles in the segment over the
+        window (in m/s), or 0 if there were no vehicles."""
+        num_steps = self.num_steps
+        count = self._num_vehicles.sum(num_steps)
+        if count == 0:
+            return 0
+        return self._speeds.sum(num_steps) / count
+
+
+class Detectors:
+
+    def __init__(self, scenario, sim_step):
+        """Instantiates an empty set of detectors.
+
+        Parameters
+        ----------
+        scenario : flow.scenarios.base_scenario.Scenario
+            scenario the detectors are placed in
+        sim_step : float
+            duration of a simulation step (in s)
+        """
+        self.scenario = scenario
+        self.sim_step = sim_step
+
+        # Key = name of the detector, Element = Detector
+        self._detectors = OrderedDict()
+
+    def add(self, name, edges, lanes=None, start=0, end=None, window=None):
+        """Adds a detector.
+
+        Parameters
+        ----------
+        name : str
+            name of the detector
+        edges : str or list<str>
+            edge or edges covered by the detector
+        lanes : list<int>, optional
+            lanes of the edges covered by the detector, defaults to all lanes
+        start : float, optional
+            position on the edges at which the detector starts
+        end : float, optional
+            position on the edges at which the detector ends, defaults to the
+            end of the edges
+        window : float, optional
+            duration of the window the aggregates are computed over (in s),
+            defaults to a single simulation step
+
+        Returns
+        -------
+        Detector
+            the new detector
+
+        Raises
+        ------
+        ValueError
+            if a detector with the same name exists, or if an edge is not in
+            the network
+        """
+        if name in self._detectors:
+            raise ValueError("A detector named {} already exists."
+                             .format(name))
+        if isinstance(edges, str):
+            edges = [edges]
+
+        length = 0
+        for edge in edges:
+            edge_length = self.scenario.edge_length(edge)
+            if edge_length == -1001:
+                raise ValueError("Edge {} is not in the network.".format(edge))
+            edge_end = edge_length if end is None else min(end, edge_length)
+            length += max(edge_end - start, 0)
+
+        window_steps = 1 if window is None else \
+            max(int(round(window / self.sim_step)), 1)
+
+        detector = Detector(name, edges, lanes=lanes, start=start, end=end,
+                            length=length, window_steps=window_steps,
+                            sim_step=self.sim_step)
+        self._detectors[name] = detector
+        return detector
+
+    def update(self, vehicles):
+        """Updates all detectors after a simulation step."""
+        for detector in self._detectors.values():
+            detector.update(vehicles)
+
+    def reset(self):
+        """Removes the measurements of all detectors."""
+        for detector in self._detectors.values():
+            detector.reset()
+
+    def restore(self, saved):
+        """Restores the measurements of detectors saved along with the state
+        of the environment (see Env.restore_snapshot).
+
+        The detectors themselves are kept, so that detectors added after the
+        state was saved remain available. Their measurements are removed.
+
+        Parameters
+        ----------
+        saved : Detectors
+            copy of the detectors made when the state was saved. Its
+            measurements are moved into the detectors, not copied.
+        """
+        for name, detector in self._detectors.items():
+            if name in saved:
+                detector.restore(saved[name])
+            else:
+                detector.reset()
+
+    def __deepcopy__(self, memo):
+        """Copies the detectors and their measurements (e.g. when the state
+        of the environment is saved), but not the scenario they refer to."""
+        memo[id(self.scenario)] = self.scenario
+        copy = Detectors.__new__(Detectors)
+        memo[id(self)] = copy
+        copy.__dict__.update(deepcopy(self.__dict__, memo))
+        return copy
+
+    def __getitem__(self, name):
+        return self._detectors[name]
+
+    def __contains__(self, name):
+        return name in self._detectors
+
+    def __iter__(self):
+        return iter(self._detectors)
+
+    def __len__(self):
+        return len(self._detectors)
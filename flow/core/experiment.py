@@ -1,8 +1,13 @@
 import logging
 import datetime
+import os
+import random
+import concurrent.futures
+import multiprocessing
+from copy import copy, deepcopy
 import numpy as np
 
-from flow.core.util import emission_to_csv
+from flow.core.util import emission_to_csv, emission_to_npz
 
 
 class SumoExperiment:
@@ -29,11 +34,21 @@ class SumoExperiment:
 
         logging.info("initializing environment.")
 
-    def run(self, num_runs, num_steps, rl_actions=None, convert_to_csv=False):
+    def run(self, num_runs, num_steps, rl_actions=None, convert_to_csv=False,
+            convert_to_npz=False, num_workers=1, callback=None):
         """
         Runs the given scenario for a set number of runs and a set number of
         steps per run.
 
+        If num_workers is greater than 1, the runs are independent rollouts
+        spread over a pool of processes. Every run is then performed by a new
+        environment of the same class and parameters as self.env, with its
+        own sumo instance (on a free port) and seed. The seed of run i is the
+        seed in sumo_params plus i, or a random seed if no seed was specified.
+        The emission, trajectory and profile files of run i are written to a
+        "run_i" subdirectory of their respective paths, and converted by the
+        process performing the run.
+
         Parameters
         ----------
         num_runs: int
@@ -46,33 +61,185 @@ class SumoExperiment:
         convert_to_csv: bool
             Specifies whether to convert the emission file created by sumo into
             a csv file
+        convert_to_npz: bool
+            Specifies whether to convert the emission file created by sumo into
+            a columnar npz file (see flow.core.util.emission_to_npz)
+        num_workers: int, optional
+            number of processes the runs are performed in. The runs are
+            performed serially by self.env if this is 1.
+        callback: callable, optional
+            called with the result of every run (see below) as soon as the run
+            is complete. Runs performed in parallel complete in any order.
+
+        Returns
+        -------
+        dict
+            the returns of the runs, in the order of the runs ("returns"),
+            their average ("average_return"), and the result of every run
+            ("runs"), i.e. a dict with the index of the run ("run"), its
+            return ("return"), its seed ("seed"), and the path to its emission
+            file ("emission_path", None if no emission file is written)
         """
         if rl_actions is None:
             rl_actions = []
 
-        rets = []
+        if num_workers > 1:
+            runs = self._run_parallel(num_runs, num_steps, rl_actions,
+                                      convert_to_csv, convert_to_npz,
+                                      num_workers, callback)
+        else:
+            runs = self._run_serial(num_runs, num_steps, rl_actions,
+                                    convert_to_csv, convert_to_npz, callback)
+
+        rets = [r["return"] for r in runs]
+        print("Average Return", np.mean(rets))
+
+        return {"returns": rets,
+                "average_return": np.mean(rets),
+                "runs": runs}
+
+    def _run_serial(self, num_runs, num_steps, rl_actions, convert_to_csv,
+                    convert_to_npz, callback):
+        """Performs all runs with self.env, and returns their results."""
+        emission_path = _get_emission_path(self.env)
+
+        runs = []
         for i in range(num_runs):
             logging.info("Iter #" + str(i))
-            ret = 0
-            self.env.reset()
-            for j in range(num_steps):
-                state, reward, done, _ = self.env.step(rl_actions)
-                ret += reward
-                if done:
-                    break
-            rets.append(ret)
+            ret = _rollout(self.env, num_steps, rl_actions)
             print("Round {0}, return: {1}".format(i, ret))
+            runs.append({"run": i,
+                         "return": ret,
+                         "seed": self.env.sumo_params.seed,
+                         "emission_path": emission_path})
+            if callback is not None:
+                callback(runs[-1])
 
-        print("Average Return", np.mean(rets))
         self.env.terminate()
 
-        if convert_to_csv:
-            # collect the location of the emission file
-            dir_path = self.env.sumo_params.emission_path
-            emission_filename = \
-                "{0}-emission.xml".format(self.env.scenario.name)
-            emission_path = \
-                "{0}/{1}".format(dir_path, emission_filename)
+        if emission_path is not None:
+            _convert_emission(emission_path, convert_to_csv, convert_to_npz)
+
+        return runs
+
+    def _run_parallel(self, num_runs, num_steps, rl_actions, convert_to_csv,
+                      convert_to_npz, num_workers, callback):
+        """Spreads the runs over a pool of processes, and returns their
+        results sorted by run."""
+        env_class = type(self.env)
+        env_params = self.env.env_params
+
+        # the vehicles of the scenario are updated by self.env, whereas the
+        # environments of the runs start from the initial vehicles
+        scenario = copy(self.env.scenario)
+        scenario.vehicles = self.env.initial_vehicles
+
+        # the sumo instance of self.env is not needed by the runs
+        self.env.terminate()
+
+        runs = []
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_run_worker, env_class, env_params,
+                                _get_run_params(self.env.sumo_params, i),
+                                scenario, i, num_steps, rl_actions,
+                                convert_to_csv, convert_to_npz)
+                for i in range(num_runs)]
+
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                print("Round {0}, return: {1}".format(result["run"],
+                                                      result["return"]))
+                runs.append(result)
+                if callback is not None:
+                    callback(result)
+
+        return sorted(runs, key=lambda r: r["run"])
+
+
+def _rollout(env, num_steps, rl_actions):
+    """Resets an environment and runs it for num_steps steps (or until it is
+    done), and returns the sum of the rewards."""
+    ret = 0
+    env.reset()
+    for _ in range(num_steps):
+        _, reward, done, _ = env.step(rl_actions)
+        ret += reward
+        if done:
+            break
+    return ret
+
+
+def _get_emission_path(env):
+    """Returns the path to the emission file written by the sumo instance of
+    an environment, or None if no emission file is written."""
+    dir_path = env.sumo_params.emission_path
+    if dir_path is None:
+        return None
+    return "{0}/{1}-emission.xml".format(dir_path, env.scenario.name)
+
+
+def _convert_emission(emission_path, convert_to_csv, convert_to_npz):
+    """Converts an emission file into a csv and/or an npz file (if
+    requested)."""
+    # convert the emission file into a csv
+    if convert_to_csv:
+        emission_to_csv(emission_path)
+
+    # convert the emission file into an npz file
+    if convert_to_npz:
+        emission_to_npz(emission_path)
+
+
+def _get_run_params(sumo_params, run):
+    """Returns the sumo_params of the environment performing a run in
+    parallel with other runs.
+
+    The sumo instance listens on a free port, its seed is specific to the run,
+    and the files written during the run are placed in a "run_<run>"
+    subdirectory of their paths, so that the runs do not interfere with one
+    another.
+    """
+    sumo_params = deepcopy(sumo_params)
+    sumo_params.port = None
+
+    if sumo_params.seed is not None:
+        sumo_params.seed += run
+    else:
+        sumo_params.seed = random.randint(0, int(1e5))
+
+    subdir = "run_{}".format(run)
+    if sumo_params.emission_path is not None:
+        sumo_params.emission_path = \
+            os.path.join(sumo_params.emission_path, subdir, "")
+    if sumo_params.trajectory_path is not None:
+        sumo_params.trajectory_path = \
+            os.path.join(sumo_params.trajectory_path, subdir)
+    if sumo_params.profile_path is not None:
+        sumo_params.profile_path = \
+            os.path.join(sumo_params.profile_path, subdir)
+
+    return sumo_params
+
+
+def _run_worker(env_class, env_params, sumo_params, scenario, run, num_steps,
+                rl_actions, convert_to_csv, convert_to_npz):
+    """Performs a run with a new environment, in a process of the pool of
+    SumoExperiment.run, and returns its result."""
+    env = env_class(env_params, sumo_params, scenario)
+    try:
+        ret = _rollout(env, num_steps, rl_actions)
+    finally:
+        env.terminate()
+
+    # the emission file is complete once the sumo instance is closed
+    emission_path = _get_emission_path(env)
+    if emission_path is not None:
+        _convert_emission(emission_path, convert_to_csv, convert_to_npz)
 
-            # convert the emission file into a csv
-            emission_to_csv(emission_path)
+    return {"run": run,
+            "return": ret,
+            "seed": sumo_params.seed,
+            "emission_path": emission_path}
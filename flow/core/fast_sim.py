@@ -0,0 +1,488 @@
+"""A fast, in-process replacement of sumo for single-lane closed loops.
+
+The FastSimulation class integrates the longitudinal dynamics of all vehicles
+in a single-lane closed loop (e.g. LoopScenario and Figure8Scenario) with
+vectorized numpy operations, and exposes the subset of the TraCI connection
+interface that is used by flow's environments. It may therefore be used in
+place of a sumo instance by setting SumoParams(simulator="fast").
+
+The simulation follows the conventions of sumo where possible:
+
+- Vehicles whose speed is not commanded (through vehicle.slowDown) during a
+  step follow the Intelligent Driver Model, parametrized by the accel, decel,
+  tau, minGap, maxSpeed, and speedFactor attributes of their vehicle type.
+- Commanded speeds are applied in the next step, and are bounded by the
+  maximum acceleration and deceleration of the vehicle and by a safe speed
+  according to the speed mode of the vehicle.
+- Speeds are bounded by the maximum speed of the vehicle and the speed limit
+  of the current edge, and positions are updated with the new speeds.
+- Vehicles whose bumper-to-bumper gap becomes negative collide. Collisions are
+  reported as starting teleports, which flow environments treat as crashes.
+
+The following are not modelled: lane changes, traffic lights, inflows,
+junction priorities (e.g. at the intersection of the figure eight), and the
+stochastic driver imperfection (sigma, speedDev) of sumo vehicles.
+"""
+
+import numpy as np
+import traci.constants as tc
+
+from flow.core.vehicle_table import VehicleTable
+
+# Key = name of the column
+# Element = (numpy dtype, value of an unset cell)
+FAST_SIM_COLUMNS = {
+    "x": (np.float64, 0),
+    "speed": (np.float64, 0),
+    "length": (np.float64, 5),
+    "accel": (np.float64, 1),
+    "decel": (np.float64, 1.5),
+    "tau": (np.float64, 1),
+    "min_gap": (np.float64, 2.5),
+    "max_speed": (np.float64, 30),
+    "command": (np.float64, np.nan),
+    "speed_mode": (np.int64, 31),
+}
+
+# default length of vehicles in sumo, in meters
+DEFAULT_LENGTH = 5
+
+# acceleration exponent of the Intelligent Driver Model in sumo
+IDM_DELTA = 4
+
+
+class FastSimulation:
+
+    def __init__(self, scenario, sim_step):
+        """Instantiates a simulation of the vehicles in a scenario.
+
+        The vehicles of the scenario are inserted in the network at the first
+        simulation step, at the initial positions specified by the scenario's
+        initial config.
+
+        Parameters
+        ----------
+        scenario : Scenario type
+            scenario whose network forms a single-lane closed loop
+        sim_step : float
+            seconds per simulation step
+
+        Raises
+        ------
+        ValueError
+            if the network is not a single-lane closed loop, or if the
+            scenario contains inflows
+        """
+        self.scenario = scenario
+        self.sim_step = sim_step
+
+        in_flows = scenario.net_params.in_flows
+        if in_flows is not None and len(in_flows.get()) > 0:
+            raise ValueError("The fast simulation does not support inflows.")
+
+        # edges of the loop in the order in which they are traversed, and
+        # their starting position along the loop
+        self.edges = self._get_loop_edges(scenario)
+        lengths = [scenario.edge_length(edge) for edge in self.edges]
+        self.edge_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self.length = float(np.sum(lengths))
+        self.edge_start = dict(zip(self.edges, self.edge_starts))
+        self.speed_limits = np.array(
+            [scenario.speed_limit(edge) for edge in self.edges], dtype=float)
+
+        for edge in self.edges:
+            if scenario.num_lanes(edge) != 1:
+                raise ValueError("The fast simulation only supports "
+                                 "single-lane networks.")
+
+        # sumo parameters of every vehicle type
+        self.type_params = dict(scenario.vehicles.types)
+
+        # state of the vehicles currently in the network
+        self.table = VehicleTable(FAST_SIM_COLUMNS)
+        self.ids = []
+        self.types = {}
+        self.routes = {}
+        self.colors = {}
+
+        # vehicles that will be inserted at the next simulation step
+        self.pending = []
+
+        # ids of the vehicles that departed/collided in the last step.
+        # Vehicles never arrive, as they drive along the loop indefinitely
+        self.departed = []
+        self.collided = []
+
+        # simulation time, in seconds
+        self.time = 0
+
+        # subscription results of the current step, computed on demand
+        self._results = None
+
+        self.vehicle = _VehicleDomain(self)
+        self.simulation = _SimulationDomain(self)
+        self.trafficlight = _TrafficLightDomain()
+        self.junction = _JunctionDomain(self)
+
+        # insert the initial vehicles of the scenario
+        initial_config = scenario.initial_config
+        for i, veh_id in enumerate(scenario.generator.vehicle_ids):
+            edge, pos = initial_config.positions[i]
+            self.vehicle.addFull(
+                veh_id, "route" + edge,
+                typeID=scenario.vehicles.get_state(veh_id, "type"),
+                departPos=str(pos),
+                departSpeed=str(scenario.vehicles.get_initial_speed(veh_id)))
+
+    @staticmethod
+    def _get_loop_edges(scenario):
+        """Returns the edges (including internal edges) that are traversed,
+        in order, by a vehicle driving along the routes of the scenario."""
+        routes = scenario.generator.rts
+        route = routes[scenario.get_edge_list()[0]]
+
+        edges = []
+        for i, edge in enumerate(route):
+            edges.append(edge)
+            next_route_edge = route[(i + 1) % len(route)]
+
+            # follow the internal edges leading to the next edge of the route
+            path = [edge]
+            while True:
+                candidates = [e for e, _ in scenario.next_edge(path[-1], 0)]
+                if next_route_edge in candidates:
+                    break
+                internal = [e for e in candidates
+                            if e.startswith(":") and e not in path]
+                if len(internal) == 0:
+                    raise ValueError("The network of the scenario does not "
+                                     "form a closed loop.")
+                # choose the internal edge that connects to the next edge
+                for e in internal:
+                    if next_route_edge in \
+                            [n for n, _ in scenario.next_edge(e, 0)]:
+                        path.append(e)
+                        break
+                else:
+                    path.append(internal[0])
+            edges.extend(path[1:])
+
+        return edges
+
+    def simulationStep(self, step=0.):
+        """Advances the simulation by one step."""
+        dt = self.sim_step
+        table = self.table
+
+        self.departed = []
+        self.collided = []
+        self._results = None
+
+        # advance the vehicles currently in the network
+        if len(self.ids) > 0:
+            rows = table.rows(self.ids)
+            x = table.column("x")[rows]
+            v = table.column("speed")[rows]
+            length = table.column("length")[rows]
+            accel = table.column("accel")[rows]
+            decel = table.column("decel")[rows]
+            command = table.column("command")[rows]
+            speed_mode = table.column("speed_mode")[rows]
+
+            leader, gap = self._leaders(x, length)
+            has_leader = leader >= 0
+            lead_v = np.where(has_leader, v[leader], 0)
+
+            # speed of the vehicles following the Intelligent Driver Model
+            new_v = v + self._idm_accel(rows, v, lead_v, gap, has_leader) * dt
+
+            # speed of the vehicles whose speed is commanded, bounded
+            # according to their speed mode
+            commanded = ~np.isnan(command)
+            cmd = command.copy()
+            regard_accel = (speed_mode & 2) > 0
+            regard_decel = (speed_mode & 4) > 0
+            cmd = np.where(regard_accel, np.minimum(cmd, v + accel * dt), cmd)
+            cmd = np.where(regard_decel, np.maximum(cmd, v - decel * dt), cmd)
+            safe_v = gap / dt + np.maximum(lead_v - decel[leader] * dt, 0)
+            cmd = np.where(((speed_mode & 1) > 0) & has_leader,
+                           np.minimum(cmd, safe_v), cmd)
+            new_v = np.where(commanded, cmd, new_v)
+
+            # speeds are bounded by the maximum speed of the vehicles and the
+            # speed limit of their current edge
+            edge_index = self._edge_index(x)
+            new_v = np.clip(new_v, 0, np.minimum(
+                table.column("max_speed")[rows],
+                self.speed_limits[edge_index]))
+
+            # collisions occur when the gap to the leader becomes negative
+            new_gap = gap + (np.where(has_leader, new_v[leader], 0) -
+                             new_v) * dt
+            crashed = has_leader & (new_gap < 0)
+            self.collided = [self.ids[i] for i in np.flatnonzero(crashed)]
+
+            table.set_rows("x", rows, np.mod(x + new_v * dt, self.length))
+            table.set_rows("speed", rows, new_v)
+            table.set_rows("command", rows, np.nan)
+
+        # insert pending vehicles
+        for veh_id, type_id, route, x, speed in self.pending:
+            self._insert(veh_id, type_id, route, x, speed)
+            self.departed.append(veh_id)
+        self.pending = []
+
+        self.time += dt
+
+    def close(self, wait=True):
+        """Closes the simulation (only present for compatibility with TraCI
+        connections)."""
+        self.ids = []
+        self.table = VehicleTable(FAST_SIM_COLUMNS)
+
+    def _insert(self, veh_id, type_id, route, x, speed):
+        """Adds a vehicle to the network."""
+        params = self.type_params[type_id]
+        row = self.table.add(veh_id)
+        for column, value in [
+                ("x", x % self.length),
+                ("speed", speed),
+                ("length", params.get("length", DEFAULT_LENGTH)),
+                ("accel", params["accel"]),
+                ("decel", params["decel"]),
+                ("tau", params["tau"]),
+                ("min_gap", params["minGap"]),
+                ("max_speed",
+                 params["maxSpeed"] * params.get("speedFactor", 1))]:
+            self.table.set_rows(column, row, float(value))
+        self.ids.append(veh_id)
+        self.types[veh_id] = type_id
+        self.routes[veh_id] = route
+        self.colors[veh_id] = (255, 255, 255, 255)
+
+    def _edge_index(self, x):
+        """Returns the index of the edge at every position along the loop."""
+        return np.searchsorted(self.edge_starts, x, side="right") - 1
+
+    def _leaders(self, x, length):
+        """Returns the index of the leader of every vehicle (-1 if there is no
+        other vehicle in the network), and the bumper-to-bumper gap to it."""
+        n = len(x)
+        if n == 1:
+            return np.array([-1]), np.array([np.inf])
+        order = np.argsort(x, kind="mergesort")
+        leader = np.empty(n, dtype=np.intp)
+        leader[order] = np.roll(order, -1)
+        gap = np.mod(x[leader] - x, self.length) - length[leader]
+        return leader, gap
+
+    def _idm_accel(self, rows, v, lead_v, gap, has_leader):
+        """Returns the accelerations of the Intelligent Driver Model."""
+        table = self.table
+        a = table.column("accel")[rows]
+        b = table.column("decel")[rows]
+        s0 = table.column("min_gap")[rows]
+        t = table.column("tau")[rows]
+        v0 = table.column("max_speed")[rows]
+
+        s_star = s0 + np.maximum(
+            0, v * t + v * (v - lead_v) / (2 * np.sqrt(a * b)))
+        interaction = np.where(
+            has_leader, (s_star / np.maximum(gap, 1e-3)) ** 2, 0)
+
+        return a * (1 - (v / v0) ** IDM_DELTA - interaction)
+
+    def _get_results(self):
+        """Returns the subscription results of all vehicles."""
+        if self._results is not None:
+            return self._results
+
+        results = {}
+        if len(self.ids) > 0:
+            rows = self.table.rows(self.ids)
+            x = self.table.column("x")[rows]
+            v = self.table.column("speed")[rows]
+            length = self.table.column("length")[rows]
+            min_gap = self.table.column("min_gap")[rows]
+            edge_index = self._edge_index(x)
+            pos = x - self.edge_starts[edge_index]
+            leader, gap = self._leaders(x, length)
+
+            for i, veh_id in enumerate(self.ids):
+                results[veh_id] = {
+                    tc.VAR_LANE_INDEX: 0,
+                    tc.VAR_LANEPOSITION: float(pos[i]),
+                    tc.VAR_ROAD_ID: self.edges[edge_index[i]],
+                    tc.VAR_SPEED: float(v[i]),
+                    tc.VAR_EDGES: self.routes[veh_id],
+                    tc.VAR_LEADER: None if leader[i] < 0 else
+                    (self.ids[leader[i]], float(gap[i] - min_gap[i])),
+                }
+
+        self._results = results
+        return results
+
+
+class _VehicleDomain:
+    """Vehicle commands of the fast simulation (see traci.vehicle)."""
+
+    def __init__(self, sim):
+        self._sim = sim
+
+    def getIDList(self):
+        return list(self._sim.ids)
+
+    def getSubscriptionResults(self, objectID=None):
+        results = self._sim._get_results()
+        if objectID is not None:
+            return results.get(objectID, {})
+        return results
+
+    def subscribe(self, objectID, varIDs=None, *args, **kwargs):
+        pass
+
+    def subscribeLeader(self, objectID, dist=0., *args, **kwargs):
+        pass
+
+    def unsubscribe(self, objectID):
+        pass
+
+    def _get(self, veh_id, var):
+        return self._sim._get_results()[veh_id][var]
+
+    def getRoadID(self, vehID):
+        return self._get(vehID, tc.VAR_ROAD_ID)
+
+    def getLanePosition(self, vehID):
+        return self._get(vehID, tc.VAR_LANEPOSITION)
+
+    def getLaneIndex(self, vehID):
+        return 0
+
+    def getSpeed(self, vehID):
+        return self._get(vehID, tc.VAR_SPEED)
+
+    def getLength(self, vehID):
+        return self._sim.table.get("length", vehID)
+
+    def getTypeID(self, vehID):
+        return self._sim.types[vehID]
+
+    def getRouteID(self, vehID):
+        return "route" + self._sim.routes[vehID][0]
+
+    def getRoute(self, vehID):
+        return self._sim.routes[vehID]
+
+    def getPosition(self, vehID):
+        return self._sim.table.get("x", vehID), 0.
+
+    def getColor(self, vehID):
+        return self._sim.colors[vehID]
+
+    def setColor(self, vehID, color):
+        self._sim.colors[vehID] = color
+
+    def setRoute(self, vehID, edgeList):
+        self._sim.routes[vehID] = list(edgeList)
+
+    def setSpeedMode(self, vehID, sm):
+        self._sim.table.set("speed_mode", vehID, sm)
+
+    def setLaneChangeMode(self, vehID, lcm):
+        pass
+
+    def changeLane(self, vehID, laneIndex, duration):
+        pass
+
+    def setMaxSpeed(self, vehID, speed):
+        self._sim.table.set("max_speed", vehID, speed)
+
+    def slowDown(self, vehID, speed, duration):
+        self._sim.table.set("command", vehID, speed)
+
+    def remove(self, vehID, reason=tc.REMOVE_VAPORIZED):
+        sim = self._sim
+        if vehID not in sim.table:
+            raise KeyError("Vehicle '{}' is not known.".format(vehID))
+        sim.table.remove(vehID)
+        sim.ids.remove(vehID)
+        sim._results = None
+
+    def addFull(self, vehID, routeID, typeID="DEFAULT_VEHTYPE",
+                depart=None, departLane="first", departPos="base",
+                departSpeed="0", *args, **kwargs):
+        sim = self._sim
+        if vehID in sim.table:
+            raise ValueError("Vehicle '{}' is already in the network."
+                             .format(vehID))
+        edge = routeID[len("route"):]
+        route = list(sim.scenario.generator.rts[edge])
+        x = sim.edge_start[edge] + float(departPos)
+        sim.pending.append((vehID, typeID, route, x, float(departSpeed)))
+
+
+class _SimulationDomain:
+    """Simulation commands of the fast simulation (see traci.simulation)."""
+
+    def __init__(self, sim):
+        self._sim = sim
+
+    def subscribe(self, varIDs=None, *args, **kwargs):
+        pass
+
+    def getSubscriptionResults(self, objectID=None):
+        return {tc.VAR_DEPARTED_VEHICLES_IDS: list(self._sim.departed),
+                tc.VAR_ARRIVED_VEHICLES_IDS: [],
+                tc.VAR_TELEPORT_STARTING_VEHICLES_IDS:
+                    list(self._sim.collided)}
+
+    def getDepartedNumber(self):
+        return len(self._sim.departed)
+
+    def getStartingTeleportNumber(self):
+        return len(self._sim.collided)
+
+    def getTime(self):
+        return self._sim.time
+
+    def getNetBoundary(self):
+        return (0., 0.), (self._sim.length, 0.)
+
+
+class _TrafficLightDomain:
+    """Traffic light commands of the fast simulation, whose networks do not
+    contain any traffic lights."""
+
+    def getIDList(self):
+        return []
+
+    def subscribe(self, objectID, varIDs=None, *args, **kwargs):
+        pass
+
+    def getSubscriptionResults(self, objectID=None):
+        return {}
+
+
+class _JunctionDomain:
+    """Junction commands of the fast simulation. The whole network is
+    represented by a single junction, so that context subscriptions return the
+    states of all vehicles."""
+
+    def __init__(self, sim):
+        self._sim = sim
+
+    def getIDList(self):
+        return ["loop"]
+
+    def getPosition(self, junctionID):
+        return 0., 0.
+
+    def subscribeContext(self, objectID, domain, dist, varIDs=None, *args,
+                         **kwargs):
+        pass
+
+    def getContextSubscriptionResults(self, objectID=None):
+        return {veh_id: {var: value for var, value in obs.items()
+                         if var != tc.VAR_LEADER}
+                for veh_id, obs in self._sim._get_results().items()}
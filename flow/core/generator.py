@@ -1,4 +1,6 @@
 from flow.core.util import makexml, printxml, ensure_dir
+from flow.core import net_cache
+from flow.core import compiled_net
 
 import subprocess
 import logging
@@ -50,6 +52,14 @@ class Generator(Serializable):
         self.netfn = ""
         self.vehicle_ids = []
 
+        # whether the network was loaded from the net cache rather than
+        # generated by netconvert (see flow.core.net_cache)
+        self.net_from_cache = False
+
+        # compiled representation of the .net.xml file, if the network is
+        # loaded through _import_compiled_net (see flow.core.compiled_net)
+        self.compiled_net = None
+
         ensure_dir("%s" % self.net_path)
         ensure_dir("%s" % self.cfg_path)
 
@@ -78,6 +88,11 @@ class Generator(Serializable):
         The above files are then combined to form a .net.xml file describing
         the shape of the traffic network in a form compatible with SUMO.
 
+        If the same files were already converted by a previous run (of any
+        process sharing the net cache), the .net.xml file and its edges and
+        connections are instead loaded from the cache (see
+        flow.core.net_cache).
+
         Parameters
         ----------
         net_params : flow.core.params.NetParams type
@@ -182,19 +197,39 @@ class Generator(Serializable):
         x.append(t)
         printxml(x, self.net_path + cfgfn)
 
+        # location of the .net.xml file
+        self.netfn = netfn
+
+        # reuse the network generated by a previous run from the same inputs
+        # to netconvert, if available (see flow.core.net_cache)
+        if net_params.use_net_cache:
+            input_files = [self.net_path + nodfn, self.net_path + edgfn]
+            if types is not None:
+                input_files.append(self.net_path + typfn)
+            if connections is not None:
+                input_files.append(self.net_path + confn)
+            cache_key = net_cache.get_key(
+                self.__class__, input_files,
+                {"no_internal_links": no_internal_links})
+
+            cached = net_cache.load(cache_key, self.cfg_path + netfn)
+            if cached is not None:
+                self.net_from_cache = True
+                return cached
+
         subprocess.call(
             ["netconvert -c " + self.net_path + cfgfn + " --output-file=" +
              self.cfg_path + netfn + ' --no-internal-links="%s"'
              % no_internal_links], shell=True)
 
-        # location of the .net.xml file
-        self.netfn = netfn
-
         # collect data from the generated network configuration file
         error = None
         for _ in range(RETRIES_ON_ERROR):
             try:
                 edges_dict, conn_dict = self._import_edges_from_net()
+                if net_params.use_net_cache:
+                    net_cache.store(cache_key, self.cfg_path + netfn,
+                                    edges_dict, conn_dict)
                 return edges_dict, conn_dict
             except Exception as error:
                 print("Error during start: {}".format(traceback.format_exc()))
@@ -461,6 +496,27 @@ class Generator(Serializable):
                 inp.append(E("gui-settings-file", value=gui))
         return inp
 
+    def _import_compiled_net(self):
+        """Loads the edges and connections of the .net.xml file from its
+        compiled representation, which is memory-mapped rather than parsed
+        (see flow.core.compiled_net). The file is compiled if needed.
+
+        The compiled network is stored under compiled_net.
+
+        Returns
+        -------
+        net_data : flow.core.compiled_net.EdgeView
+            read-only view of the edge data, see _import_edges_from_net
+        connection_data : dict <flow.core.compiled_net.ConnectionView>
+            read-only views of the connection data, see
+            _import_edges_from_net
+        """
+        self.compiled_net = compiled_net.load(
+            os.path.join(self.net_params.cfg_path, self.netfn),
+            no_internal_links=self.net_params.no_internal_links)
+
+        return self.compiled_net.edges, self.compiled_net.connections
+
     def _import_edges_from_net(self):
         """Utility function for computing edge information.
 
@@ -0,0 +1,521 @@
+"""Lane-level spatial index and batch computation of lane leaders,
+followers, headways, and tailways.
+
+The vehicles in every edge/lane pair are kept sorted by position in a
+persistent index (LaneIndex). Given this order, the lane leaders and followers
+of any number of vehicles are found with a single vectorized binary search.
+Vehicles without a leader (follower) on their current edge are resolved by
+walking the network, for all vehicles at once, through lookup tables of the
+next (previous) edge/lane pair of every edge/lane pair in the network.
+"""
+
+from itertools import chain
+
+import numpy as np
+
+
+class LaneGraph:
+
+    def __init__(self, scenario):
+        """Lookup tables describing the lane connectivity of a scenario.
+
+        Every (edge, lane) pair in the network is assigned an integer code
+        (node) equal to edge_code * max_lanes + lane, where edge_code is the
+        index of the edge in `edges`.
+
+        Parameters
+        ----------
+        scenario : Scenario type
+            scenario whose edges, junctions, and connections are imported
+        """
+        self.scenario = scenario
+
+        edge_list = scenario.get_edge_list() + scenario.get_junction_list()
+
+        # number of edges/junctions that are traversed when looking for
+        # leaders and followers on the neighboring edges
+        self.num_edges = len(edge_list)
+
+        # maximum number of lanes in the network
+        self.max_lanes = max([scenario.num_lanes(edge_id)
+                              for edge_id in edge_list] + [1])
+
+        # collect the edge/lane pairs connected to every edge/lane pair
+        self.edges = list(edge_list)
+        self.edge_codes = {edge: i for i, edge in enumerate(self.edges)}
+        next_pairs, prev_pairs = {}, {}
+        for edge in edge_list:
+            for lane in range(scenario.num_lanes(edge)):
+                next_pairs[edge, lane] = scenario.next_edge(edge, lane)
+                prev_pairs[edge, lane] = scenario.prev_edge(edge, lane)
+
+        # edges that only appear in the connections of other edges are added
+        # at the end of the list of edges
+        for pairs in list(next_pairs.values()) + list(prev_pairs.values()):
+            for edge, lane in pairs[:1]:
+                if edge not in self.edge_codes:
+                    self.edge_codes[edge] = len(self.edges)
+                    self.edges.append(edge)
+                self.max_lanes = max(self.max_lanes, lane + 1)
+
+        num_nodes = len(self.edges) * self.max_lanes
+
+        # length of the edge of each node
+        self.length = np.repeat(
+            np.array([scenario.edge_length(edge) for edge in self.edges],
+                     dtype=float),
+            self.max_lanes)
+
+        # node in front of / behind each node, or -1 if there is none
+        self.next = np.full(num_nodes, -1, dtype=np.intp)
+        self.prev = np.full(num_nodes, -1, dtype=np.intp)
+        for table, pairs in ((self.next, next_pairs), (self.prev, prev_pairs)):
+            for (edge, lane), connected in pairs.items():
+                if len(connected) > 0:
+                    table[self.node(edge, lane)] = \
+                        self.node(connected[0][0], connected[0][1])
+
+    def node(self, edge, lane):
+        """Returns the code of an edge/lane pair."""
+        return self.edge_codes[edge] * self.max_lanes + lane
+
+    def nodes(self, edges, lanes):
+        """Returns the code of several edge/lane pairs, or -1 for pairs whose
+        edge is not part of the network."""
+        codes = np.fromiter((self.edge_codes.get(edge, -1) for edge in edges),
+                            dtype=np.intp, count=len(edges))
+        lanes = np.asarray(lanes, dtype=np.intp)
+        return np.where(codes >= 0, codes * self.max_lanes + lanes, -1)
+
+
+class LaneIndex:
+
+    def __init__(self):
+        """Names of the vehicles in every edge/lane pair of the network,
+        sorted by position.
+
+        The index persists across time steps, and is only modified for the
+        vehicles that enter or exit the network, or change edge or lane (see
+        update). Since vehicles cannot overtake each other without changing
+        lane, the remaining vehicles keep their order from one step to the
+        next, and are only re-sorted if a vehicle is found out of order next
+        to a vehicle that was inserted in their lane (e.g. after collisions).
+        """
+        # Key = edge, Element = dict with Key = lane, Element = list of
+        #       vehicle ids sorted by position
+        self._edges = {}
+
+        # Key = vehicle id, Element = (edge, lane) of the vehicle
+        self._where = {}
+
+        # number of vehicles that were inserted/removed in the last update
+        self.num_moved = 0
+
+        # incremented every time vehicles are inserted, removed, or re-sorted,
+        # so that users of the index may reuse results computed from it
+        self.version = 0
+
+        # lane graph and version of the index of the last result of
+        # sorted_ids, and the result itself
+        self._sorted = (None, None, [])
+
+    def update(self, ids, edges, lanes, position):
+        """Moves vehicles that entered the network, or changed edge or lane.
+
+        Only the specified vehicles are moved. Each of them is inserted in
+        its new edge/lane pair with a binary search over the positions of the
+        vehicles in the lane, so the cost of an update is proportional to the
+        number of vehicles that moved, and not to the number of vehicles in
+        the network.
+
+        Parameters
+        ----------
+        ids : list<str>
+            names of the vehicles whose edge or lane changed since the last
+            update, or that entered the network. Vehicles whose position in
+            their lane may no longer be valid (e.g. teleported vehicles) may
+            be included as well.
+        edges : list<str>
+            current edge of each of these vehicles ("" if the vehicle is no
+            longer in the network)
+        lanes : list<int>
+            current lane of each of these vehicles
+        position : function
+            returns the current position of a vehicle relative to its edge.
+            This is only called for the vehicles compared with during the
+            binary searches.
+        """
+        num_moved = 0
+        for veh_id, edge, lane in zip(ids, edges, lanes):
+            if veh_id in self._where:
+                self._remove(veh_id)
+                num_moved += 1
+            if edge:
+                self._insert(veh_id, edge, int(lane), position)
+                num_moved += 1
+
+        self.num_moved = num_moved
+        if num_moved > 0:
+            self.version += 1
+
+    def remove(self, veh_id):
+        """Removes a vehicle that exited the network from the index, if it is
+        in the index."""
+        if veh_id in self._where:
+            self._remove(veh_id)
+            self.version += 1
+
+    def _insert(self, veh_id, edge, lane, position):
+        """Inserts a vehicle in an edge/lane pair.
+
+        If the vehicles next to the inserted vehicle are not in order, the
+        lane is sorted again.
+        """
+        lane_ids = self._edges.setdefault(edge, {}).setdefault(lane, [])
+        pos = position(veh_id)
+
+        # binary search over the positions of the vehicles in the lane
+        lo, hi = 0, len(lane_ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pos < position(lane_ids[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        lane_ids.insert(lo, veh_id)
+        self._where[veh_id] = (edge, lane)
+
+        # the inserted vehicle is in order with the vehicles right in front of
+        # and behind it. If these vehicles are not in order with their own
+        # neighbors, vehicles overtook each other in the lane (e.g. after a
+        # collision), and the binary search may have misplaced the vehicle
+        if (lo > 1 and position(lane_ids[lo - 2]) >
+                position(lane_ids[lo - 1])) or \
+                (lo < len(lane_ids) - 2 and position(lane_ids[lo + 1]) >
+                 position(lane_ids[lo + 2])):
+            lane_ids.sort(key=position)
+
+    def _remove(self, veh_id):
+        """Removes a vehicle from the index."""
+        edge, lane = self._where.pop(veh_id)
+        lanes_dict = self._edges[edge]
+        lanes_dict[lane].remove(veh_id)
+        if len(lanes_dict[lane]) == 0:
+            del lanes_dict[lane]
+            if len(lanes_dict) == 0:
+                del self._edges[edge]
+
+    def get_ids_by_lane(self, edge, lane):
+        """Returns the names of the vehicles in an edge/lane pair, sorted by
+        position."""
+        return list(self._edges.get(edge, {}).get(lane, []))
+
+    def get_ids_by_edge(self, edge):
+        """Returns the names of the vehicles in an edge, sorted by lane and
+        then by position."""
+        lanes_dict = self._edges.get(edge, {})
+        return [veh_id for lane in sorted(lanes_dict)
+                for veh_id in lanes_dict[lane]]
+
+    def get_edges(self):
+        """Returns the edges that currently contain vehicles."""
+        return list(self._edges.keys())
+
+    def sorted_ids(self, graph):
+        """Returns the names of the vehicles located in the edges of a lane
+        graph, sorted by edge code, lane, and position.
+
+        The result is reused until vehicles are inserted in or removed from
+        the index, and should therefore not be modified.
+
+        Parameters
+        ----------
+        graph : LaneGraph
+            lane connectivity of the network
+        """
+        sorted_graph, version, ids = self._sorted
+        if sorted_graph is not graph or version != self.version:
+            edges = sorted((graph.edge_codes[edge], edge)
+                           for edge in self._edges
+                           if edge in graph.edge_codes)
+            ids = list(chain.from_iterable(
+                self._edges[edge][lane]
+                for _, edge in edges for lane in sorted(self._edges[edge])))
+            self._sorted = (graph, self.version, ids)
+        return ids
+
+
+def lane_headways(graph, ids, nodes, positions, lengths, query, order=None):
+    """Computes the lane headways, tailways, leaders, and followers of several
+    vehicles.
+
+    Parameters
+    ----------
+    graph : LaneGraph
+        lane connectivity of the network
+    ids : list<str>
+        names of all vehicles in the network
+    nodes : np.ndarray
+        edge/lane code of every vehicle (see LaneGraph.nodes), or -1 for
+        vehicles that are not on any edge of the network
+    positions : np.ndarray
+        position of every vehicle relative to its current edge
+    lengths : np.ndarray
+        length of every vehicle
+    query : np.ndarray
+        indices (in ids) of the vehicles whose lane data is computed. These
+        vehicles must be located on an edge of the network.
+    order : np.ndarray, optional
+        indices of the vehicles in the network sorted by edge, lane, and
+        position (e.g. from a LaneIndex). If not specified, the vehicles are
+        sorted here.
+
+    Returns
+    -------
+    order : np.ndarray
+        indices of the vehicles in the network, sorted by edge, lane, and
+        position. Vehicles that are not on any edge are not included.
+    headway : list < list<float> >
+        Index = vehicle index in query, lane index
+        Element = headway at this lane
+    tailway : list < list<float> >
+        Index = vehicle index in query, lane index
+        Element = tailway at this lane
+    leader : list < list<str> >
+        Index = vehicle index in query, lane index
+        Element = leader at this lane
+    follower : list < list<str> >
+        Index = vehicle index in query, lane index
+        Element = follower at this lane
+    """
+    nodes = np.asarray(nodes, dtype=np.intp)
+    positions = np.asarray(positions, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    query = np.asarray(query, dtype=np.intp)
+    order = _sort(nodes, positions, order)
+
+    if len(query) == 0:
+        return order, [], [], [], []
+
+    # one (vehicle, lane) pair for every lane of the edge of each vehicle
+    edge_codes = nodes[query] // graph.max_lanes
+    num_lanes = np.array([graph.scenario.num_lanes(graph.edges[code])
+                          for code in edge_codes], dtype=np.intp)
+    num_lanes = np.maximum(num_lanes, 0)
+    pair_veh = np.repeat(query, num_lanes)
+    offsets = np.concatenate(([0], np.cumsum(num_lanes)))
+    pair_lane = np.arange(offsets[-1]) - np.repeat(offsets[:-1], num_lanes)
+    pair_node = np.repeat(edge_codes, num_lanes) * graph.max_lanes + pair_lane
+
+    leader, headway, follower, tailway = _search(
+        graph, nodes, positions, lengths, order, pair_veh, pair_node)
+
+    # split the (vehicle, lane) pairs back into per-vehicle lists
+    leader_ids = [ids[i] if i >= 0 else "" for i in leader]
+    follower_ids = [ids[i] if i >= 0 else "" for i in follower]
+    headway = headway.tolist()
+    tailway = tailway.tolist()
+    bounds = list(zip(offsets[:-1], offsets[1:]))
+
+    return (order,
+            [headway[i:j] for i, j in bounds],
+            [tailway[i:j] for i, j in bounds],
+            [leader_ids[i:j] for i, j in bounds],
+            [follower_ids[i:j] for i, j in bounds])
+
+
+def lane_leaders(graph, ids, nodes, positions, lengths, query, order=None):
+    """Computes the leaders and headways of several vehicles in their current
+    lane.
+
+    Parameters
+    ----------
+    graph : LaneGraph
+        lane connectivity of the network
+    ids : list<str>
+        names of all vehicles in the network
+    nodes : np.ndarray
+        edge/lane code of every vehicle (see LaneGraph.nodes), or -1 for
+        vehicles that are not on any edge of the network
+    positions : np.ndarray
+        position of every vehicle relative to its current edge
+    lengths : np.ndarray
+        length of every vehicle
+    query : np.ndarray
+        indices (in ids) of the vehicles whose leaders are computed. These
+        vehicles must be located on an edge of the network.
+    order : np.ndarray, optional
+        indices of the vehicles in the network sorted by edge, lane, and
+        position. If not specified, the vehicles are sorted here.
+
+    Returns
+    -------
+    order : np.ndarray
+        indices of the vehicles in the network, sorted by edge, lane, and
+        position. Vehicles that are not on any edge are not included.
+    headway : np.ndarray
+        headway of every vehicle in query (1000 if there is no leader)
+    leader : list<str>
+        leader of every vehicle in query ("" if there is no leader)
+    """
+    nodes = np.asarray(nodes, dtype=np.intp)
+    positions = np.asarray(positions, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    query = np.asarray(query, dtype=np.intp)
+    order = _sort(nodes, positions, order)
+
+    if len(query) == 0:
+        return order, np.zeros(0), []
+
+    leader, headway, _, _ = _search(
+        graph, nodes, positions, lengths, order, query, nodes[query],
+        followers=False)
+
+    return order, headway, [ids[i] if i >= 0 else "" for i in leader]
+
+
+def _sort(nodes, positions, order=None):
+    """Returns the indices of the vehicles on an edge of the network sorted
+    by (edge, lane, position), unless an order is already provided.
+
+    The sort is stable, so vehicles with the same position keep their order
+    in the list of vehicles.
+    """
+    if order is None:
+        valid = np.flatnonzero(nodes >= 0)
+        order = valid[np.lexsort((positions[valid], nodes[valid]))]
+    return np.asarray(order, dtype=np.intp)
+
+
+def _search(graph, nodes, positions, lengths, order, pair_veh, pair_node,
+            followers=True):
+    """Finds the leader and follower of vehicles in the specified lanes.
+
+    Parameters
+    ----------
+    graph : LaneGraph
+        lane connectivity of the network
+    nodes, positions, lengths : np.ndarray
+        edge/lane code, position, and length of every vehicle
+    order : np.ndarray
+        indices of the vehicles sorted by edge, lane, and position
+    pair_veh : np.ndarray
+        index of the vehicle of every (vehicle, lane) pair
+    pair_node : np.ndarray
+        edge/lane code of the lane of every (vehicle, lane) pair
+    followers : bool, optional
+        whether to compute followers and tailways
+
+    Returns
+    -------
+    leader, headway, follower, tailway : np.ndarray
+        index of the leader, headway, index of the follower, and tailway of
+        every pair (-1 and 1000 if they are not found)
+    """
+    sorted_nodes = nodes[order]
+    sorted_pos = positions[order]
+
+    # first and last (sorted) index of the vehicles in each node
+    num_nodes = len(graph.next)
+    first = np.full(num_nodes, -1, dtype=np.intp)
+    last = np.full(num_nodes, -1, dtype=np.intp)
+    occupied, start, count = np.unique(
+        sorted_nodes, return_index=True, return_counts=True)
+    first[occupied] = start
+    last[occupied] = start + count - 1
+
+    this_pos = positions[pair_veh]
+    this_len = lengths[pair_veh]
+
+    # boundaries of the vehicles in each pair's lane within the sorted order
+    lo = np.searchsorted(sorted_nodes, pair_node, side="left")
+    hi = np.searchsorted(sorted_nodes, pair_node, side="right")
+
+    # index of the first vehicle in the lane that is not behind the vehicle,
+    # found with a binary search over the composite key (node, position)
+    pos_min = min(sorted_pos.min(), this_pos.min())
+    scale = max(sorted_pos.max(), this_pos.max()) - pos_min + 1
+    sorted_key = sorted_nodes * scale + (sorted_pos - pos_min)
+    pair_key = pair_node * scale + (this_pos - pos_min)
+    index = np.clip(np.searchsorted(sorted_key, pair_key, side="left"),
+                    lo, hi)
+
+    headway = np.full(len(pair_veh), 1000.)
+    tailway = np.full(len(pair_veh), 1000.)
+    leader = np.full(len(pair_veh), -1, dtype=np.intp)
+    follower = np.full(len(pair_veh), -1, dtype=np.intp)
+
+    # the lane leader is the vehicle at the index, unless this is the vehicle
+    # itself, in which case it is the vehicle in front of it
+    lead = index.copy()
+    is_self = lead < hi
+    is_self[is_self] = order[lead[is_self]] == pair_veh[is_self]
+    lead[is_self] += 1
+    found = lead < hi
+    leader[found] = order[lead[found]]
+    headway[found] = sorted_pos[lead[found]] - this_pos[found] \
+        - lengths[leader[found]]
+
+    # if lane leaders are not found, check the next edges
+    pending = np.flatnonzero(leader < 0)
+    cur = pair_node[pending]
+    add_length = np.zeros(len(pending))
+    for _ in range(graph.num_edges):
+        # stop if there are no edge/lane pairs in front of the current one
+        nxt = graph.next[cur]
+        keep = nxt >= 0
+        pending, cur, nxt, add_length = \
+            pending[keep], cur[keep], nxt[keep], add_length[keep]
+        if len(pending) == 0:
+            break
+
+        add_length += graph.length[cur]
+        cur = nxt
+
+        # the leader is the rearmost vehicle on the new edge/lane pair
+        found = first[cur] >= 0
+        idx = first[cur[found]]
+        veh = pending[found]
+        leader[veh] = order[idx]
+        headway[veh] = sorted_pos[idx] - this_pos[veh] + add_length[found] \
+            - lengths[order[idx]]
+
+        keep = ~found
+        pending, cur, add_length = pending[keep], cur[keep], add_length[keep]
+
+    if not followers:
+        return leader, headway, follower, tailway
+
+    # the lane follower is the vehicle right behind the index
+    found = index > lo
+    follower[found] = order[index[found] - 1]
+    tailway[found] = this_pos[found] - sorted_pos[index[found] - 1] \
+        - this_len[found]
+
+    # if lane followers are not found, check the previous edges
+    pending = np.flatnonzero(follower < 0)
+    cur = pair_node[pending]
+    add_length = np.zeros(len(pending))
+    for _ in range(graph.num_edges):
+        # stop if there are no edge/lane pairs behind the current one
+        prv = graph.prev[cur]
+        keep = prv >= 0
+        pending, prv, add_length = pending[keep], prv[keep], add_length[keep]
+        if len(pending) == 0:
+            break
+
+        cur = prv
+        add_length += graph.length[cur]
+
+        # the follower is the frontmost vehicle on the new edge/lane pair
+        found = last[cur] >= 0
+        idx = last[cur[found]]
+        veh = pending[found]
+        follower[veh] = order[idx]
+        tailway[veh] = this_pos[veh] - sorted_pos[idx] + add_length[found] \
+            - this_len[veh]
+
+        keep = ~found
+        pending, cur, add_length = pending[keep], cur[keep], add_length[keep]
+
+    return leader, headway, follower, tailway
@@ -0,0 +1,61 @@
+"""Lazy loading of the attributes of a package.
+
+The __init__ modules of flow.envs, flow.scenarios and flow.controllers
+re-export classes defined in every module of the package. Importing all of
+these modules (and their dependencies, e.g. scipy) is costly, in particular
+for worker processes that only need one environment. Instead, the modules
+are imported the first time one of their classes is accessed, through the
+module-level __getattr__ of PEP 562.
+
+Example
+-------
+>>> __getattr__, __dir__ = lazy_attributes(__name__, globals(), {
+>>>     "AccelEnv": "flow.envs.loop.loop_accel"})
+
+On python < 3.7, which does not support PEP 562, all attributes are imported
+right away.
+"""
+
+import importlib
+import sys
+
+
+def lazy_attributes(package, package_globals, attributes):
+    """Returns the __getattr__ and __dir__ functions of a package whose
+    attributes are imported from their modules on first access.
+
+    Parameters
+    ----------
+    package : str
+        name of the package
+    package_globals : dict
+        globals of the __init__ module of the package. Attributes are cached
+        in this dict once imported.
+    attributes : dict
+        Key = name of an attribute of the package, Element = name of the
+        module the attribute is imported from
+
+    Returns
+    -------
+    callable
+        __getattr__ function of the package
+    callable
+        __dir__ function of the package
+    """
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError("module {!r} has no attribute {!r}"
+                                 .format(package, name))
+        value = getattr(importlib.import_module(attributes[name]), name)
+        # later accesses do not go through __getattr__
+        package_globals[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(package_globals) | set(attributes))
+
+    if sys.version_info < (3, 7):
+        for name in attributes:
+            __getattr__(name)
+
+    return __getattr__, __dir__
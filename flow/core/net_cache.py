@@ -0,0 +1,170 @@
+"""Content-addressed cache of the networks generated by netconvert.
+
+Generating a network consists of writing the node, edge, type, and
+connection files of the network, converting them into a .net.xml file with
+netconvert, and parsing the edges and connections of the .net.xml file (see
+Generator.generate_net). The last two steps are by far the most expensive,
+and produce the same outputs whenever the inputs to netconvert are the same.
+
+Entries of the cache are keyed by a hash of the generator class, of the
+inputs to netconvert (which are determined by the net_params and traffic
+lights of the scenario), and of the version of netconvert. Each entry is a
+directory containing the .net.xml file and the parsed edges and connections.
+Entries are written atomically, so the cache directory may be shared by
+several processes, or by the workers of a cluster through a shared file
+system.
+
+The location of the cache is specified by NET_CACHE_PATH in the flow config
+(see flow/config_default.py).
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import subprocess
+import tempfile
+
+try:
+    # Load user config if exists, else load default config
+    import flow.core.config as config
+except ImportError:
+    import flow.config_default as config
+
+# directory containing the entries of the cache
+CACHE_PATH = getattr(config, "NET_CACHE_PATH", None) or \
+    os.path.join(os.path.expanduser("~"), ".cache", "flow", "net")
+
+# names of the files of every entry
+NET_FILE = "net.xml"
+DATA_FILE = "data.pkl"
+
+# version of netconvert (computed on first use)
+_netconvert_version = None
+
+
+def netconvert_version():
+    """Returns the version string printed by netconvert, or "unknown" if
+    netconvert cannot be called."""
+    global _netconvert_version
+    if _netconvert_version is None:
+        try:
+            out = subprocess.check_output(["netconvert", "--version"])
+            _netconvert_version = out.decode("utf8", "replace") \
+                .strip().splitlines()[0]
+        except (OSError, subprocess.CalledProcessError, IndexError):
+            _netconvert_version = "unknown"
+    return _netconvert_version
+
+
+def get_key(generator_class, input_files, options):
+    """Returns the key of the network generated from a set of inputs.
+
+    Parameters
+    ----------
+    generator_class : type
+        class of the generator of the network
+    input_files : list<str>
+        paths to the files passed to netconvert (e.g. the node and edge
+        files)
+    options : dict
+        other options affecting the generated network or its parsing (e.g.
+        no_internal_links)
+
+    Returns
+    -------
+    str
+        hexadecimal digest identifying the network
+    """
+    h = hashlib.sha256()
+    h.update("{}.{}".format(generator_class.__module__,
+                            generator_class.__name__).encode("utf8"))
+    h.update(netconvert_version().encode("utf8"))
+    h.update(repr(sorted(options.items())).encode("utf8"))
+    for path in input_files:
+        h.update(os.path.basename(path).encode("utf8"))
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def load(key, net_file, cache_path=None):
+    """Loads a network from the cache.
+
+    Parameters
+    ----------
+    key : str
+        key of the network (see get_key)
+    net_file : str
+        path the .net.xml file of the network is copied to
+    cache_path : str, optional
+        directory of the cache, defaults to CACHE_PATH
+
+    Returns
+    -------
+    tuple or None
+        edges and connections of the network, as returned by
+        Generator._import_edges_from_net, or None if the network is not in
+        the cache
+    """
+    entry = os.path.join(cache_path or CACHE_PATH, key)
+    if not os.path.isdir(entry):
+        return None
+
+    try:
+        with open(os.path.join(entry, DATA_FILE), "rb") as f:
+            edges, connections = pickle.load(f)
+        shutil.copyfile(os.path.join(entry, NET_FILE), net_file)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        logging.warning(" Ignoring invalid net cache entry " + entry)
+        return None
+
+    return edges, connections
+
+
+def store(key, net_file, edges, connections, cache_path=None):
+    """Stores a network in the cache.
+
+    Failures to write to the cache are logged and otherwise ignored.
+
+    Parameters
+    ----------
+    key : str
+        key of the network (see get_key)
+    net_file : str
+        path to the .net.xml file of the network
+    edges : dict
+        edges of the network, as returned by
+        Generator._import_edges_from_net
+    connections : dict
+        connections of the network, as returned by
+        Generator._import_edges_from_net
+    cache_path : str, optional
+        directory of the cache, defaults to CACHE_PATH
+    """
+    cache_path = cache_path or CACHE_PATH
+    entry = os.path.join(cache_path, key)
+    if os.path.isdir(entry):
+        return
+
+    tmp = None
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        # the entry is written in a temporary directory, which is then
+        # renamed, so that other processes never see partial entries
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=cache_path)
+        shutil.copyfile(net_file, os.path.join(tmp, NET_FILE))
+        with open(os.path.join(tmp, DATA_FILE), "wb") as f:
+            pickle.dump((edges, connections), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, entry)
+        tmp = None
+    except OSError:
+        # the entry may have been stored by another process in the meantime
+        if not os.path.isdir(entry):
+            logging.warning(" Could not store the network in the net cache "
+                            + cache_path)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
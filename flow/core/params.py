@@ -16,7 +16,15 @@ class SumoParams:
                  seed=None,
                  restart_instance=False,
                  print_warnings=True,
-                 teleport_time=-100):
+                 teleport_time=-100,
+                 subscription_mode="vehicle",
+                 simulator="sumo",
+                 warm_start=True,
+                 trajectory_path=None,
+                 trajectory_fields=None,
+                 trajectory_interval=1,
+                 profile=False,
+                 profile_path=None):
         """Sumo-specific parameters
 
         These parameters are used to customize a sumo simulation instance upon
@@ -63,6 +71,46 @@ class SumoParams:
         teleport_time: int, optional
             If negative, vehicles don't teleport in gridlock. If positive,
             they teleport after teleport_time seconds
+        subscription_mode: str, optional
+            specifies how the states of the vehicles are collected from sumo.
+            May be:
+                - 'vehicle' to subscribe every vehicle individually (default)
+                - 'context' to collect the states of all vehicles with a
+                  single context subscription, and compute the leaders and
+                  headways of the vehicles in flow (see
+                  flow.core.subscriptions)
+        simulator: str, optional
+            specifies the simulator used to run the experiment. May be:
+                - 'sumo' to run the experiment in a sumo instance (default)
+                - 'fast' to integrate the dynamics of the vehicles within the
+                  python process. This is only available for single-lane
+                  closed loops without inflows (e.g. ring roads and the
+                  figure eight), see flow.core.fast_sim
+        warm_start: bool, optional
+            if restart_instance is set, specifies whether the sumo instance
+            used after the next reset is started ahead of time, so that it
+            loads the network while the current rollout is running (see
+            flow.core.sumo_pool). Defaults to True
+        trajectory_path: str, optional
+            Path to the folder in which to record the trajectories of the
+            vehicles, from within flow rather than through the emission output
+            of sumo (see flow.core.trajectories). Trajectories are not recorded
+            if this value is not specified
+        trajectory_fields: list<str>, optional
+            states of the vehicles included in the recorded trajectories, see
+            flow.core.trajectories.FIELDS. Defaults to the speed, position,
+            edge, lane and absolute position of the vehicles
+        trajectory_interval: int, optional
+            number of simulation steps in between two recorded steps of the
+            trajectories, defaults to 1
+        profile: bool, optional
+            specifies whether to measure the time spent in the phases of
+            every step of the environment (see flow.core.profiling and
+            Env.get_profile). Defaults to False
+        profile_path: str, optional
+            Path to the folder in which to write the measurements of the
+            phases of the steps at the end of every rollout, as json files.
+            Setting this value enables profiling
 
         """
         self.port = port
@@ -77,6 +125,14 @@ class SumoParams:
         self.restart_instance = restart_instance
         self.print_warnings = print_warnings
         self.teleport_time = teleport_time
+        self.subscription_mode = subscription_mode
+        self.simulator = simulator
+        self.warm_start = warm_start
+        self.trajectory_path = trajectory_path
+        self.trajectory_fields = trajectory_fields
+        self.trajectory_interval = trajectory_interval
+        self.profile = profile
+        self.profile_path = profile_path
 
 
 class EnvParams:
@@ -88,7 +144,10 @@ class EnvParams:
                  horizon=500,
                  sort_vehicles=False,
                  warmup_steps=0,
-                 sims_per_step=1):
+                 sims_per_step=1,
+                 pipeline_steps=False,
+                 snapshot_reset=False,
+                 preallocate_observations=False):
         """Environment and experiment-specific parameters.
 
         This includes specifying the bounds of the action space and relevant
@@ -122,6 +181,30 @@ class EnvParams:
             number of sumo simulation steps performed in any given rollout
             step. RL agents perform the same action for the duration of these
             simulation steps.
+        pipeline_steps: bool, optional
+            specifies whether Env.step_async returns the observation and reward
+            of a step before sumo completes the last simulation step of that
+            step (only applies if sims_per_step is greater than one). The
+            observation and reward are then computed while sumo performs this
+            last simulation step. False by default
+        snapshot_reset: bool, optional
+            specifies whether the state of the network at the end of the
+            warm-up steps of the first rollout is saved, and restored by the
+            following resets instead of re-adding every vehicle and
+            performing the warm-up steps again. All rollouts then start from
+            the same state. If the scenario is rebuilt in between rollouts
+            (e.g. by WaveAttenuationEnv, or BottleneckEnv with
+            "reset_inflow"), the state is saved again in the new network.
+            Not available with vehicle_arrangement_shuffle or
+            starting_position_shuffle, nor with the "fast" simulator. False by
+            default
+        preallocate_observations: bool, optional
+            specifies whether the observations are written into a
+            preallocated float32 numpy array shaped like the observation
+            space (flattened if the observation space is a Tuple), which is
+            returned by step and reset instead of a list (see
+            Env.write_state). The array is overwritten at every step. False
+            by default
 
         """
         self.vehicle_arrangement_shuffle = vehicle_arrangement_shuffle
@@ -132,6 +215,9 @@ class EnvParams:
         self.sort_vehicles = sort_vehicles
         self.warmup_steps = warmup_steps
         self.sims_per_step = sims_per_step
+        self.pipeline_steps = pipeline_steps
+        self.snapshot_reset = snapshot_reset
+        self.preallocate_observations = preallocate_observations
 
     def get_additional_param(self, key):
         return self.additional_params[key]
@@ -146,7 +232,8 @@ class NetParams:
                  in_flows=None,
                  osm_path=None,
                  netfile=None,
-                 additional_params=None):
+                 additional_params=None,
+                 use_net_cache=True):
         """Network configuration parameters
 
         Unlike most other parameters, NetParams may vary drastically dependent
@@ -182,6 +269,11 @@ class NetParams:
         additional_params : dict, optional
             network specific parameters; see each subclass for a description of
             what is needed
+        use_net_cache : bool, optional
+            specifies whether networks generated by netconvert are stored in,
+            and reused from, the net cache (see flow.core.net_cache). This is
+            not used by the OpenStreetMapGenerator and NetFileGenerator
+            classes. Defaults to True
         """
         if additional_params is None:
             additional_params = {}
@@ -192,6 +284,7 @@ class NetParams:
         self.osm_path = osm_path
         self.netfile = netfile
         self.additional_params = additional_params
+        self.use_net_cache = use_net_cache
 
 
 class InitialConfig:
@@ -0,0 +1,222 @@
+"""Low-overhead profiling of the phases of the steps of an environment.
+
+The time spent by Env.step in each of its phases (see PHASES) is measured
+with a monotonic clock, along with the number of round-trips with sumo
+performed in each phase (see
+flow.core.traci_batching.TraCICommandBatcher.num_round_trips). The time
+spent in a phase is summed over the simulation steps performed within an
+environment step, and added to a histogram of the durations of the phase at
+the end of every environment step.
+
+Profiling is enabled through the "profile" and "profile_path" sumo_params.
+The histograms are then available through Env.get_profile, and may be
+written to a json file at the end of every rollout. When profiling is
+disabled (and outside of Env.step, e.g. during resets), the phases are timed
+by a context manager that does nothing.
+
+Note that phases may be nested: the time spent in "vehicles_update" includes
+the time spent in "headways".
+"""
+
+import json
+import math
+from time import perf_counter
+
+# phases of a step that are timed, in the order they are performed
+PHASES = [
+    "controllers",       # actions of the controllers of the vehicles
+    "traci_commands",    # commands sent to sumo before the simulation step
+    "simulation_step",   # simulation step performed by sumo
+    "subscriptions",     # collection of the subscription results from sumo
+    "vehicles_update",   # update of the vehicles class
+    "headways",          # lane leaders and followers of the vehicles
+    "sort_by_position",
+    "get_state",
+    "compute_reward",
+]
+
+# the durations are binned in powers of two of microseconds, the first bin
+# containing durations below 1 us and the last bin durations above ~ 8 s
+NUM_BINS = 25
+
+
+class _Timer:
+    """Context manager timing a phase of a step."""
+
+    __slots__ = ["profiler", "phase", "start", "round_trips"]
+
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+        self.start = 0.
+        self.round_trips = 0
+
+    def __enter__(self):
+        self.round_trips = self.profiler.get_round_trips()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = perf_counter() - self.start
+        profiler = self.profiler
+        profiler._step_times[self.phase] += duration
+        profiler._step_round_trips[self.phase] += \
+            profiler.get_round_trips() - self.round_trips
+        return False
+
+
+class _NullTimer:
+    """Context manager used when no step is being measured."""
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class PhaseHistogram:
+
+    def __init__(self):
+        """Instantiates an empty histogram of the durations of a phase."""
+        self.count = 0
+        self.total = 0.
+        self.min = math.inf
+        self.max = 0.
+        self.round_trips = 0
+        self.bins = [0] * NUM_BINS
+
+    def add(self, duration, round_trips=0):
+        """Adds the duration of a phase (in s) during a step, and the number
+        of round-trips with sumo performed during that phase."""
+        self.count += 1
+        self.total += duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        self.round_trips += round_trips
+        # index of the bin: smallest i such that duration < 2^i us
+        if duration < 1e-6:
+            index = 0
+        else:
+            index = min(math.frexp(duration * 1e6)[1], NUM_BINS - 1)
+        self.bins[index] += 1
+
+    def to_dict(self):
+        """Returns the statistics of the phase as a dict."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.,
+            "min": self.min if self.count else 0.,
+            "max": self.max,
+            "round_trips": self.round_trips,
+            "histogram": list(self.bins),
+        }
+
+
+class StepProfiler:
+
+    def __init__(self, enabled=True, get_round_trips=None):
+        """Instantiates a profiler of the steps of an environment.
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            whether the phases are timed
+        get_round_trips : callable, optional
+            returns the number of round-trips performed with sumo so far.
+            Round-trips are not counted if this is not specified.
+        """
+        self.enabled = enabled
+        self.get_round_trips = get_round_trips or (lambda: 0)
+
+        self._timers = {phase: _Timer(self, phase) for phase in PHASES}
+
+        # time spent and round-trips performed in each phase during the
+        # current step
+        self._step_times = dict.fromkeys(PHASES, 0.)
+        self._step_round_trips = dict.fromkeys(PHASES, 0)
+        self._step_start = None
+        self._step_round_trips_start = 0
+
+        self.histograms = {}
+        self.reset()
+
+    def phase(self, name):
+        """Returns a context manager timing a phase of the current step, or
+        doing nothing if no step is being measured.
+
+        Example
+        -------
+        >>> with env.profiler.phase("get_state"):
+        >>>     state = env.get_state()
+        """
+        if self._step_start is None:
+            return _NULL_TIMER
+        return self._timers[name]
+
+    def begin_step(self):
+        """Marks the start of a step. Phases are only timed in between calls
+        to begin_step and end_step."""
+        if not self.enabled:
+            return
+        self._step_round_trips_start = self.get_round_trips()
+        self._step_start = perf_counter()
+
+    def end_step(self):
+        """Adds the durations of the phases of the current step to the
+        histograms, as well as the total duration of the step to the "step"
+        histogram."""
+        if self._step_start is None:
+            return
+        self.histograms["step"].add(
+            perf_counter() - self._step_start,
+            self.get_round_trips() - self._step_round_trips_start)
+        for phase in PHASES:
+            if self._step_times[phase] > 0:
+                self.histograms[phase].add(self._step_times[phase],
+                                           self._step_round_trips[phase])
+                self._step_times[phase] = 0.
+                self._step_round_trips[phase] = 0
+        self._step_start = None
+
+    def reset(self):
+        """Removes all measurements."""
+        self.histograms = {name: PhaseHistogram()
+                           for name in ["step"] + PHASES}
+        self._step_times = dict.fromkeys(PHASES, 0.)
+        self._step_round_trips = dict.fromkeys(PHASES, 0)
+        self._step_start = None
+
+    @property
+    def num_steps(self):
+        """Number of steps measured since the last reset."""
+        return self.histograms["step"].count
+
+    def get_profile(self):
+        """Returns the statistics of every phase.
+
+        Returns
+        -------
+        dict
+            Key = phase (or "step" for the complete steps), Element = dict
+            with the number of steps the phase was performed in ("count"),
+            the total, mean, min and max time spent in the phase per step
+            (in s), the number of round-trips with sumo performed in the
+            phase, and the histogram of the durations of the phase
+            ("histogram", whose i-th bin counts the durations in between
+            2^(i-1) and 2^i microseconds)
+        """
+        return {name: hist.to_dict() for name, hist in self.histograms.items()}
+
+    def dump(self, path):
+        """Writes the statistics of every phase to a json file."""
+        with open(path, "w") as f:
+            json.dump(self.get_profile(), f, indent=2)
@@ -1,6 +1,10 @@
 """
 This script contains of series of reward functions that can
 be used to train autonomous vehicles
+
+The states of the vehicles are read from the per-step aggregates of the
+environment (see flow.core.aggregates), so that rewards combining several of
+these functions only fetch them once per step.
 """
 
 import numpy as np
@@ -29,18 +33,18 @@ def desired_velocity(env, fail=False):
     fail: bool
         specifies if any crash or other failure occurred in the system
     """
-    vel = np.array(env.vehicles.get_speed(env.vehicles.get_ids()))
-    num_vehicles = env.vehicles.num_vehicles
+    return _desired_velocity(env, env.aggregates.speeds, fail)
 
-    if any(vel < -100) or fail:
-        return 0.
 
-    max_cost = np.array([env.env_params.additional_params["target_velocity"]] *
-                        num_vehicles)
-    max_cost = np.linalg.norm(max_cost)
+def _desired_velocity(env, vel, fail):
+    """Computes the desired velocity reward of the vehicles with speeds
+    vel."""
+    if (vel < -100).any() or fail:
+        return 0.
 
-    cost = vel - env.env_params.additional_params["target_velocity"]
-    cost = np.linalg.norm(cost)
+    target_velocity = env.env_params.additional_params["target_velocity"]
+    max_cost = abs(target_velocity) * np.sqrt(len(vel))
+    cost = np.linalg.norm(vel - target_velocity)
 
     return max(max_cost - cost, 0)
 
@@ -62,21 +66,9 @@ def max_edge_velocity(env, edge_list, fail=False):
     fail: bool
         specifies if any crash or other failure occurred in the system
     """
-    veh_ids = env.vehicles.get_ids_by_edge(edge_list)
-    vel = np.array(env.vehicles.get_speed(veh_ids))
-    num_vehicles = len(veh_ids)
-
-    if any(vel < -100) or fail:
-        return 0.
-
-    max_cost = np.array([env.env_params.additional_params["target_velocity"]] *
-                        num_vehicles)
-    max_cost = np.linalg.norm(max_cost)
-
-    cost = vel - env.env_params.additional_params["target_velocity"]
-    cost = np.linalg.norm(cost)
-
-    return max(max_cost - cost, 0)
+    aggregates = env.aggregates
+    vel = aggregates.speeds[aggregates.edge_indices(edge_list)]
+    return _desired_velocity(env, vel, fail)
 
 
 def rl_forward_progress(env, gain=0.1):
@@ -91,9 +83,9 @@ def rl_forward_progress(env, gain=0.1):
     gain: float
         specifies how much to reward the RL vehicles
     """
-    rl_velocity = env.vehicles.get_speed(env.vehicles.get_rl_ids())
-    rl_norm_vel = np.linalg.norm(rl_velocity, 1)
-    return rl_norm_vel * gain
+    aggregates = env.aggregates
+    rl_velocity = aggregates.speeds[aggregates.rl_indices]
+    return np.abs(rl_velocity).sum() * gain
 
 
 def boolean_action_penalty(discrete_actions, gain=1.0):
@@ -114,16 +106,13 @@ def min_delay(env):
         the environment variable, which contains information on the current
         state of the system.
     """
-
-    vel = np.array(env.vehicles.get_speed())
-
+    vel = env.aggregates.speeds
     vel = vel[vel >= -1e-6]
-    v_top = max(env.scenario.speed_limit(edge)
-                for edge in env.scenario.get_edge_list())
+    v_top = env.aggregates.max_speed_limit
     time_step = env.sim_step
 
-    max_cost = time_step * sum(vel.shape)
-    cost = time_step * sum((v_top - vel) / v_top)
+    max_cost = time_step * len(vel)
+    cost = time_step * np.sum((v_top - vel) / v_top)
     return max(max_cost - cost, 0)
 
 
@@ -160,9 +149,9 @@ def penalize_headway_variance(vehicles, vids, normalization=1, penalty_gain=1,
     penalty_exponent: float, optional
         used to allow exponential punishing of smaller headways
     """
-    headways = penalty_gain * np.power(np.array(
-        [vehicles.get_headway(veh_id) / normalization for veh_id in vids]),
-        penalty_exponent)
+    headways = penalty_gain * np.power(
+        np.asarray(vehicles.get_headway(list(vids)), dtype=float) /
+        normalization, penalty_exponent)
     return -np.var(headways)
 
 
@@ -185,12 +174,12 @@ def punish_small_rl_headways(env, headway_threshold,
     penalty_exponent: float, optional
         used to allow exponential punishing of smaller headways
     """
-    headway_penalty = 0
-    for veh_id in env.vehicles.get_rl_ids():
-        if env.vehicles.get_headway(veh_id) < headway_threshold:
-            headway_penalty += \
-                (((headway_threshold - env.vehicles.get_headway(veh_id)) /
-                  headway_threshold) ** penalty_exponent) * penalty_gain
+    aggregates = env.aggregates
+    headways = aggregates.headways[aggregates.rl_indices]
+    headways = headways[headways < headway_threshold]
+    headway_penalty = penalty_gain * np.sum(
+        ((headway_threshold - headways) / headway_threshold) **
+        penalty_exponent)
 
     # return max_headway_penalty - headway_penalty
     return -np.abs(headway_penalty)
@@ -209,12 +198,11 @@ def punish_rl_lane_changes(env, penalty=1):
     penalty : float, optional
         penalty imposed on the reward function for any rl lane change action
     """
-    total_lane_change_penalty = 0
-    for veh_id in env.vehicles.get_rl_ids():
-        if env.vehicles.get_state(veh_id, "last_lc") == env.timer:
-            total_lane_change_penalty -= penalty
+    num_lane_changes = sum(
+        env.vehicles.get_state(veh_id, "last_lc") == env.time_counter
+        for veh_id in env.vehicles.get_rl_ids())
 
-    return total_lane_change_penalty
+    return -penalty * num_lane_changes
 
 
 def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
@@ -240,11 +228,12 @@ def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
         total reward (in this case a negative cost) corresponding
         to the queues in the lane in question
     """
-    # IDs of all vehicles in passed-in lane
-    lane_ids = [veh_id for veh_id in env.vehicles.get_ids_by_edge(edge)
-                if env.vehicles.get_lane(veh_id) == lane]
+    # number of vehicles in passed-in lane
+    aggregates = env.aggregates
+    num_vehicles = np.count_nonzero(
+        aggregates.lanes[aggregates.edge_indices(edge)] == lane)
 
-    return -1 * (len(lane_ids) ** penalty_exponent) * penalty_gain
+    return -1 * (num_vehicles ** penalty_exponent) * penalty_gain
 
 
 def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
@@ -265,19 +254,18 @@ def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
     int
         Reward value
     """
-    total_reward = 0
-    for rl_id in env.vehicles.get_rl_ids():
-        follower_id = env.vehicles.get_follower(rl_id)
-        if not follower_id:
-            continue
-        follower_headway = env.vehicles.get_headway(follower_id)
-        if follower_headway < 0:
-            print('negative follower headway of:', follower_headway)
-            print('rl id:', rl_id)
-            print('follower id:', follower_id)
-            continue
-        total_reward += follower_headway ** reward_exponent
-    # print(total_reward)
-    if total_reward < 0:
-        print('negative total reward of:', total_reward)
+    aggregates = env.aggregates
+    rl_ids = env.vehicles.get_rl_ids()
+    follower_ids = [follower_id for follower_id
+                    in env.vehicles.get_follower(rl_ids) if follower_id]
+    follower_headways = \
+        aggregates.headways[aggregates.indices_of(follower_ids)]
+
+    # followers that are no longer in the network are skipped as well
+    negative = follower_headways < 0
+    if negative.any():
+        print('negative follower headways of:', follower_headways[negative])
+    follower_headways = follower_headways[~negative]
+
+    total_reward = np.sum(follower_headways ** reward_exponent)
     return total_reward * reward_gain
@@ -0,0 +1,164 @@
+"""Subscriptions to the states of the vehicles, traffic lights, and
+simulation in sumo.
+
+Two subscription modes are supported:
+
+- "vehicle": every vehicle is subscribed individually when it enters the
+  network (vehicle.subscribe and vehicle.subscribeLeader). Sumo returns one
+  result per vehicle, including the leader and headway of the vehicle.
+- "context": a single context subscription on a junction of the network, with
+  a radius covering the entire network, collects the states of all vehicles in
+  the network in one response. Vehicles entering and exiting the network are
+  added to and removed from this response by sumo, so no subscribe or
+  unsubscribe commands are issued when vehicles depart or arrive. Context
+  subscriptions do not provide the leaders of the vehicles, which are instead
+  computed by the Vehicles class from the positions of all vehicles (see
+  flow.core.lanes.lane_leaders). These leaders are searched along the lane
+  connectivity of the network, and therefore match the leaders returned by
+  sumo in networks without lane merges (e.g. ring roads). In networks where
+  several lanes merge into one (e.g. bottlenecks), sumo additionally considers
+  the vehicles on the merging lanes, and the "vehicle" mode should be used if
+  exact leaders are needed.
+"""
+
+import math
+
+import traci.constants as tc
+
+# states of the vehicles that are subscribed to
+VEHICLE_VARIABLES = [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION, tc.VAR_ROAD_ID,
+                     tc.VAR_SPEED, tc.VAR_EDGES]
+
+# simulation parameters needed to check for entering, exiting, and colliding
+# vehicles
+SIMULATION_VARIABLES = [tc.VAR_DEPARTED_VEHICLES_IDS,
+                        tc.VAR_ARRIVED_VEHICLES_IDS,
+                        tc.VAR_TELEPORT_STARTING_VEHICLES_IDS]
+
+# states of the traffic lights that are subscribed to
+TRAFFIC_LIGHT_VARIABLES = [tc.TL_RED_YELLOW_GREEN_STATE]
+
+# maximum distance at which leaders are looked for (in meters)
+LEADER_DIST = 2000
+
+SUBSCRIPTION_MODES = ("vehicle", "context")
+
+
+class SubscriptionManager:
+
+    def __init__(self, connection, mode="vehicle"):
+        """Instantiates the subscriptions of a TraCI connection.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection
+            connection to the sumo instance
+        mode : str, optional
+            subscription mode, one of "vehicle" or "context" (see the module
+            documentation)
+
+        Raises
+        ------
+        ValueError
+            if the subscription mode is not valid
+        """
+        if mode not in SUBSCRIPTION_MODES:
+            raise ValueError("Subscription mode must be one of {}, not {}."
+                             .format(SUBSCRIPTION_MODES, mode))
+
+        self.connection = connection
+        self.mode = mode
+
+        # junction that the context subscription is centered on
+        self.junction_id = None
+
+    @property
+    def subscribes_leaders(self):
+        """Whether sumo returns the leader and headway of every vehicle.
+
+        If not, these need to be computed from the states of the vehicles.
+        """
+        return self.mode == "vehicle"
+
+    def subscribe(self, veh_ids, tl_ids):
+        """Subscribes the states of the simulation, of the vehicles currently
+        in the network, and of the traffic lights.
+
+        Parameters
+        ----------
+        veh_ids : list<str>
+            names of the vehicles currently in the network
+        tl_ids : list<str>
+            names of the traffic lights in the network
+        """
+        if self.mode == "context":
+            self._subscribe_context()
+        else:
+            for veh_id in veh_ids:
+                self.subscribe_vehicle(veh_id)
+
+        self.connection.simulation.subscribe(SIMULATION_VARIABLES)
+
+        for tl_id in tl_ids:
+            self.connection.trafficlight.subscribe(
+                tl_id, TRAFFIC_LIGHT_VARIABLES)
+
+    def subscribe_vehicle(self, veh_id):
+        """Subscribes the states of a vehicle that entered the network.
+
+        This is not needed (and does nothing) in the "context" mode.
+        """
+        if self.mode == "vehicle":
+            self.connection.vehicle.subscribe(veh_id, VEHICLE_VARIABLES)
+            self.connection.vehicle.subscribeLeader(veh_id, LEADER_DIST)
+
+    def unsubscribe_vehicle(self, veh_id):
+        """Removes the subscriptions of a vehicle that is removed from the
+        network.
+
+        This is not needed (and does nothing) in the "context" mode.
+        """
+        if self.mode == "vehicle":
+            self.connection.vehicle.unsubscribe(veh_id)
+
+    def get_results(self):
+        """Returns the results of the subscriptions at the current step.
+
+        Returns
+        -------
+        vehicle_obs : dict
+            Key = vehicle id, Element = dict of subscribed vehicle states
+        sim_obs : dict
+            subscribed simulation parameters
+        tls_obs : dict
+            Key = traffic light id, Element = dict of subscribed states
+        """
+        if self.mode == "context":
+            vehicle_obs = self.connection.junction.\
+                getContextSubscriptionResults(self.junction_id)
+            vehicle_obs = dict(vehicle_obs or {})
+        else:
+            vehicle_obs = self.connection.vehicle.getSubscriptionResults()
+
+        sim_obs = self.connection.simulation.getSubscriptionResults()
+        tls_obs = self.connection.trafficlight.getSubscriptionResults()
+
+        return vehicle_obs, sim_obs, tls_obs
+
+    def _subscribe_context(self):
+        """Subscribes the states of all vehicles in the network through a
+        context subscription on a junction of the network.
+
+        The radius of the subscription is chosen so that the whole network
+        boundary is covered.
+        """
+        self.junction_id = self.connection.junction.getIDList()[0]
+        x, y = self.connection.junction.getPosition(self.junction_id)
+        (x_min, y_min), (x_max, y_max) = \
+            self.connection.simulation.getNetBoundary()
+        radius = math.hypot(max(x - x_min, x_max - x),
+                            max(y - y_min, y_max - y)) + 1
+
+        self.connection.junction.subscribeContext(
+            self.junction_id, tc.CMD_GET_VEHICLE_VARIABLE, radius,
+            VEHICLE_VARIABLES)
@@ -0,0 +1,232 @@
+"""Pool of sumo processes started ahead of time.
+
+Starting sumo consists of spawning its process, waiting for it to load the
+network and start listening on its port, and connecting to it through TraCI.
+Environments that restart sumo at every reset (see the "restart_instance"
+sumo_params) pay this cost in between every pair of rollouts. The SumoPool
+instead spawns the process of the next sumo instance as soon as the current
+one is acquired, and connects to it and performs its first simulation step
+(during which sumo loads the vehicles and routes of the network) in a
+background thread. By the time the next rollout starts, acquiring the new
+instance only requires to hand over this connection.
+
+The time at which sumo is ready to accept a connection is detected by
+polling its port, rather than waiting for a fixed amount of time.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import signal
+import subprocess
+import time
+
+import sumolib
+import traci
+
+# maximum time to wait for a sumo instance to accept a connection (in seconds)
+CONNECT_TIMEOUT = 60.
+
+# time in between attempts to connect to a sumo instance (in seconds)
+POLL_INTERVAL = 0.01
+
+
+def connect(port, proc=None, timeout=CONNECT_TIMEOUT):
+    """Connects to a sumo instance as soon as it is listening on its port.
+
+    Parameters
+    ----------
+    port : int
+        port the sumo instance listens on
+    proc : subprocess.Popen, optional
+        process of the sumo instance. If specified, an error is raised as
+        soon as the process exits.
+    timeout : float, optional
+        maximum time to wait for sumo to accept the connection (in seconds)
+
+    Returns
+    -------
+    traci.connection.Connection
+        connection to the sumo instance
+
+    Raises
+    ------
+    traci.FatalTraCIError
+        if sumo did not accept the connection before the timeout
+    traci.TraCIException
+        if the sumo process exited before accepting the connection
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return traci.connect(port, numRetries=0, proc=proc)
+        except traci.FatalTraCIError:
+            if time.time() > deadline:
+                raise
+        time.sleep(POLL_INTERVAL)
+
+
+def start(port, proc):
+    """Connects to a sumo instance and performs its first simulation step.
+
+    Returns
+    -------
+    traci.connection.Connection
+        connection to the sumo instance
+    """
+    connection = connect(port, proc)
+    try:
+        connection.simulationStep()
+    except Exception:
+        connection.close(False)
+        raise
+    return connection
+
+
+def spawn(sumo_call, port):
+    """Starts a sumo process listening on a given port.
+
+    Parameters
+    ----------
+    sumo_call : list<str>
+        command used to start sumo, without the port
+    port : int
+        port the sumo instance will listen on
+
+    Returns
+    -------
+    subprocess.Popen
+        process of the sumo instance
+    """
+    logging.info(" Starting SUMO on port " + str(port))
+    return subprocess.Popen(list(sumo_call) + ["--remote-port", str(port)],
+                            preexec_fn=os.setsid)
+
+
+class SumoPool:
+
+    def __init__(self):
+        """Instantiates an empty pool of sumo instances.
+
+        Attributes
+        ----------
+        num_warm_hits : int
+            number of instances acquired that had been started ahead of time
+        num_cold_starts : int
+            number of instances acquired that had to be started on demand
+        """
+        # sumo instances started ahead of time and not acquired yet, as a
+        # list of (key, process, future connection) tuples
+        self._idle = []
+
+        # threads connecting to the instances started ahead of time
+        self._executor = None
+
+        self.num_warm_hits = 0
+        self.num_cold_starts = 0
+
+    @property
+    def num_idle(self):
+        """Number of sumo instances waiting to be acquired."""
+        return len(self._idle)
+
+    def prespawn(self, sumo_call, num_instances=1, key=None):
+        """Starts sumo instances to be acquired later on.
+
+        Parameters
+        ----------
+        sumo_call : list<str>
+            command used to start sumo, without the port
+        num_instances : int, optional
+            number of instances started
+        key : hashable, optional
+            additional key identifying the files loaded by sumo (e.g. their
+            modification times). Instances are only handed over to requests
+            with the same command and key.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        for _ in range(num_instances):
+            port = sumolib.miscutils.getFreeSocketPort()
+            proc = spawn(sumo_call, port)
+            future = self._executor.submit(start, port, proc)
+            self._idle.append(((tuple(sumo_call), key), proc, future))
+
+    def acquire(self, sumo_call, key=None, port=None):
+        """Returns a connection to a sumo instance started with a given
+        command, after its first simulation step.
+
+        An instance started ahead of time with the same command and key is
+        used if available. Otherwise, a new instance is started. Idle
+        instances started with other commands or keys are terminated, since
+        they are outdated.
+
+        Parameters
+        ----------
+        sumo_call : list<str>
+            command used to start sumo, without the port
+        key : hashable, optional
+            additional key identifying the files loaded by sumo (see
+            prespawn)
+        port : int, optional
+            port the instance should listen on. Instances started ahead of
+            time listen on arbitrary free ports, and are not used if a port
+            is specified.
+
+        Returns
+        -------
+        subprocess.Popen
+            process of the sumo instance
+        traci.connection.Connection
+            connection to the sumo instance
+        """
+        full_key = (tuple(sumo_call), key)
+
+        if port is None:
+            for i, (idle_key, proc, future) in enumerate(self._idle):
+                if idle_key == full_key and proc.poll() is None:
+                    del self._idle[i]
+                    try:
+                        connection = future.result()
+                    except Exception:
+                        kill(proc)
+                        break
+                    self.num_warm_hits += 1
+                    return proc, connection
+
+        # instances that were not handed over are not going to be needed
+        # anymore
+        self.close()
+
+        self.num_cold_starts += 1
+        if port is None:
+            port = sumolib.miscutils.getFreeSocketPort()
+        proc = spawn(sumo_call, port)
+
+        try:
+            connection = start(port, proc)
+        except Exception:
+            kill(proc)
+            raise
+
+        return proc, connection
+
+    def close(self):
+        """Terminates all idle sumo instances."""
+        for _, proc, future in self._idle:
+            kill(proc)
+            try:
+                future.result().close(False)
+            except Exception:
+                pass
+        self._idle = []
+
+
+def kill(proc):
+    """Terminates a sumo process (and any process it started)."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except OSError:
+        pass
+    proc.wait()
@@ -0,0 +1,150 @@
+"""Batching of TraCI set commands.
+
+By default, every TraCI command is sent to sumo in its own message, and the
+client blocks until sumo replies. The TraCICommandBatcher defers the set
+commands (e.g. slowDown, changeLane, setRoute, setColor) issued within a
+`defer` block, and sends all of them to sumo in a single multi-command
+message when `flush` is called, or when any other command (e.g. a getter or
+simulationStep) is issued, in which case the deferred commands are prepended
+to the message of that command. The order in which commands are executed by
+sumo is therefore left unchanged.
+
+Note that errors raised by sumo for a deferred command (e.g. a vehicle that
+is no longer in the network) are only raised once the command is sent.
+"""
+
+from contextlib import contextmanager
+
+import traci.constants as tc
+
+# TraCI commands that may be deferred. Set commands do not return any value
+# besides the status of the command, so the response to a message containing
+# several of these commands only consists of their statuses.
+BATCHED_COMMANDS = {
+    tc.CMD_SET_VEHICLE_VARIABLE,
+    tc.CMD_SET_VEHICLETYPE_VARIABLE,
+    tc.CMD_SET_ROUTE_VARIABLE,
+    tc.CMD_SET_TL_VARIABLE,
+    tc.CMD_SET_LANE_VARIABLE,
+    tc.CMD_SET_EDGE_VARIABLE,
+}
+
+
+class TraCICommandBatcher:
+
+    def __init__(self, connection):
+        """Instantiates a command batcher for a TraCI connection.
+
+        The batcher intercepts the messages sent by the connection. If the
+        connection does not expose the internal message buffer of the traci
+        package (e.g. when using a different client implementation), batching
+        is disabled and commands are sent immediately.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection
+            connection to the sumo instance
+
+        Attributes
+        ----------
+        num_batched : int
+            number of commands that were deferred
+        num_messages : int
+            number of additional messages used to send the deferred commands
+            (deferred commands that are sent along with another command do
+            not require an additional message)
+        num_round_trips : int
+            number of messages sent to sumo through the connection, each of
+            which waits for the response of sumo (only counted if batching
+            is enabled)
+        """
+        self.connection = connection
+        self._send_exact = getattr(connection, "_sendExact", None)
+        self.enabled = self._send_exact is not None \
+            and hasattr(connection, "_queue") \
+            and hasattr(connection, "_string")
+
+        self.num_batched = 0
+        self.num_messages = 0
+        self.num_round_trips = 0
+
+        # number of deferred commands that have not been sent yet
+        self._num_pending = 0
+        # whether set commands are currently being deferred
+        self._deferring = False
+
+        if self.enabled:
+            connection._sendExact = self._intercept
+
+    @property
+    def num_pending(self):
+        """Number of deferred commands that have not been sent yet."""
+        return self._num_pending
+
+    @property
+    def round_trips_saved(self):
+        """Number of round-trips with sumo saved by batching commands."""
+        return self.num_batched - self.num_messages
+
+    def get_counters(self):
+        """Returns the counters of the batcher as a dict."""
+        return {"num_batched": self.num_batched,
+                "num_messages": self.num_messages,
+                "round_trips_saved": self.round_trips_saved,
+                "num_round_trips": self.num_round_trips}
+
+    def reset_counters(self):
+        """Resets the counters of the batcher to zero."""
+        self.num_batched = 0
+        self.num_messages = 0
+        self.num_round_trips = 0
+
+    @contextmanager
+    def defer(self):
+        """Context manager within which set commands are deferred.
+
+        Example
+        -------
+        >>> with batcher.defer():
+        >>>     for veh_id in veh_ids:
+        >>>         connection.vehicle.slowDown(veh_id, 0, 1)
+        >>> batcher.flush()
+        """
+        previous = self._deferring
+        self._deferring = self.enabled
+        try:
+            yield self
+        finally:
+            self._deferring = previous
+
+    def flush(self):
+        """Sends all deferred commands to sumo in a single message."""
+        if self._num_pending == 0:
+            return
+        self.num_messages += 1
+        lock = getattr(self.connection, "_lock", None)
+        if lock is not None:
+            with lock:
+                self._send()
+        else:
+            self._send()
+
+    def _intercept(self):
+        """Replaces the connection's method used to send messages.
+
+        If the last command added to the message is a set command issued
+        within a defer block, the message is kept in the connection's buffer.
+        Otherwise, the message, including all deferred commands, is sent.
+        """
+        queue = self.connection._queue
+        if self._deferring and queue and queue[-1] in BATCHED_COMMANDS:
+            self._num_pending += 1
+            self.num_batched += 1
+            return None
+        return self._send()
+
+    def _send(self):
+        """Sends the message in the connection's buffer."""
+        self._num_pending = 0
+        self.num_round_trips += 1
+        return self._send_exact()
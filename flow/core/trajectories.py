@@ -0,0 +1,247 @@
+"""In-process recording of the trajectories of vehicles.
+
+Full trajectories can be obtained from sumo through its emission output (see
+the "emission_path" sumo_params), which makes sumo write a large xml file
+that must later be parsed (see flow.core.util.emission_to_csv). However, the
+Vehicles class already holds the speed, position, edge, lane and absolute
+position of every vehicle after each simulation step.
+
+The TrajectoryRecorder copies these states into preallocated numpy buffers
+after every simulation step (or every few simulation steps). Full buffers are
+handed to a background thread, which writes them to an npz file with the
+same layout as the files generated by flow.core.util.emission_to_npz: every
+buffer is written as a row group, and string columns are dictionary-encoded.
+The recorded trajectories may then be loaded with
+flow.core.util.load_emission_npz.
+"""
+
+import queue
+import threading
+import zipfile
+
+import numpy as np
+
+from flow.core.util import write_npz_array
+
+# Key = name of a state of the vehicles that may be recorded (the name of the
+# corresponding getter of the Vehicles class, without "get_")
+# Element = type of the column the state is recorded in (str for
+# dictionary-encoded columns)
+FIELDS = {
+    "speed": np.float32,
+    "position": np.float32,
+    "edge": str,
+    "lane": np.int32,
+    "absolute_position": np.float32,
+    "headway": np.float32,
+    "leader": str,
+    "follower": str,
+}
+
+# states recorded by default
+DEFAULT_FIELDS = ["speed", "position", "edge", "lane", "absolute_position"]
+
+# columns recorded for every row, in addition to the requested fields
+INDEX_COLUMNS = {"rollout": np.int32, "time": np.float64, "id": str}
+
+# number of rows in every buffer (and row group of the generated file)
+DEFAULT_CHUNK_SIZE = 16384
+
+
+class TrajectoryRecorder:
+
+    def __init__(self, path, fields=None, interval=1,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        """Instantiates a recorder of the trajectories of vehicles.
+
+        Parameters
+        ----------
+        path : str
+            path to the npz file the trajectories are written to
+        fields : list<str>, optional
+            states of the vehicles to record (see FIELDS), defaults to
+            DEFAULT_FIELDS. The rollout, time and id of every row are always
+            recorded.
+        interval : int, optional
+            number of simulation steps in between two recorded steps
+        chunk_size : int, optional
+            number of rows in every buffer
+
+        Raises
+        ------
+        ValueError
+            if an unknown field is requested, or if interval or chunk_size
+            are not positive
+        """
+        fields = list(DEFAULT_FIELDS if fields is None else fields)
+        unknown = [f for f in fields if f not in FIELDS]
+        if unknown:
+            raise ValueError("Unknown trajectory fields: {}. Available "
+                             "fields are: {}.".format(unknown, list(FIELDS)))
+        if interval < 1 or chunk_size < 1:
+            raise ValueError("interval and chunk_size must be positive.")
+
+        self.path = path
+        self.fields = fields
+        self.interval = interval
+        self.chunk_size = chunk_size
+
+        # Key = name of the column, Element = type of the column
+        self._columns = dict(INDEX_COLUMNS)
+        self._columns.update((f, FIELDS[f]) for f in fields)
+
+        # index of the current rollout, and whether a row was recorded for
+        # it yet
+        self.rollout = 0
+        self._rollout_recorded = False
+
+        # buffers being filled, and number of rows they contain
+        self._buffers = self._new_buffers()
+        self._size = 0
+
+        # total number of rows recorded so far
+        self.num_rows = 0
+
+        # buffers are written to the npz file by a background thread
+        self._queue = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+        self.closed = False
+
+    def new_rollout(self):
+        """Marks the start of a new rollout.
+
+        Rows recorded afterwards are given the next rollout index, unless no
+        row was recorded during the current rollout.
+        """
+        if self._rollout_recorded:
+            self.rollout += 1
+            self._rollout_recorded = False
+
+    def record(self, env):
+        """Records the states of all vehicles in the network.
+
+        This is called after every simulation step. The states are only
+        recorded every "interval" simulation steps.
+
+        Parameters
+        ----------
+        env : flow.envs.Env
+            environment whose vehicles are recorded
+        """
+        if self.closed:
+            raise RuntimeError("The trajectory recorder was closed.")
+        if self._error is not None:
+            raise self._error
+        if env.time_counter % self.interval != 0:
+            return
+
+        veh_ids = env.vehicles.get_ids()
+        num_vehicles = len(veh_ids)
+        if num_vehicles == 0:
+            return
+        self._rollout_recorded = True
+
+        values = {
+            "rollout": self.rollout,
+            "time": env.time_counter * env.sim_step,
+            "id": veh_ids,
+        }
+        for field in self.fields:
+            values[field] = getattr(env.vehicles, "get_" + field)(veh_ids)
+
+        # copy the states into the buffers, handing over the buffers to the
+        # writer thread whenever they are full
+        start = 0
+        while start < num_vehicles:
+            n = min(num_vehicles - start, self.chunk_size - self._size)
+            rows = slice(self._size, self._size + n)
+            for name, value in values.items():
+                if np.ndim(value) == 0:
+                    self._buffers[name][rows] = value
+                else:
+                    self._buffers[name][rows] = value[start:start + n]
+            self._size += n
+            start += n
+            if self._size == self.chunk_size:
+                self.flush()
+
+        self.num_rows += num_vehicles
+
+    def flush(self):
+        """Hands over the rows recorded so far to the writer thread."""
+        if self._size == 0:
+            return
+        buffers = {name: buf[:self._size]
+                   for name, buf in self._buffers.items()}
+        self._queue.put(buffers)
+        self._buffers = self._new_buffers()
+        self._size = 0
+
+    def close(self):
+        """Writes all remaining rows, and closes the npz file.
+
+        Raises
+        ------
+        Exception
+            any error raised while writing the npz file
+        """
+        if self.closed:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        self.closed = True
+        if self._error is not None:
+            raise self._error
+
+    def _new_buffers(self):
+        return {name: np.empty(self.chunk_size,
+                               dtype=object if dtype is str else dtype)
+                for name, dtype in self._columns.items()}
+
+    def _write(self):
+        """Writes the buffers handed over by flush to the npz file, until
+        close is called."""
+        codes = {name: {} for name, dtype in self._columns.items()
+                 if dtype is str}
+        time_min, time_max = [], []
+
+        try:
+            with zipfile.ZipFile(self.path, "w", allowZip64=True) as archive:
+                while True:
+                    buffers = self._queue.get()
+                    if buffers is None:
+                        break
+
+                    group = "rg{}/".format(len(time_min))
+                    for name, values in buffers.items():
+                        if name in codes:
+                            col_codes = codes[name]
+                            values = np.fromiter(
+                                (col_codes.setdefault(v, len(col_codes))
+                                 for v in values),
+                                dtype=np.int32, count=len(values))
+                        write_npz_array(archive, group + name, values)
+                        if name == "id":
+                            write_npz_array(archive, group + "id_set",
+                                            np.unique(values))
+                    time_min.append(buffers["time"].min())
+                    time_max.append(buffers["time"].max())
+
+                write_npz_array(archive, "columns", list(self._columns))
+                write_npz_array(archive, "num_row_groups", len(time_min))
+                write_npz_array(archive, "time_min",
+                                np.array(time_min, dtype=np.float64))
+                write_npz_array(archive, "time_max",
+                                np.array(time_max, dtype=np.float64))
+                for name, col_codes in codes.items():
+                    write_npz_array(archive, "dict/" + name,
+                                    np.array(list(col_codes), dtype=np.str_))
+        except Exception as e:
+            self._error = e
+            # keep consuming buffers so that flush and close do not block
+            while self._queue.get() is not None:
+                pass
@@ -8,17 +8,16 @@ E : etree.Element
 """
 import csv
 import errno
+import heapq
 import importlib
 import json
 import os
 import tempfile
+import zipfile
+import numpy as np
 from lxml import etree
 from datetime import datetime
-from xml.etree import ElementTree
 
-from gym.envs.registration import register
-
-from flow.controllers import *
 from flow.core.params import SumoCarFollowingParams, SumoLaneChangeParams, \
     InFlows
 
@@ -150,11 +149,9 @@ def eval_veh_params(orig_params):
     Evaluates vehicle parameters, since params like IDMController can't be
     serialized and output to JSON. Thus, the JSON file stores those as
     their names, with string 'IDMController' instead of the object
-    ``<flow.controllers.car_following_models.IDMController``. ``util.py``
-    imports required car-following models, lane-change controllers,
-    routers, and SUMO parameters. This function evaluates those names
-    and returns a dict with the actual objects (evaluated) instead of
-    their names.
+    ``<flow.controllers.car_following_models.IDMController``. This
+    function looks those names up in ``flow.controllers`` and returns a
+    dict with the actual objects instead of their names.
 
     Parameters
     ----------
@@ -168,18 +165,25 @@ def eval_veh_params(orig_params):
         replaced with actual objects
     """
 
+    # the controllers are only imported when needed (see
+    # flow.core.lazy_import)
+    import flow.controllers as controllers
+
     new_params = orig_params.copy()
 
     if 'acceleration_controller' in new_params:
-        new_controller = (eval(orig_params['acceleration_controller'][0]),
+        new_controller = (getattr(controllers,
+                                  orig_params['acceleration_controller'][0]),
                           orig_params['acceleration_controller'][1])
         new_params['acceleration_controller'] = new_controller
     if 'lane_change_controller' in new_params:
-        new_lc_controller = (eval(orig_params['lane_change_controller'][0]),
+        new_lc_controller = (getattr(controllers,
+                                     orig_params['lane_change_controller'][0]),
                              orig_params['lane_change_controller'][1])
         new_params['lane_change_controller'] = new_lc_controller
     if 'routing_controller' in new_params:
-        new_route_controller = (eval(orig_params['routing_controller'][0]),
+        new_route_controller = (getattr(controllers,
+                                        orig_params['routing_controller'][0]),
                                 orig_params['routing_controller'][1])
         new_params['routing_controller'] = new_route_controller
     if 'sumo_car_following_params' in new_params:
@@ -265,6 +269,9 @@ def get_flow_params(config):
 
 def register_env(env_name, sumo_params, type_params, env_params, net_params,
                  initial_config, scenario, env_version_num=0):
+    # gym is only imported when needed, since it is slow to import
+    from gym.envs.registration import register
+
     num_steps = env_params.horizon
     register(
         id=env_name + '-v' + str(env_version_num),
@@ -300,10 +307,28 @@ def ensure_dir(path):
     return path
 
 
-def emission_to_csv(emission_path, output_path=None):
+# columns of the csv files generated by emission_to_csv
+EMISSION_COLUMNS = ['time', 'CO', 'y', 'CO2', 'electricity', 'type', 'id',
+                    'eclass', 'waiting', 'NOx', 'fuel', 'HC', 'x', 'route',
+                    'relative_position', 'noise', 'angle', 'PMx', 'speed',
+                    'edge_id', 'lane_number']
+
+# number of rows sorted in memory at once by emission_to_csv
+EMISSION_CHUNK_SIZE = 100000
+
+
+def emission_to_csv(emission_path, output_path=None, sort=True,
+                    chunk_size=EMISSION_CHUNK_SIZE):
     """Converts an emission file generated by sumo during an computational
     experiment into a csv file.
 
+    The emission file is parsed incrementally, and its rows are written to
+    the csv file as they are parsed, so that the memory used does not grow
+    with the size of the emission file. If the rows are sorted by vehicle id,
+    this is done with an external merge sort: chunks of at most chunk_size
+    rows are sorted in memory and written to temporary files, which are then
+    merged into the csv file.
+
     Parameters
     ----------
     emission_path: str
@@ -311,6 +336,12 @@ def emission_to_csv(emission_path, output_path=None):
     output_path: str
         path to the csv file that will be generated, default is the same
         directory as the emission file, with the same name
+    sort: bool, optional
+        specifies whether the rows are sorted by vehicle id (and by time for
+        a given vehicle), defaults to True. Otherwise, rows are sorted by
+        time.
+    chunk_size: int, optional
+        maximum number of rows held in memory while sorting
 
     Yields
     ------
@@ -322,53 +353,307 @@ def emission_to_csv(emission_path, output_path=None):
     means that some data, such as absolute position, is not immediately
     available from the emission file, but can be recreated.
     """
-    parser = etree.XMLParser(recover=True)
-    tree = ElementTree.parse(emission_path, parser=parser)
-    root = tree.getroot()
+    # default output path
+    if output_path is None:
+        output_path = emission_path[:-3] + 'csv'
 
-    # parse the xml data into a dict
-    out_data = []
-    for time in root.findall('timestep'):
-        t = float(time.attrib['time'])
+    with open(output_path, 'w') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(EMISSION_COLUMNS)
+
+        if not sort:
+            writer.writerows(_iter_emission_rows(emission_path))
+            return
+
+        # sort chunks of rows by vehicle id and store them in temporary files
+        id_index = EMISSION_COLUMNS.index('id')
+        chunk_files = []
+        try:
+            chunk = []
+            for row in _iter_emission_rows(emission_path):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    chunk_files.append(_write_sorted_chunk(chunk, id_index))
+                    chunk = []
+
+            if not chunk_files:
+                # all rows fit in memory
+                chunk.sort(key=lambda row: row[id_index])
+                writer.writerows(chunk)
+                return
+
+            if chunk:
+                chunk_files.append(_write_sorted_chunk(chunk, id_index))
+            del chunk
+
+            # merge the sorted chunks. Ties are resolved by the order of the
+            # chunks, so rows of the same vehicle remain sorted by time
+            for f in chunk_files:
+                f.seek(0)
+            writer.writerows(heapq.merge(
+                *[csv.reader(f) for f in chunk_files],
+                key=lambda row: row[id_index]))
+        finally:
+            for f in chunk_files:
+                f.close()
+
+
+def _iter_emission_rows(emission_path):
+    """Yields the rows of the csv file generated from an emission file, in
+    the order of the emission file (see emission_to_csv).
+
+    Elements of the emission file are discarded as soon as they are parsed.
+    Vehicles missing any of the expected attributes are skipped.
+    """
+    for _, timestep in etree.iterparse(emission_path, events=('end',),
+                                       tag='timestep', recover=True):
+        t = float(timestep.attrib['time'])
 
-        for car in time:
-            out_data.append(dict())
+        for car in timestep:
             try:
-                out_data[-1]['time'] = t
-                out_data[-1]['CO'] = float(car.attrib['CO'])
-                out_data[-1]['y'] = float(car.attrib['y'])
-                out_data[-1]['CO2'] = float(car.attrib['CO2'])
-                out_data[-1]['electricity'] = float(car.attrib['electricity'])
-                out_data[-1]['type'] = car.attrib['type']
-                out_data[-1]['id'] = car.attrib['id']
-                out_data[-1]['eclass'] = car.attrib['eclass']
-                out_data[-1]['waiting'] = float(car.attrib['waiting'])
-                out_data[-1]['NOx'] = float(car.attrib['NOx'])
-                out_data[-1]['fuel'] = float(car.attrib['fuel'])
-                out_data[-1]['HC'] = float(car.attrib['HC'])
-                out_data[-1]['x'] = float(car.attrib['x'])
-                out_data[-1]['route'] = car.attrib['route']
-                out_data[-1]['relative_position'] = float(car.attrib['pos'])
-                out_data[-1]['noise'] = float(car.attrib['noise'])
-                out_data[-1]['angle'] = float(car.attrib['angle'])
-                out_data[-1]['PMx'] = float(car.attrib['PMx'])
-                out_data[-1]['speed'] = float(car.attrib['speed'])
-                out_data[-1]['edge_id'] = car.attrib['lane'].rpartition('_')[0]
-                out_data[-1]['lane_number'] = car.attrib['lane'].\
-                    rpartition('_')[-1]
+                edge_id, _, lane_number = car.attrib['lane'].rpartition('_')
+                row = [t,
+                       float(car.attrib['CO']),
+                       float(car.attrib['y']),
+                       float(car.attrib['CO2']),
+                       float(car.attrib['electricity']),
+                       car.attrib['type'],
+                       car.attrib['id'],
+                       car.attrib['eclass'],
+                       float(car.attrib['waiting']),
+                       float(car.attrib['NOx']),
+                       float(car.attrib['fuel']),
+                       float(car.attrib['HC']),
+                       float(car.attrib['x']),
+                       car.attrib['route'],
+                       float(car.attrib['pos']),
+                       float(car.attrib['noise']),
+                       float(car.attrib['angle']),
+                       float(car.attrib['PMx']),
+                       float(car.attrib['speed']),
+                       edge_id,
+                       lane_number]
             except KeyError:
-                del out_data[-1]
+                continue
+            yield row
 
-    # sort the elements of the dictionary by the vehicle id
-    out_data = sorted(out_data, key=lambda k: k['id'])
+        # free the memory used by the elements parsed so far
+        timestep.clear()
+        while timestep.getprevious() is not None:
+            del timestep.getparent()[0]
 
-    # default output path
+
+def _write_sorted_chunk(chunk, id_index):
+    """Sorts a chunk of rows by vehicle id, and writes it to a temporary
+    file, which is returned (open)."""
+    chunk.sort(key=lambda row: row[id_index])
+    f = tempfile.TemporaryFile(mode='w+', newline='')
+    csv.writer(f).writerows(chunk)
+    return f
+
+
+# columns of the npz files generated by emission_to_npz stored as codes into
+# a dictionary of their unique values
+EMISSION_DICT_COLUMNS = ['type', 'id', 'eclass', 'route', 'edge_id']
+
+# number of rows in every row group of the npz files generated by
+# emission_to_npz
+EMISSION_ROW_GROUP_SIZE = 65536
+
+
+def emission_to_npz(emission_path, output_path=None,
+                    row_group_size=EMISSION_ROW_GROUP_SIZE):
+    """Converts an emission file generated by sumo into a columnar npz file.
+
+    The npz file contains the same columns as the csv files generated by
+    emission_to_csv, in the order of the emission file (i.e. sorted by
+    time), with the following types:
+
+    - "type", "id", "eclass", "route" and "edge_id" are dictionary-encoded:
+      each column is stored as int32 codes into an array of the unique
+      values of the column, stored under "dict/<column>"
+    - "time" is stored as float64, so that times remain exact in long
+      simulations, and "lane_number" as int32
+    - all other columns are stored as float32
+
+    Rows are split into row groups of row_group_size rows, each stored under
+    "rg<index>/<column>". For every row group, the minimum and maximum times
+    ("time_min" and "time_max") and the codes of the vehicles it contains
+    ("rg<index>/id_set") are stored as well, so that load_emission_npz only
+    reads the row groups matching a time range or set of vehicles.
+
+    The emission file is parsed incrementally (see emission_to_csv), and
+    only one row group is held in memory at a time.
+
+    Parameters
+    ----------
+    emission_path: str
+        path to the emission file that should be converted
+    output_path: str, optional
+        path to the npz file that will be generated, default is the same
+        directory as the emission file, with the same name
+    row_group_size: int, optional
+        number of rows in every row group
+
+    Returns
+    -------
+    str
+        path to the generated npz file
+    """
     if output_path is None:
-        output_path = emission_path[:-3] + 'csv'
+        output_path = emission_path[:-3] + 'npz'
+
+    codes = {col: {} for col in EMISSION_DICT_COLUMNS}
+    time_min, time_max = [], []
+
+    with zipfile.ZipFile(output_path, 'w', allowZip64=True) as archive:
+        def write(name, array):
+            write_npz_array(archive, name, array)
+
+        def write_row_group(rows):
+            group = 'rg{}/'.format(len(time_min))
+            for col, values in zip(EMISSION_COLUMNS, zip(*rows)):
+                if col in codes:
+                    col_codes = codes[col]
+                    values = (col_codes.setdefault(v, len(col_codes))
+                              for v in values)
+                array = np.fromiter(values, dtype=_emission_dtype(col),
+                                    count=len(rows))
+                write(group + col, array)
+                if col == 'time':
+                    time_min.append(array[0])
+                    time_max.append(array[-1])
+                elif col == 'id':
+                    write(group + 'id_set', np.unique(array))
+
+        rows = []
+        for row in _iter_emission_rows(emission_path):
+            rows.append(row)
+            if len(rows) >= row_group_size:
+                write_row_group(rows)
+                rows = []
+        if rows:
+            write_row_group(rows)
+
+        write('columns', np.array(EMISSION_COLUMNS))
+        write('num_row_groups', np.array(len(time_min)))
+        write('time_min', np.array(time_min, dtype=np.float64))
+        write('time_max', np.array(time_max, dtype=np.float64))
+        for col, col_codes in codes.items():
+            # codes are assigned in increasing order as values are first seen
+            write('dict/' + col, np.array(list(col_codes), dtype=np.str_))
+
+    return output_path
+
+
+def write_npz_array(archive, name, array):
+    """Writes an array into an open zipfile.ZipFile, as the entry "name" of
+    an npz file.
 
-    # output the dict data into a csv file
-    keys = out_data[0].keys()
-    with open(output_path, 'w') as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(out_data)
+    Parameters
+    ----------
+    archive: zipfile.ZipFile
+        npz file, opened for writing
+    name: str
+        name of the array in the npz file
+    array: array_like
+        array to write
+    """
+    with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+
+def load_emission_npz(path, columns=None, time_range=None, veh_ids=None,
+                      decode=True):
+    """Loads the rows of an npz file generated by emission_to_npz (or by a
+    flow.core.trajectories.TrajectoryRecorder).
+
+    Only the row groups that may contain rows matching the requested time
+    range and vehicles are read from the file.
+
+    Parameters
+    ----------
+    path: str
+        path to the npz file
+    columns: list<str>, optional
+        columns to load, defaults to all columns
+    time_range: (float, float), optional
+        minimum and maximum times (inclusive) of the loaded rows, defaults to
+        all times
+    veh_ids: list<str>, optional
+        vehicles whose rows are loaded, defaults to all vehicles
+    decode: bool, optional
+        specifies whether dictionary-encoded columns are returned as arrays
+        of their values (default), or of their int32 codes
+
+    Returns
+    -------
+    dict <str, numpy ndarray>
+        Key = name of the column, Element = values of the column in the
+        loaded rows, in the order of the emission file
+    """
+    with np.load(path) as data:
+        all_columns = list(data['columns'])
+        if columns is None:
+            columns = all_columns
+        unknown = set(columns) - set(all_columns)
+        if unknown:
+            raise KeyError('Unknown columns: {}'.format(sorted(unknown)))
+
+        id_codes = None
+        if veh_ids is not None:
+            index = {v: i for i, v in enumerate(data['dict/id'])}
+            id_codes = np.array(
+                sorted(index[v] for v in veh_ids if v in index),
+                dtype=np.int32)
+
+        time_min, time_max = data['time_min'], data['time_max']
+        parts = {col: [] for col in columns}
+        for g in range(int(data['num_row_groups'])):
+            group = 'rg{}/'.format(g)
+
+            # skip the row groups that cannot contain any matching row
+            if time_range is not None and \
+                    (time_max[g] < time_range[0] or
+                     time_min[g] > time_range[1]):
+                continue
+            if id_codes is not None and not np.intersect1d(
+                    data[group + 'id_set'], id_codes,
+                    assume_unique=True).size:
+                continue
+
+            mask = None
+            if time_range is not None:
+                time = data[group + 'time']
+                mask = (time >= time_range[0]) & (time <= time_range[1])
+            if id_codes is not None:
+                id_mask = np.isin(data[group + 'id'], id_codes)
+                mask = id_mask if mask is None else mask & id_mask
+
+            for col in columns:
+                values = data[group + col]
+                parts[col].append(values if mask is None else values[mask])
+
+        result = {}
+        for col in columns:
+            if parts[col]:
+                values = np.concatenate(parts[col])
+            elif int(data['num_row_groups']) > 0:
+                values = data['rg0/' + col][:0]
+            else:
+                values = np.empty(0, dtype=_emission_dtype(col))
+            if decode and 'dict/' + col in data:
+                values = data['dict/' + col][values]
+            result[col] = values
+
+    return result
+
+
+def _emission_dtype(col):
+    """Returns the type of a column of the npz files generated by
+    emission_to_npz."""
+    if col in EMISSION_DICT_COLUMNS or col == 'lane_number':
+        return np.int32
+    elif col == 'time':
+        return np.float64
+    return np.float32
@@ -0,0 +1,192 @@
+"""Columnar storage used by the Vehicles class.
+
+Each per-vehicle attribute is stored in a contiguous numpy array (a column),
+and every vehicle occupies one row of the table. Rows that are freed when a
+vehicle leaves the network are reused by the next departing vehicle, so the
+table only grows when the number of vehicles in the network exceeds the
+number of rows that were previously allocated.
+"""
+
+import numbers
+import numpy as np
+
+# Key = name of the column
+# Element = (numpy dtype, value of an unset cell)
+DEFAULT_COLUMNS = {
+    "speed": (np.float64, -1001),
+    "position": (np.float64, -1001),
+    "lane": (np.int64, -1001),
+    "edge": (object, ""),
+    "absolute_position": (np.float64, -1001),
+    "length": (np.float64, -1001),
+    "headway": (np.float64, -1001),
+    "leader": (object, ""),
+    "follower": (object, ""),
+}
+
+
+class VehicleTable:
+
+    def __init__(self, columns=None, capacity=64):
+        """Instantiates an empty vehicle table.
+
+        Parameters
+        ----------
+        columns : dict, optional
+            Key = name of the column, Element = (dtype, default value). If not
+            specified, DEFAULT_COLUMNS is used.
+        capacity : int, optional
+            number of rows that are initially allocated
+        """
+        self._schema = dict(columns or DEFAULT_COLUMNS)
+        self._capacity = max(int(capacity), 1)
+
+        # Key = column name, Element = numpy array of size capacity
+        self._columns = {}
+        for name, (dtype, default) in self._schema.items():
+            col = np.empty(self._capacity, dtype=dtype)
+            col.fill(default)
+            self._columns[name] = col
+
+        # Key = vehicle id, Element = row of the vehicle in every column
+        self._rows = {}
+
+        # rows that used to belong to removed vehicles, and may be reused
+        self._free = []
+
+        # first row that has never been assigned to a vehicle
+        self._next_row = 0
+
+    def __contains__(self, veh_id):
+        return veh_id in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def capacity(self):
+        """Number of rows currently allocated for every column."""
+        return self._capacity
+
+    def column_names(self):
+        """Returns the names of all columns in the table."""
+        return list(self._schema.keys())
+
+    def has_column(self, name):
+        """Checks whether the table contains the specified column."""
+        return name in self._schema
+
+    def default(self, name):
+        """Returns the value of an unset cell in the specified column."""
+        return self._schema[name][1]
+
+    def add(self, veh_id):
+        """Assigns a row to a new vehicle and returns it.
+
+        If the vehicle is already in the table, its current row is returned.
+        The cells of a newly assigned row are reset to the default values of
+        each column.
+        """
+        if veh_id in self._rows:
+            return self._rows[veh_id]
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._next_row == self._capacity:
+                self._grow(2 * self._capacity)
+            row = self._next_row
+            self._next_row += 1
+
+        for name, (_, default) in self._schema.items():
+            self._columns[name][row] = default
+
+        self._rows[veh_id] = row
+        return row
+
+    def remove(self, veh_id):
+        """Frees the row of a vehicle so that it may be reused."""
+        row = self._rows.pop(veh_id, None)
+        if row is not None:
+            self._free.append(row)
+
+    def row(self, veh_id):
+        """Returns the row of a vehicle, or -1 if it is not in the table."""
+        return self._rows.get(veh_id, -1)
+
+    def rows(self, veh_ids):
+        """Returns the rows of a list of vehicles as an integer array.
+
+        Vehicles that are not in the table are assigned a row of -1.
+        """
+        rows = self._rows
+        return np.fromiter((rows.get(veh_id, -1) for veh_id in veh_ids),
+                           dtype=np.intp, count=len(veh_ids))
+
+    def get(self, name, veh_id, error=None):
+        """Returns the value of a column for one or several vehicles.
+
+        Parameters
+        ----------
+        name : str
+            name of the column
+        veh_id : str or list<str>
+            vehicle id, or list of vehicle ids
+        error : any, optional
+            value that is returned for vehicles that are not in the table
+
+        Returns
+        -------
+        any or numpy.ndarray
+            a single value if veh_id is a string, and an array with one element
+            per vehicle id otherwise
+        """
+        col = self._columns[name]
+
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            rows = self.rows(veh_id)
+            values = col[rows]
+            missing = rows < 0
+            if missing.any():
+                if values.dtype != object \
+                        and not isinstance(error, numbers.Number):
+                    values = values.astype(object)
+                values[missing] = error
+            return values
+
+        row = self._rows.get(veh_id, -1)
+        if row < 0:
+            return error
+        value = col[row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def set(self, name, veh_id, value):
+        """Sets the value of a column for a single vehicle.
+
+        Raises
+        ------
+        KeyError
+            if the vehicle is not in the table
+        """
+        self._columns[name][self._rows[veh_id]] = value
+
+    def set_rows(self, name, rows, values):
+        """Sets the value of a column for the specified rows."""
+        self._columns[name][rows] = values
+
+    def column(self, name):
+        """Returns the full array of a column.
+
+        Only the rows returned by `rows` and `row` hold meaningful values; the
+        remaining rows are either unassigned or belong to removed vehicles.
+        """
+        return self._columns[name]
+
+    def _grow(self, capacity):
+        """Increases the number of rows allocated for every column."""
+        for name, (dtype, default) in self._schema.items():
+            col = np.empty(capacity, dtype=dtype)
+            col.fill(default)
+            col[:self._capacity] = self._columns[name]
+            self._columns[name] = col
+        self._capacity = capacity
@@ -3,27 +3,45 @@ from flow.controllers.rlcontroller import RLController
 from flow.controllers.lane_change_controllers import SumoLaneChangeController
 import collections
 import logging
-from bisect import bisect_left
-import itertools
+from copy import deepcopy
 import numpy as np
 
 import traci.constants as tc
 
 from flow.core.params import SumoCarFollowingParams, SumoLaneChangeParams
+from flow.core.vehicle_table import VehicleTable
+from flow.core.counters import RollingCounter
+from flow.core.lanes import LaneGraph, LaneIndex, lane_headways, \
+    lane_leaders
+from flow.core.subscriptions import LEADER_DIST
 
 SPEED_MODES = {"aggressive": 0, "no_collide": 1, "custom_model": 25,
                "all_checks": 31}
 LC_MODES = {"aggressive": 0, "no_lat_collide": 512, "strategic": 853}
 
+# columns of the vehicle table that are filled from sumo subscriptions
+SUMO_COLUMNS = {"speed": tc.VAR_SPEED, "position": tc.VAR_LANEPOSITION,
+                "lane": tc.VAR_LANE_INDEX, "edge": tc.VAR_ROAD_ID}
+
 
 class Vehicles:
 
-    def __init__(self):
+    def __init__(self, columnar=False):
         """Base vehicle class.
 
         This is used to describe the state of all vehicles in the network.
         State information on the vehicles for a given time step can be set or
         retrieved from this class.
+
+        Parameters
+        ----------
+        columnar : bool, optional
+            specifies whether the frequently accessed states of the vehicles
+            (speed, position, lane, edge, headway, leader, follower, absolute
+            position, and length) are stored in a columnar numpy table (see
+            flow.core.vehicle_table.VehicleTable). If set to True, getters of
+            these states return numpy arrays when provided with a list of
+            vehicle ids, instead of lists.
         """
         self.__ids = []  # ids of all vehicles
         self.__human_ids = []  # ids of human-driven vehicles
@@ -52,14 +70,27 @@ class Vehicles:
         # contain the minGap attribute of each type of vehicle
         self.minGap = dict()
 
-        # list of vehicle ids located in each edge in the network
-        self._ids_by_edge = dict()
+        # vehicle ids located in each edge/lane pair in the network, sorted by
+        # position (see flow.core.lanes.LaneIndex)
+        self._lane_index = LaneIndex()
+
+        # lane connectivity of the network, used to compute lane leaders and
+        # followers (see flow.core.lanes.LaneGraph)
+        self._lane_graph = None
+
+        # positions of the vehicles in the list of ids, edge/lane codes (in
+        # the lane graph), and sorting order by edge, lane, and position, used
+        # to compute the lane data of the rl vehicles. These are kept across
+        # time steps, and only computed again when vehicles enter or exit the
+        # network (see _multi_lane_headways)
+        self._lane_data = None
 
         # number of vehicles that entered the network for every time-step
-        self._num_departed = []
+        # (see flow.core.counters)
+        self._num_departed = RollingCounter()
 
         # number of vehicles to exit the network for every time-step
-        self._num_arrived = []
+        self._num_arrived = RollingCounter()
 
         # simulation step size
         self.sim_step = 0
@@ -67,6 +98,21 @@ class Vehicles:
         # initial state of the vehicles class, used for serialization purposes
         self.initial = []
 
+        # columnar storage of the vehicle states, if requested
+        self.columnar = columnar
+        self._table = VehicleTable() if columnar else None
+
+    def __deepcopy__(self, memo):
+        """Copies the state of the vehicles (e.g. when the state of the
+        environment is saved), but not the lane connectivity of the network,
+        which is never modified, nor the scenario it refers to."""
+        if self._lane_graph is not None:
+            memo[id(self._lane_graph)] = self._lane_graph
+        copy = type(self).__new__(type(self))
+        memo[id(self)] = copy
+        copy.__dict__.update(deepcopy(self.__dict__, memo))
+        return copy
+
     def add(self,
             veh_id,
             acceleration_controller=(SumoCarFollowingController, {}),
@@ -200,6 +246,9 @@ class Vehicles:
             self.__ids.append(v_id)
 
             self.__vehicles[v_id] = dict()
+            self._lane_data = None
+            if self._table is not None:
+                self._table.add(v_id)
 
             # specify the type
             self.__vehicles[v_id]["type"] = veh_id
@@ -312,20 +361,7 @@ class Vehicles:
                     self.set_state(veh_id, "last_lc", env.time_counter)
 
             # update the "absolute_position" variable
-            for veh_id in self.__ids:
-                prev_pos = env.get_x_by_id(veh_id)
-                this_edge = vehicle_obs.get(veh_id, {}).get(tc.VAR_ROAD_ID, "")
-                this_pos = vehicle_obs.get(veh_id, {}).get(
-                    tc.VAR_LANEPOSITION, -1001)
-
-                # in case the vehicle isn't in the network
-                if this_edge == "":
-                    self.set_absolute_position(veh_id, -1001)
-                else:
-                    change = env.scenario.get_x(this_edge, this_pos) - prev_pos
-                    new_abs_pos = (self.get_absolute_position(veh_id) +
-                                   change) % env.scenario.length
-                    self.set_absolute_position(veh_id, new_abs_pos)
+            self._update_absolute_positions(vehicle_obs, env)
 
             # updated the list of departed and arrived vehicles
             self._num_departed.append(
@@ -333,33 +369,198 @@ class Vehicles:
             self._num_arrived.append(
                 len(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]))
 
-        # update the "headway", "leader", and "follower" variables
-        for veh_id in self.__ids:
-            headway = vehicle_obs.get(veh_id, {}).get(tc.VAR_LEADER, None)
-            # check for a collided vehicle or a vehicle with no leader
-            if headway is None:
-                self.__vehicles[veh_id]["leader"] = None
-                self.__vehicles[veh_id]["follower"] = None
-                self.__vehicles[veh_id]["headway"] = 1e+3
-            else:
-                vtype = self.get_state(veh_id, "type")
-                min_gap = self.minGap[vtype]
-                self.__vehicles[veh_id]["headway"] = headway[1] + min_gap
-                self.__vehicles[veh_id]["leader"] = headway[0]
-                try:
-                    self.__vehicles[headway[0]]["follower"] = veh_id
-                except KeyError:
-                    pass
+        # the leaders of the vehicles are not provided by context
+        # subscriptions, and are computed from the states of all vehicles
+        if not env.subscriptions.subscribes_leaders:
+            self._add_leaders(vehicle_obs, env)
+
+        if self._table is not None:
+            # update the sumo states, "headway", "leader", and "follower"
+            # columns of the vehicle table
+            moved = self._update_table(vehicle_obs)
+        else:
+            # update the "headway", "leader", and "follower" variables, and
+            # collect the vehicles that changed edge or lane
+            moved = []
+            sumo_obs = self.__sumo_obs or {}
+            for veh_id in self.__ids:
+                obs = vehicle_obs.get(veh_id, {})
+                prev_obs = sumo_obs.get(veh_id, {})
+                if obs.get(tc.VAR_ROAD_ID, "") != \
+                        prev_obs.get(tc.VAR_ROAD_ID, "") or \
+                        obs.get(tc.VAR_LANE_INDEX) != \
+                        prev_obs.get(tc.VAR_LANE_INDEX):
+                    moved.append(veh_id)
+
+                headway = obs.get(tc.VAR_LEADER, None)
+                # check for a collided vehicle or a vehicle with no leader
+                if headway is None:
+                    self.__vehicles[veh_id]["leader"] = None
+                    self.__vehicles[veh_id]["follower"] = None
+                    self.__vehicles[veh_id]["headway"] = 1e+3
+                else:
+                    vtype = self.get_state(veh_id, "type")
+                    min_gap = self.minGap[vtype]
+                    self.__vehicles[veh_id]["headway"] = headway[1] + min_gap
+                    self.__vehicles[veh_id]["leader"] = headway[0]
+                    try:
+                        self.__vehicles[headway[0]]["follower"] = veh_id
+                    except KeyError:
+                        pass
 
         # update the sumo observations variable
         self.__sumo_obs = vehicle_obs.copy()
 
+        # vehicles that were placed again in the network (see above) or
+        # teleported may have moved within their lane
+        moved = list(dict.fromkeys(
+            moved + [veh_id for veh_id in
+                     list(sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]) +
+                     list(sim_obs[tc.VAR_TELEPORT_STARTING_VEHICLES_IDS])
+                     if veh_id in self.__vehicles]))
+
         # update the lane leaders data for each vehicle
-        self._multi_lane_headways(env)
+        with env.profiler.phase("headways"):
+            self._multi_lane_headways(env, moved)
 
         # make sure the rl vehicle list is still sorted
         self.__rl_ids.sort()
 
+    def _update_absolute_positions(self, vehicle_obs, env):
+        """Updates the "absolute_position" variable of all vehicles from the
+        change in their position since the previous step.
+
+        The positions of all vehicles in the network before and after the
+        step are computed with single calls to Scenario.get_x_batch.
+        """
+        ids = self.__ids
+        if len(ids) == 0:
+            return
+
+        scenario = env.scenario
+        prev_edges = self.get_edge(ids)
+        prev_pos = scenario.get_x_batch(prev_edges, self.get_position(ids))
+        # vehicles that were not in the network (see Env.get_x_by_id)
+        prev_pos[[edge == "" for edge in prev_edges]] = 0.
+
+        obs = [vehicle_obs.get(veh_id, {}) for veh_id in ids]
+        this_edges = [o.get(tc.VAR_ROAD_ID, "") for o in obs]
+        this_pos = scenario.get_x_batch(
+            this_edges, [o.get(tc.VAR_LANEPOSITION, -1001) for o in obs])
+
+        abs_pos = np.asarray(self.get_absolute_position(ids), dtype=float)
+        abs_pos = (abs_pos + (this_pos - prev_pos)) % scenario.length
+
+        # in case the vehicle isn't in the network
+        abs_pos[[edge == "" for edge in this_edges]] = -1001
+
+        if self._table is not None:
+            self._table.set_rows("absolute_position", self._table.rows(ids),
+                                 abs_pos)
+        else:
+            for veh_id, x in zip(ids, abs_pos.tolist()):
+                self.__vehicles[veh_id]["absolute_position"] = x
+
+    def _add_leaders(self, vehicle_obs, env):
+        """Adds the leader and headway of every vehicle to its observations.
+
+        The leaders are computed in a single batch from the edges, lanes, and
+        positions of all vehicles (see flow.core.lanes.lane_leaders), and are
+        stored in the same format as the results of vehicle.subscribeLeader,
+        i.e. (leader id, gap excluding the minimum gap), or None if there is
+        no leader within LEADER_DIST meters.
+
+        Parameters
+        ----------
+        vehicle_obs: dict
+            vehicle observations provided from sumo via subscriptions
+        env: Environment type
+            state of the environment at the current time step
+        """
+        ids = [veh_id for veh_id in vehicle_obs if veh_id in self.__vehicles]
+        if len(ids) == 0:
+            return
+
+        graph = self._get_lane_graph(env)
+        obs = [vehicle_obs[veh_id] for veh_id in ids]
+        edges = [o.get(tc.VAR_ROAD_ID, "") for o in obs]
+        lanes = [o.get(tc.VAR_LANE_INDEX, 0) for o in obs]
+        positions = [o.get(tc.VAR_LANEPOSITION, -1001) for o in obs]
+        lengths = self.get_length(ids)
+
+        nodes = graph.nodes(edges, lanes)
+        query = np.flatnonzero(nodes >= 0)
+        _, headways, leaders = lane_leaders(
+            graph, ids, nodes, positions, lengths, query)
+
+        for o in obs:
+            o[tc.VAR_LEADER] = None
+        for i, headway, leader in zip(query, headways, leaders):
+            if leader != "" and headway <= LEADER_DIST:
+                min_gap = self.minGap[self.get_state(ids[i], "type")]
+                obs[i][tc.VAR_LEADER] = (leader, headway - min_gap)
+
+    def _update_table(self, vehicle_obs):
+        """Copies the subscription results of all vehicles into the columns
+        of the vehicle table, and updates the "headway", "leader", and
+        "follower" columns.
+
+        Parameters
+        ----------
+        vehicle_obs: dict
+            vehicle observations provided from sumo via subscriptions
+
+        Returns
+        -------
+        list<str>
+            names of the vehicles whose edge or lane changed
+        """
+        ids = self.__ids
+        rows = self._table.rows(ids)
+        obs = [vehicle_obs.get(veh_id, {}) for veh_id in ids]
+
+        # states that are directly provided by sumo. The edges and lanes are
+        # compared with the previous ones in a single vectorized operation
+        changed = np.zeros(len(ids), dtype=bool)
+        for name, var in SUMO_COLUMNS.items():
+            default = self._table.default(name)
+            values = [ob.get(var, default) for ob in obs]
+            if name in ("edge", "lane"):
+                new = np.empty(len(ids), dtype=self._table.column(name).dtype)
+                new[:] = values
+                changed |= self._table.column(name)[rows] != new
+                values = new
+            self._table.set_rows(name, rows, values)
+
+        # the follower of a vehicle is only modified if it is the leader of
+        # another vehicle, or if it does not have a leader itself
+        headways = np.full(len(ids), 1e+3)
+        leaders = np.empty(len(ids), dtype=object)
+        followers = {}
+        for i, (veh_id, ob) in enumerate(zip(ids, obs)):
+            headway = ob.get(tc.VAR_LEADER, None)
+            # check for a collided vehicle or a vehicle with no leader
+            if headway is None:
+                followers[rows[i]] = None
+            else:
+                vtype = self.__vehicles[veh_id]["type"]
+                headways[i] = headway[1] + self.minGap[vtype]
+                leaders[i] = headway[0]
+                lead_row = self._table.row(headway[0])
+                if lead_row >= 0:
+                    followers[lead_row] = veh_id
+
+        self._table.set_rows("headway", rows, headways)
+        self._table.set_rows("leader", rows, leaders)
+        if followers:
+            follower_rows = np.fromiter(followers.keys(), dtype=np.intp,
+                                        count=len(followers))
+            follower_ids = np.empty(len(followers), dtype=object)
+            follower_ids[:] = list(followers.values())
+            self._table.set_rows("follower", follower_rows, follower_ids)
+
+        return [ids[i] for i in np.flatnonzero(changed)]
+
     def _add_departed(self, veh_id, veh_type, env):
         """Adds a vehicle that entered the network from an inflow or reset.
 
@@ -378,6 +579,9 @@ class Vehicles:
         self.num_vehicles += 1
         self.__ids.append(veh_id)
         self.__vehicles[veh_id] = dict()
+        self._lane_data = None
+        if self._table is not None:
+            self._table.add(veh_id)
 
         # specify the type
         self.__vehicles[veh_id]["type"] = veh_type
@@ -419,10 +623,7 @@ class Vehicles:
                 self.__controlled_lc_ids.append(veh_id)
 
         # subscribe the new vehicle
-        env.traci_connection.vehicle.subscribe(
-            veh_id, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
-                     tc.VAR_ROAD_ID, tc.VAR_SPEED, tc.VAR_EDGES])
-        env.traci_connection.vehicle.subscribeLeader(veh_id, 2000)
+        env.subscriptions.subscribe_vehicle(veh_id)
 
         # some constant vehicle parameters to the vehicles class
         self.set_length(
@@ -464,6 +665,10 @@ class Vehicles:
         """
         del self.__vehicles[veh_id]
         self.__ids.remove(veh_id)
+        if self._table is not None:
+            self._table.remove(veh_id)
+        self._lane_index.remove(veh_id)
+        self._lane_data = None
         self.num_vehicles -= 1
 
         # remove it from all other ids (if it is there)
@@ -482,27 +687,57 @@ class Vehicles:
 
     def test_set_speed(self, veh_id, speed):
         self.__sumo_obs[veh_id][tc.VAR_SPEED] = speed
+        if self._table is not None:
+            self._table.set("speed", veh_id, speed)
 
     def set_absolute_position(self, veh_id, absolute_position):
-        self.__vehicles[veh_id]["absolute_position"] = absolute_position
+        if self._table is not None:
+            self._table.set("absolute_position", veh_id, absolute_position)
+        else:
+            self.__vehicles[veh_id]["absolute_position"] = absolute_position
 
     def test_set_position(self, veh_id, position):
         self.__sumo_obs[veh_id][tc.VAR_LANEPOSITION] = position
+        if self._table is not None:
+            self._table.set("position", veh_id, position)
+        self._relocate(veh_id)
 
     def test_set_edge(self, veh_id, edge):
         self.__sumo_obs[veh_id][tc.VAR_ROAD_ID] = edge
+        if self._table is not None:
+            self._table.set("edge", veh_id, edge)
+        self._relocate(veh_id)
 
     def test_set_lane(self, veh_id, lane):
         self.__sumo_obs[veh_id][tc.VAR_LANE_INDEX] = lane
+        if self._table is not None:
+            self._table.set("lane", veh_id, lane)
+        self._relocate(veh_id)
+
+    def _relocate(self, veh_id):
+        """Moves a vehicle in the lane index after its edge, lane, or
+        position was modified outside of a simulation step."""
+        self._lane_index.update([veh_id], [self.get_edge(veh_id)],
+                                [self.get_lane(veh_id)], self.get_position)
+        self._lane_data = None
 
     def set_leader(self, veh_id, leader):
-        self.__vehicles[veh_id]["leader"] = leader
+        if self._table is not None:
+            self._table.set("leader", veh_id, leader)
+        else:
+            self.__vehicles[veh_id]["leader"] = leader
 
     def set_follower(self, veh_id, follower):
-        self.__vehicles[veh_id]["follower"] = follower
+        if self._table is not None:
+            self._table.set("follower", veh_id, follower)
+        else:
+            self.__vehicles[veh_id]["follower"] = follower
 
     def set_headway(self, veh_id, headway):
-        self.__vehicles[veh_id]["headway"] = headway
+        if self._table is not None:
+            self._table.set("headway", veh_id, headway)
+        else:
+            self.__vehicles[veh_id]["headway"] = headway
 
     def get_ids(self):
         """Returns the names of all vehicles currently in the network."""
@@ -546,31 +781,45 @@ class Vehicles:
         vehicles are currently in the edge, then returns an empty list."""
         if isinstance(edges, (list, np.ndarray)):
             return sum([self.get_ids_by_edge(edge) for edge in edges], [])
-        return self._ids_by_edge.get(edges, []) or []
+        return self._lane_index.get_ids_by_edge(edges)
+
+    def get_ids_by_lane(self, edge, lane):
+        """Returns the names of all vehicles in the specified lane of an edge,
+        sorted by position. If no vehicles are currently in the lane, then
+        returns an empty list."""
+        return self._lane_index.get_ids_by_lane(edge, lane)
 
     def get_inflow_rate(self, time_span):
         """Returns the inflow rate (in veh/hr) of vehicles from the network for
-        the last **time_span** seconds."""
-        if len(self._num_departed) == 0:
-            return 0
-        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+        the last **time_span** seconds.
+
+        The window is limited to the counts kept by the vehicles class (see
+        flow.core.counters.DEFAULT_CAPACITY)."""
+        return self._flow_rate(self._num_departed, time_span)
 
     def get_outflow_rate(self, time_span):
         """Returns the outflow rate (in veh/hr) of vehicles from the network
-        for the last **time_span** seconds."""
-        if len(self._num_arrived) == 0:
+        for the last **time_span** seconds.
+
+        The window is limited to the counts kept by the vehicles class (see
+        flow.core.counters.DEFAULT_CAPACITY)."""
+        return self._flow_rate(self._num_arrived, time_span)
+
+    def _flow_rate(self, counter, time_span):
+        """Returns the rate (in veh/hr) of the counts of a RollingCounter over
+        the last **time_span** seconds."""
+        if len(counter) == 0:
             return 0
-        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+        num_steps = int(time_span / self.sim_step)
+        if num_steps <= 0 or num_steps > len(counter):
+            # windows of zero steps cover all steps
+            num_steps = len(counter)
+        return 3600 * counter.sum(num_steps) / (num_steps * self.sim_step)
 
     def get_num_arrived(self):
         """Returns the number of vehicles that arrived in the last
         time step"""
-        if len(self._num_arrived) > 0:
-            return self._num_arrived[-1]
-        else:
-            return 0
+        return self._num_arrived.last()
 
     def get_initial_speed(self, veh_id, error=-1001):
         """Returns the initial speed upon reset of the specified vehicle.
@@ -645,6 +894,8 @@ class Vehicles:
         float
 
         """
+        if self._table is not None:
+            return self._table.get("speed", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_speed(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_SPEED, error)
@@ -664,6 +915,8 @@ class Vehicles:
         float
 
         """
+        if self._table is not None:
+            return self._table.get("absolute_position", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_absolute_position(vehID, error)
                     for vehID in veh_id]
@@ -684,6 +937,8 @@ class Vehicles:
         float
 
         """
+        if self._table is not None:
+            return self._table.get("position", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_position(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_LANEPOSITION, error)
@@ -704,6 +959,8 @@ class Vehicles:
         str
 
         """
+        if self._table is not None:
+            return self._table.get("edge", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_edge(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_ROAD_ID, error)
@@ -723,12 +980,17 @@ class Vehicles:
         int
 
         """
+        if self._table is not None:
+            return self._table.get("lane", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_lane(vehID, error) for vehID in veh_id]
         return self.__sumo_obs.get(veh_id, {}).get(tc.VAR_LANE_INDEX, error)
 
     def set_length(self, veh_id, length):
-        self.__vehicles[veh_id]["length"] = length
+        if self._table is not None:
+            self._table.set("length", veh_id, length)
+        else:
+            self.__vehicles[veh_id]["length"] = length
 
     def get_length(self, veh_id, error=-1001):
         """Returns the length of the specified vehicle.
@@ -745,6 +1007,8 @@ class Vehicles:
         float
 
         """
+        if self._table is not None:
+            return self._table.get("length", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_length(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("length", error)
@@ -842,6 +1106,8 @@ class Vehicles:
         str
 
         """
+        if self._table is not None:
+            return self._table.get("leader", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_leader(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("leader", error)
@@ -861,6 +1127,8 @@ class Vehicles:
         str
 
         """
+        if self._table is not None:
+            return self._table.get("follower", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_follower(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("follower", error)
@@ -880,6 +1148,8 @@ class Vehicles:
         float
 
         """
+        if self._table is not None:
+            return self._table.get("headway", veh_id, error)
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_headway(vehID, error) for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get("headway", error)
@@ -981,6 +1251,9 @@ class Vehicles:
         Updates the state *state_name* of the vehicle with id *veh_id* with the
         value *state*.
         """
+        if self._table is not None and self._table.has_column(state_name):
+            self._table.set(state_name, veh_id, state)
+            return
         self.__vehicles[veh_id][state_name] = state
 
     # TODO(ak): getting sumo observations?
@@ -988,234 +1261,93 @@ class Vehicles:
         """Generic get function. Returns the value of *state_name* of the
         specified vehicles at the current time step.
         """
+        if self._table is not None and self._table.has_column(state_name):
+            return self._table.get(state_name, veh_id, error)
         if isinstance(veh_id, list):
             return [self.get_state(vehID, state_name, error)
                     for vehID in veh_id]
         return self.__vehicles.get(veh_id, {}).get(state_name, error)
 
-    def _multi_lane_headways(self, env):
-        """Computes the lane leaders/followers/headways/tailways for all
-        vehicles in the network."""
-        edge_list = env.scenario.get_edge_list()
-        junction_list = env.scenario.get_junction_list()
-        tot_list = edge_list + junction_list
-        num_edges = (len(env.scenario.get_edge_list()) +
-                     len(env.scenario.get_junction_list()))
-
-        # maximum number of lanes in the network
-        max_lanes = max([env.scenario.num_lanes(edge_id)
-                         for edge_id in tot_list])
-
-        # Key = edge id
-        # Element = list, with the ith element containing tuples with the name
-        #           and position of all vehicles in lane i
-        edge_dict = dict.fromkeys(tot_list)
-
-        # add the vehicles to the edge_dict element
-        for veh_id in self.get_ids():
-            edge = self.get_edge(veh_id)
-            lane = self.get_lane(veh_id)
-            pos = self.get_position(veh_id)
-            if edge:
-                if edge_dict[edge] is None:
-                    edge_dict[edge] = [[] for _ in range(max_lanes)]
-                edge_dict[edge][lane].append((veh_id, pos))
-
-        # sort all lanes in each edge by position
-        for edge in tot_list:
-            if edge_dict[edge] is None:
-                del edge_dict[edge]
-            else:
-                for lane in range(max_lanes):
-                    edge_dict[edge][lane].sort(key=lambda x: x[1])
-
-        for veh_id in self.get_rl_ids():
-            # collect the lane leaders, followers, headways, and tailways for
-            # each vehicle
-            edge = self.get_edge(veh_id)
-            if edge:
-                headways, tailways, leaders, followers = \
-                    self._multi_lane_headways_util(veh_id, edge_dict,
-                                                   num_edges, env)
-
-                # add the above values to the vehicles class
-                self.set_lane_headways(veh_id, headways)
-                self.set_lane_tailways(veh_id, tailways)
-                self.set_lane_leaders(veh_id, leaders)
-                self.set_lane_followers(veh_id, followers)
-
-        self._ids_by_edge = dict().fromkeys(edge_list)
-
-        for edge_id in edge_dict:
-            edges = list(itertools.chain.from_iterable(edge_dict[edge_id]))
-            # check for edges with no vehicles
-            if len(edges) > 0:
-                edges, _ = zip(*edges)
-                self._ids_by_edge[edge_id] = list(edges)
-            else:
-                self._ids_by_edge[edge_id] = []
+    def _get_lane_graph(self, env):
+        """Returns the lane connectivity of the network.
 
-    def _multi_lane_headways_util(self, veh_id, edge_dict, num_edges, env):
-        """Utility function for _multi_lane_headways()
-
-        Computes the lane headways, tailways, leaders, and followers for the
-        specified vehicle.
+        The lane graph is only recomputed if the scenario changes (e.g. when
+        the ring length is modified upon reset).
+        """
+        if self._lane_graph is None or \
+                self._lane_graph.scenario is not env.scenario:
+            self._lane_graph = LaneGraph(env.scenario)
+        return self._lane_graph
+
+    def _multi_lane_headways(self, env, moved):
+        """Computes the lane leaders/followers/headways/tailways for all rl
+        vehicles in the network, and updates the index of vehicles in every
+        edge/lane pair.
+
+        Only the vehicles that moved are updated in the index (see
+        flow.core.lanes.LaneIndex), which provides the order of the vehicles
+        from which the lane data of all rl vehicles is computed in a single
+        batch (see flow.core.lanes.lane_headways). The edge/lane codes of the
+        vehicles and their order are reused from the previous step, and only
+        modified for the vehicles that moved.
 
         Parameters
         ----------
-        veh_id : str
-            name of the vehicle
-        edge_dict : dict < list<tuple> >
-            Key = Edge name
-                Index = lane index
-                Element = sorted list of (vehicle id, position)
-
-        Returns
-        -------
-        headway : list<float>
-            Index = lane index
-            Element = headway at this lane
-        tailway : list<float>
-            Index = lane index
-            Element = tailway at this lane
-        leader : list<str>
-            Index = lane index
-            Element = leader at this lane
-        follower : list<str>
-            Index = lane index
-            Element = follower at this lane
-        """
-        this_pos = self.get_position(veh_id)
-        this_edge = self.get_edge(veh_id)
-        num_lanes = env.scenario.num_lanes(this_edge)
-
-        # set default values for all output values
-        headway = [1000] * num_lanes
-        tailway = [1000] * num_lanes
-        leader = [""] * num_lanes
-        follower = [""] * num_lanes
-
-        for lane in range(num_lanes):
-            # check the vehicle's current  edge for lane leaders and followers
-            if len(edge_dict[this_edge][lane]) > 0:
-                ids, positions = zip(*edge_dict[this_edge][lane])
-                ids = list(ids)
-                positions = list(positions)
-                index = bisect_left(positions, this_pos)
-
-                # if you are at the end or the front of the edge, the lane
-                # leader is in the edges in front of you
-                if index < len(positions) - 1:
-                    # check if the index does not correspond to the current
-                    # vehicle
-                    if ids[index] == veh_id:
-                        leader[lane] = ids[index + 1]
-                        headway[lane] = (positions[index + 1] - this_pos -
-                                         self.get_length(leader[lane]))
-                    else:
-                        leader[lane] = ids[index]
-                        headway[lane] = positions[index] - this_pos \
-                            - self.get_length(leader[lane])
-
-                # you are in the back of the queue, the lane follower is in the
-                # edges behind you
-                if index > 0:
-                    follower[lane] = ids[index - 1]
-                    tailway[lane] = this_pos - positions[index - 1] \
-                        - self.get_length(veh_id)
-
-            # if lane leader not found, check next edges
-            if leader[lane] == "":
-                headway[lane], leader[lane] = self._next_edge_leaders(
-                    veh_id, edge_dict, lane, num_edges, env)
-
-            # if lane follower not found, check previous edges
-            if follower[lane] == "":
-                tailway[lane], follower[lane] = self._prev_edge_followers(
-                    veh_id, edge_dict, lane, num_edges, env)
-
-        return headway, tailway, leader, follower
-
-    def _next_edge_leaders(self, veh_id, edge_dict, lane, num_edges, env):
-        """Looks to the edges/junctions in front of the vehicle's current edge
-        for potential leaders. This is currently done by only looking one
-        edge/junction backwards.
-
-        Returns
-        -------
-        headway : float
-            lane headway for the specified lane
-        leader : str
-            lane leader for the specified lane
-        """
-        pos = self.get_position(veh_id)
-        edge = self.get_edge(veh_id)
-
-        headway = 1000  # env.scenario.length
-        leader = ""
-        add_length = 0  # length increment in headway
-
-        for _ in range(num_edges):
-            # break if there are no edge/lane pairs behind the current one
-            if len(env.scenario.next_edge(edge, lane)) == 0:
-                break
-
-            add_length += env.scenario.edge_length(edge)
-            edge, lane = env.scenario.next_edge(edge, lane)[0]
-
-            try:
-                if len(edge_dict[edge][lane]) > 0:
-                    leader = edge_dict[edge][lane][0][0]
-                    headway = edge_dict[edge][lane][0][1] - pos + add_length \
-                        - self.get_length(leader)
-            except KeyError:
-                # current edge has no vehicles, so move on
-                continue
-
-            # stop if a lane follower is found
-            if leader != "":
-                break
-
-        return headway, leader
-
-    def _prev_edge_followers(self, veh_id, edge_dict, lane, num_edges, env):
-        """Looks to the edges/junctions behind the vehicle's current edge for
-        potential followers. This is currently done by only looking one
-        edge/junction backwards.
-
-        Returns
-        -------
-        tailway : float
-            lane tailway for the specified lane
-        follower : str
-            lane follower for the specified lane
+        env: Environment type
+            state of the environment at the current time step
+        moved: list<str>
+            names of the vehicles that entered the network, or changed edge
+            or lane, since the previous step
         """
-        pos = self.get_position(veh_id)
-        edge = self.get_edge(veh_id)
-
-        tailway = 1000  # env.scenario.length
-        follower = ""
-        add_length = 0  # length increment in headway
-
-        for _ in range(num_edges):
-            # break if there are no edge/lane pairs behind the current one
-            if len(env.scenario.prev_edge(edge, lane)) == 0:
-                break
-
-            edge, lane = env.scenario.prev_edge(edge, lane)[0]
-            add_length += env.scenario.edge_length(edge)
-
-            try:
-                if len(edge_dict[edge][lane]) > 0:
-                    tailway = pos - edge_dict[edge][lane][-1][1] + add_length \
-                              - self.get_length(veh_id)
-                    follower = edge_dict[edge][lane][-1][0]
-            except KeyError:
-                # current edge has no vehicles, so move on
-                continue
-
-            # stop if a lane follower is found
-            if follower != "":
-                break
-
-        return tailway, follower
+        # update the vehicles located in each edge/lane pair
+        moved_edges = self.get_edge(moved)
+        moved_lanes = self.get_lane(moved)
+        self._lane_index.update(moved, moved_edges, moved_lanes,
+                                self.get_position)
+
+        if len(self.get_rl_ids()) == 0:
+            self._lane_data = None
+            return
+
+        ids = self.get_ids()
+        graph = self._get_lane_graph(env)
+        if self._lane_data is None or self._lane_data["graph"] is not graph:
+            self._lane_data = {
+                "graph": graph,
+                "rows": {veh_id: i for i, veh_id in enumerate(ids)},
+                "nodes": graph.nodes(self.get_edge(ids), self.get_lane(ids)),
+                "version": None,
+                "order": None,
+            }
+        elif len(moved) > 0:
+            rows = self._lane_data["rows"]
+            self._lane_data["nodes"][[rows[veh_id] for veh_id in moved]] = \
+                graph.nodes(moved_edges, moved_lanes)
+
+        rows = self._lane_data["rows"]
+        nodes = self._lane_data["nodes"]
+        if self._lane_data["version"] != self._lane_index.version:
+            sorted_ids = self._lane_index.sorted_ids(graph)
+            self._lane_data["order"] = np.fromiter(
+                map(rows.__getitem__, sorted_ids), dtype=np.intp,
+                count=len(sorted_ids))
+            self._lane_data["version"] = self._lane_index.version
+
+        positions = np.asarray(self.get_position(ids), dtype=float)
+        lengths = np.asarray(self.get_length(ids), dtype=float)
+
+        # only rl vehicles located in an edge of the network are considered
+        query = [rows[veh_id] for veh_id in self.get_rl_ids()
+                 if nodes[rows[veh_id]] >= 0]
+
+        _, headways, tailways, leaders, followers = lane_headways(
+            graph, ids, nodes, positions, lengths, query,
+            order=self._lane_data["order"])
+
+        # add the above values to the vehicles class
+        for i, row in enumerate(query):
+            veh_id = ids[row]
+            self.set_lane_headways(veh_id, headways[i])
+            self.set_lane_tailways(veh_id, tailways[i])
+            self.set_lane_leaders(veh_id, leaders[i])
+            self.set_lane_followers(veh_id, followers[i])
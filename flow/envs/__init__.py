@@ -1,15 +1,28 @@
-from flow.envs.base_env import Env
-from flow.envs.bottleneck_env import BottleNeckAccelEnv, BottleneckEnv
-from flow.envs.green_wave_env import GreenWaveEnv, GreenWaveTestEnv
-from flow.envs.loop.lane_changing import LaneChangeAccelEnv, \
-    LaneChangeAccelPOEnv
-from flow.envs.loop.loop_accel import AccelEnv
-from flow.envs.loop.loop_merges import TwoLoopsMergeEnv
-from flow.envs.loop.wave_attenuation import WaveAttenuationEnv, \
-    WaveAttenuationPOEnv
-from flow.envs.merge import WaveAttenuationMergePOEnv
+"""Environments of flow.
+
+The environments are imported from their modules the first time they are
+accessed (see flow.core.lazy_import), so that importing one environment does
+not import the dependencies of all others.
+"""
+from flow.core.lazy_import import lazy_attributes
 
 __all__ = ["Env", "AccelEnv", "LaneChangeAccelEnv", "LaneChangeAccelPOEnv",
            "GreenWaveTestEnv", "GreenWaveEnv", "WaveAttenuationMergePOEnv",
            "TwoLoopsMergeEnv", "BottleneckEnv", "BottleNeckAccelEnv",
-           "WaveAttenuationEnv", "WaveAttenuationPOEnv"]
+           "WaveAttenuationEnv", "WaveAttenuationPOEnv", "VecEnv"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, globals(), {
+    "Env": "flow.envs.base_env",
+    "BottleNeckAccelEnv": "flow.envs.bottleneck_env",
+    "BottleneckEnv": "flow.envs.bottleneck_env",
+    "GreenWaveEnv": "flow.envs.green_wave_env",
+    "GreenWaveTestEnv": "flow.envs.green_wave_env",
+    "LaneChangeAccelEnv": "flow.envs.loop.lane_changing",
+    "LaneChangeAccelPOEnv": "flow.envs.loop.lane_changing",
+    "AccelEnv": "flow.envs.loop.loop_accel",
+    "TwoLoopsMergeEnv": "flow.envs.loop.loop_merges",
+    "WaveAttenuationEnv": "flow.envs.loop.wave_attenuation",
+    "WaveAttenuationPOEnv": "flow.envs.loop.wave_attenuation",
+    "WaveAttenuationMergePOEnv": "flow.envs.merge",
+    "VecEnv": "flow.envs.vec_env",
+})
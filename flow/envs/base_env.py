@@ -1,32 +1,32 @@
 import logging
 import os
 import signal
-import subprocess
+import tempfile
+from collections import OrderedDict
 from copy import deepcopy
-import time
 import traceback
 import numpy as np
 import random
 
-import traci
 from traci import constants as tc
 import gym
 
-import sumolib
-
 try:
     # Import serializable if rllab is installed
     from rllab.core.serializable import Serializable
 except ImportError:
     Serializable = object
 
-try:
-    # Load user config if exists, else load default config
-    import flow.core.config as config
-except ImportError:
-    import flow.config_default as config
-
 from flow.core.util import ensure_dir
+from flow.core.traci_batching import TraCICommandBatcher
+from flow.core.subscriptions import SubscriptionManager
+from flow.core.fast_sim import FastSimulation
+from flow.core.async_traci import AsyncTraCIConnection
+from flow.core.sumo_pool import SumoPool, kill
+from flow.core.trajectories import TrajectoryRecorder
+from flow.core.detectors import Detectors
+from flow.core.aggregates import StepAggregates
+from flow.core.profiling import StepProfiler
 
 # Number of retries on restarting SUMO before giving up
 RETRIES_ON_ERROR = 10
@@ -83,6 +83,10 @@ class Env(gym.Env, Serializable):
         self.state = None
         self.obs_var_labels = []
 
+        # buffer the observations are written into, if any (see the
+        # "preallocate_observations" env_params and set_observation_buffer)
+        self.observation_buffer = None
+
         # simulation step size
         self.sim_step = sumo_params.sim_step
 
@@ -98,6 +102,18 @@ class Env(gym.Env, Serializable):
         # TraCI connection used to communicate with sumo
         self.traci_connection = None
 
+        # batches the set commands sent to sumo during a simulation step (see
+        # flow.core.traci_batching.TraCICommandBatcher)
+        self.traci_batcher = None
+
+        # subscriptions to the states of the vehicles, traffic lights, and
+        # simulation (see flow.core.subscriptions.SubscriptionManager)
+        self.subscriptions = None
+
+        # asynchronous simulation steps over the TraCI connection (see
+        # flow.core.async_traci.AsyncTraCIConnection)
+        self.async_connection = None
+
         # dictionary of initial observations used while resetting vehicles
         # after each rollout
         self.initial_observations = dict.fromkeys(self.vehicles.get_ids())
@@ -114,6 +130,53 @@ class Env(gym.Env, Serializable):
         # contains the subprocess.Popen instance used to start traci
         self.sumo_proc = None
 
+        # state of the network the rollouts start from, and file the state
+        # of sumo is saved in (see the "snapshot_reset" env_params)
+        self.snapshot = None
+        self.snapshot_file = None
+
+        # scenario and version of its configuration files the snapshot was
+        # taken in (see _get_snapshot_key)
+        self.snapshot_key = None
+
+        # sumo instances started ahead of time (see flow.core.sumo_pool)
+        self.sumo_pool = SumoPool()
+
+        # seed of the sumo instance started ahead of time for the next
+        # rollout, if any
+        self.warm_seed = None
+
+        # measures the time spent in the phases of every step, if requested
+        # (see the "profile" and "profile_path" sumo_params)
+        self.profiler = StepProfiler(
+            enabled=sumo_params.profile or
+            sumo_params.profile_path is not None,
+            get_round_trips=self._get_num_round_trips)
+
+        # number of rollouts whose profile was written to profile_path
+        self.num_profiles = 0
+
+        # virtual loop detectors measuring traffic over segments of the
+        # network, updated after every simulation step (see
+        # flow.core.detectors)
+        self.detectors = Detectors(scenario, self.sim_step)
+
+        # speeds, headways, and edges of the vehicles shared by the reward
+        # functions, computed at most once per step (see
+        # flow.core.aggregates)
+        self.aggregates = StepAggregates(self)
+
+        # records the trajectories of the vehicles, if requested (see the
+        # "trajectory_path" sumo_params)
+        self.trajectory_recorder = None
+        if sumo_params.trajectory_path is not None:
+            ensure_dir(sumo_params.trajectory_path)
+            self.trajectory_recorder = TrajectoryRecorder(
+                os.path.join(sumo_params.trajectory_path,
+                             "{0}-trajectory.npz".format(scenario.name)),
+                fields=sumo_params.trajectory_fields,
+                interval=sumo_params.trajectory_interval)
+
         self.start_sumo()
         self.setup_initial_state()
 
@@ -133,13 +196,18 @@ class Env(gym.Env, Serializable):
         sumo_binary: str, optional
             specifies whether to use sumo's gui
         """
+        if self.async_connection.pending:
+            self.async_connection.finish_step()
         self.traci_connection.close(False)
-        self.sumo_proc.kill()
+        if self.sumo_proc is not None:
+            kill(self.sumo_proc)
 
         if sumo_binary is not None:
             self.sumo_params.sumo_binary = sumo_binary
 
-        self.sumo_params.port = sumolib.miscutils.getFreeSocketPort()
+        # sumo is restarted on a free port (possibly one of an instance
+        # started ahead of time, see flow.core.sumo_pool)
+        self.sumo_params.port = None
 
         if sumo_params.emission_path is not None:
             ensure_dir(sumo_params.emission_path)
@@ -154,82 +222,56 @@ class Env(gym.Env, Serializable):
         Uses the configuration files created by the generator class to
         initialize a sumo instance. Also initializes a traci connection to
         interface with sumo from Python.
+
+        If the "fast" simulator is requested in sumo_params, the vehicles are
+        instead simulated within the python process by a FastSimulation,
+        which is accessed through the same interface as the traci connection.
         """
+        if self.sumo_params.simulator == "fast":
+            # the vehicles are simulated within the python process, see
+            # flow.core.fast_sim
+            self.traci_connection = FastSimulation(self.scenario,
+                                                   self.sim_step)
+            self.traci_batcher = TraCICommandBatcher(self.traci_connection)
+            self.subscriptions = SubscriptionManager(
+                self.traci_connection, self.sumo_params.subscription_mode)
+            self.async_connection = AsyncTraCIConnection(
+                self.traci_connection)
+            self.traci_connection.simulationStep()
+            return
+
         error = None
         for _ in range(RETRIES_ON_ERROR):
             try:
-                # port number the sumo instance will be run on
-                if self.sumo_params.port is not None:
-                    port = self.sumo_params.port
-                else:
-                    port = sumolib.miscutils.getFreeSocketPort()
-
-                # command used to start sumo
-                sumo_call = [self.sumo_params.sumo_binary,
-                             "-c", self.scenario.cfg,
-                             "--remote-port", str(port),
-                             "--step-length", str(self.sim_step)]
-
-                # add step logs (if requested)
-                if self.sumo_params.no_step_log:
-                    sumo_call.append("--no-step-log")
-
-                # add the lateral resolution of the sublanes (if requested)
-                if self.sumo_params.lateral_resolution is not None:
-                    sumo_call.append("--lateral-resolution")
-                    sumo_call.append(str(self.sumo_params.lateral_resolution))
-
-                # add the emission path to the sumo command (if requested)
-                if self.sumo_params.emission_path is not None:
-                    ensure_dir(self.sumo_params.emission_path)
-                    emission_out = \
-                        self.sumo_params.emission_path + \
-                        "{0}-emission.xml".format(self.scenario.name)
-                    sumo_call.append("--emission-output")
-                    sumo_call.append(emission_out)
-                else:
-                    emission_out = None
-
-                if self.sumo_params.overtake_right:
-                    sumo_call.append("--lanechange.overtake-right")
-                    sumo_call.append("true")
-
-                if self.sumo_params.ballistic:
-                    sumo_call.append("--step-method.ballistic")
-                    sumo_call.append("true")
-
-                # specify a simulation seed (if requested)
-                if self.sumo_params.seed is not None:
-                    sumo_call.append("--seed")
-                    sumo_call.append(str(self.sumo_params.seed))
-
-                if not self.sumo_params.print_warnings:
-                    sumo_call.append("--no-warnings")
-                    sumo_call.append("true")
-
-                # set the time it takes for a gridlock teleport to occur
-                sumo_call.append("--time-to-teleport")
-                sumo_call.append(str(int(self.sumo_params.teleport_time)))
-
-                logging.info(" Starting SUMO on port " + str(port))
-                logging.debug(" Cfg file: " + str(self.scenario.cfg))
-                logging.debug(" Emission file: " + str(emission_out))
-                logging.debug(" Step length: " + str(self.sim_step))
-
-                # Opening the I/O thread to SUMO
-                self.sumo_proc = subprocess.Popen(sumo_call,
-                                                  preexec_fn=os.setsid)
-
-                # wait a small period of time for the subprocess to activate
-                # before trying to connect with traci
-                if os.environ.get("TEST_FLAG", 0):
-                    time.sleep(0.1)
-                else:
-                    time.sleep(config.SUMO_SLEEP)
-
-                self.traci_connection = traci.connect(port, numRetries=100)
-
-                self.traci_connection.simulationStep()
+                sumo_call = self.get_sumo_call()
+
+                # instances started ahead of time are only used if they
+                # loaded the current version of the configuration files
+                files_key = os.stat(self.scenario.cfg).st_mtime_ns
+
+                # start sumo (or use an instance started ahead of time), and
+                # connect to it as soon as it is ready. The first simulation
+                # step of the instance is performed by the pool
+                self.sumo_proc, self.traci_connection = \
+                    self.sumo_pool.acquire(sumo_call, key=files_key,
+                                           port=self.sumo_params.port)
+                self.warm_seed = None
+
+                self.traci_batcher = TraCICommandBatcher(self.traci_connection)
+                self.subscriptions = SubscriptionManager(
+                    self.traci_connection,
+                    self.sumo_params.subscription_mode)
+                self.async_connection = AsyncTraCIConnection(
+                    self.traci_connection)
+
+                # start the sumo instance of the next rollout, if sumo is
+                # restarted upon reset, so that it loads in the background
+                if self.sumo_params.restart_instance and \
+                        self.sumo_params.warm_start:
+                    self.warm_seed = random.randint(0, 1e5)
+                    self.sumo_pool.prespawn(
+                        self.get_sumo_call(seed=self.warm_seed),
+                        key=files_key)
                 return
             except Exception as e:
                 print("Error during start: {}".format(traceback.format_exc()))
@@ -237,6 +279,80 @@ class Env(gym.Env, Serializable):
                 self.teardown_sumo()
         raise error
 
+    def get_sumo_call(self, seed=None):
+        """Returns the command used to start sumo, without the port sumo
+        listens on.
+
+        Parameters
+        ----------
+        seed : int, optional
+            seed of the sumo instance, defaults to the seed in sumo_params
+
+        Returns
+        -------
+        list<str>
+            command used to start sumo
+        """
+        if seed is None:
+            seed = self.sumo_params.seed
+
+        sumo_call = [self.sumo_params.sumo_binary,
+                     "-c", self.scenario.cfg,
+                     "--step-length", str(self.sim_step)]
+
+        # add step logs (if requested)
+        if self.sumo_params.no_step_log:
+            sumo_call.append("--no-step-log")
+
+        # add the lateral resolution of the sublanes (if requested)
+        if self.sumo_params.lateral_resolution is not None:
+            sumo_call.append("--lateral-resolution")
+            sumo_call.append(str(self.sumo_params.lateral_resolution))
+
+        # add the emission path to the sumo command (if requested)
+        if self.sumo_params.emission_path is not None:
+            ensure_dir(self.sumo_params.emission_path)
+            emission_out = \
+                self.sumo_params.emission_path + \
+                "{0}-emission.xml".format(self.scenario.name)
+            sumo_call.append("--emission-output")
+            sumo_call.append(emission_out)
+        else:
+            emission_out = None
+
+        if self.sumo_params.overtake_right:
+            sumo_call.append("--lanechange.overtake-right")
+            sumo_call.append("true")
+
+        if self.sumo_params.ballistic:
+            sumo_call.append("--step-method.ballistic")
+            sumo_call.append("true")
+
+        # specify a simulation seed (if requested)
+        if seed is not None:
+            sumo_call.append("--seed")
+            sumo_call.append(str(seed))
+
+        if not self.sumo_params.print_warnings:
+            sumo_call.append("--no-warnings")
+            sumo_call.append("true")
+
+        # set the time it takes for a gridlock teleport to occur
+        sumo_call.append("--time-to-teleport")
+        sumo_call.append(str(int(self.sumo_params.teleport_time)))
+
+        # save the states of the vehicles at full precision (see
+        # save_snapshot)
+        if self.env_params.snapshot_reset:
+            sumo_call.append("--save-state.precision")
+            sumo_call.append("17")
+
+        logging.debug(" Cfg file: " + str(self.scenario.cfg))
+        logging.debug(" Emission file: " + str(emission_out))
+        logging.debug(" Step length: " + str(self.sim_step))
+
+        return sumo_call
+
     def setup_initial_state(self):
         """Returns information on the initial state of the vehicles in the
         network, to be used upon reset.
@@ -267,22 +383,8 @@ class Env(gym.Env, Serializable):
             self.traffic_lights.add(tl_id)
 
         # subscribe the requested states for traci-related speedups
-        for veh_id in self.vehicles.get_ids():
-            self.traci_connection.vehicle.subscribe(
-                veh_id, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
-                         tc.VAR_ROAD_ID, tc.VAR_SPEED, tc.VAR_EDGES])
-            self.traci_connection.vehicle.subscribeLeader(veh_id, 2000)
-
-        # subscribe some simulation parameters needed to check for entering,
-        # exiting, and colliding vehicles
-        self.traci_connection.simulation.subscribe(
-            [tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS,
-             tc.VAR_TELEPORT_STARTING_VEHICLES_IDS])
-
-        # subscribe the traffic light
-        for node_id in self.traffic_lights.get_ids():
-            self.traci_connection.trafficlight.subscribe(
-                node_id, [tc.TL_RED_YELLOW_GREEN_STATE])
+        self.subscriptions.subscribe(self.vehicles.get_ids(),
+                                     self.traffic_lights.get_ids())
 
         for veh_id in self.vehicles.get_ids():
             # some constant vehicle parameters to the vehicles class
@@ -314,8 +416,7 @@ class Env(gym.Env, Serializable):
                  self.initial_observations[veh_id]["speed"], pos)
 
         # collect subscription information from sumo
-        vehicle_obs = self.traci_connection.vehicle.getSubscriptionResults()
-        tls_obs = self.traci_connection.trafficlight.getSubscriptionResults()
+        vehicle_obs, _, tls_obs = self.subscriptions.get_results()
         id_lists = {tc.VAR_DEPARTED_VEHICLES_IDS: [],
                     tc.VAR_TELEPORT_STARTING_VEHICLES_IDS: [],
                     tc.VAR_ARRIVED_VEHICLES_IDS: []}
@@ -357,85 +458,216 @@ class Env(gym.Env, Serializable):
         info: dict
             contains other diagnostic information from the previous action
         """
+        self.profiler.begin_step()
+
+        # collect the results of a simulation step left running by
+        # step_async, before any other command is sent to sumo
+        crash = self._finish_pending_step()
+        if crash:
+            return self._get_step_output(rl_actions, crash)
+
         for _ in range(self.env_params.sims_per_step):
-            self.time_counter += 1
-            self.step_counter += 1
-
-            # perform acceleration actions for controlled human-driven vehicles
-            if len(self.vehicles.get_controlled_ids()) > 0:
-                accel = []
-                for veh_id in self.vehicles.get_controlled_ids():
-                    accel_contr = self.vehicles.get_acc_controller(veh_id)
-                    action = accel_contr.get_action(self)
-                    accel.append(action)
-                self.apply_acceleration(self.vehicles.get_controlled_ids(),
-                                        accel)
-
-            # perform lane change actions for controlled human-driven vehicles
-            if len(self.vehicles.get_controlled_lc_ids()) > 0:
-                direction = []
+            self._apply_step_actions(rl_actions)
+
+            with self.profiler.phase("simulation_step"):
+                self.traci_connection.simulationStep()
+
+            crash = self._update_step_results()
+
+            # stop collecting new simulation steps if there is a collision
+            if crash:
+                break
+
+        return self._get_step_output(rl_actions, crash)
+
+    async def step_async(self, rl_actions, loop=None):
+        """Advances the environment by one step, as a coroutine.
+
+        This is equivalent to the step method, but control is yielded to the
+        asyncio event loop while sumo advances the simulation, so that many
+        environments may be stepped concurrently within one event loop (see
+        flow.core.async_traci).
+
+        If "pipeline_steps" is set to True in env_params and sims_per_step is
+        greater than one, the last simulation step of every environment step
+        is not waited for. Instead, the observation and reward are computed
+        from the state of the network one simulation step before the end of
+        the environment step, while sumo performs the last simulation step,
+        whose results are collected at the start of the next call to
+        step_async (or reset). A collision during this simulation step is
+        reported by the next call to step_async.
+
+        Parameters
+        ----------
+        rl_actions: numpy ndarray
+            an list of actions provided by the rl algorithm
+        loop: asyncio.AbstractEventLoop, optional
+            event loop the coroutine is run in, defaults to the current
+            event loop
+
+        Returns
+        -------
+        see the step method
+        """
+        self.profiler.begin_step()
+
+        # collect the results of a simulation step left running by the
+        # previous call
+        crash = False
+        if self.async_connection.pending:
+            await self.async_connection.wait_readable(loop)
+            crash = self._finish_pending_step()
+            if crash:
+                return self._get_step_output(rl_actions, crash)
+
+        sims_per_step = self.env_params.sims_per_step
+        pipelined = self.env_params.pipeline_steps and sims_per_step > 1
+
+        for i in range(sims_per_step):
+            self._apply_step_actions(rl_actions)
+
+            if pipelined and i == sims_per_step - 1:
+                # let sumo run while the observation and reward are computed
+                self.async_connection.begin_step()
+                break
+
+            with self.profiler.phase("simulation_step"):
+                await self.async_connection.simulation_step(loop)
+
+            crash = self._update_step_results()
+
+            # stop collecting new simulation steps if there is a collision
+            if crash:
+                break
+
+        return self._get_step_output(rl_actions, crash)
+
+    def _apply_step_actions(self, rl_actions):
+        """Sends the actions of all controlled vehicles (human-driven and rl)
+        and traffic lights to sumo, before a simulation step is performed.
+
+        Parameters
+        ----------
+        rl_actions: numpy ndarray
+            an list of actions provided by the rl algorithm
+        """
+        self.time_counter += 1
+        self.step_counter += 1
+
+        profiler = self.profiler
+
+        # perform acceleration actions for controlled human-driven vehicles
+        if len(self.vehicles.get_controlled_ids()) > 0:
+            controlled_ids = self.vehicles.get_controlled_ids()
+            with profiler.phase("controllers"):
+                accel = self.get_controlled_actions(controlled_ids)
+            with profiler.phase("traci_commands"):
+                self.apply_acceleration(controlled_ids, accel)
+
+        # perform lane change actions for controlled human-driven vehicles
+        if len(self.vehicles.get_controlled_lc_ids()) > 0:
+            direction = []
+            with profiler.phase("controllers"):
                 for veh_id in self.vehicles.get_controlled_lc_ids():
-                    lc_contr = self.vehicles.get_lane_changing_controller(
-                        veh_id)
+                    lc_contr = \
+                        self.vehicles.get_lane_changing_controller(veh_id)
                     target_lane = lc_contr.get_action(self)
                     direction.append(target_lane)
+            with profiler.phase("traci_commands"):
                 self.apply_lane_change(self.vehicles.get_controlled_lc_ids(),
                                        direction=direction)
 
-            # perform (optionally) routing actions for all vehicle in the
-            # network, including rl and sumo-controlled vehicles
-            routing_ids = []
-            routing_actions = []
+        # perform (optionally) routing actions for all vehicle in the
+        # network, including rl and sumo-controlled vehicles
+        routing_ids = []
+        routing_actions = []
+        with profiler.phase("controllers"):
             for veh_id in self.vehicles.get_ids():
                 if self.vehicles.get_routing_controller(veh_id) is not None:
                     routing_ids.append(veh_id)
                     route_contr = self.vehicles.get_routing_controller(veh_id)
                     routing_actions.append(route_contr.choose_route(self))
 
+        with profiler.phase("traci_commands"):
             self.choose_routes(routing_ids, routing_actions)
 
             self.apply_rl_actions(rl_actions)
 
             self.additional_command()
 
-            self.traci_connection.simulationStep()
+            # send all commands deferred during this step in a single message
+            self.traci_batcher.flush()
+
+    def _update_step_results(self):
+        """Collects the results of a simulation step from sumo.
 
-            # collect subscription information from sumo
-            vehicle_obs = \
-                self.traci_connection.vehicle.getSubscriptionResults()
-            id_lists = \
-                self.traci_connection.simulation.getSubscriptionResults()
-            tls_obs = \
-                self.traci_connection.trafficlight.getSubscriptionResults()
+        Returns
+        -------
+        bool
+            whether the simulator experienced a collision
+        """
+        profiler = self.profiler
 
-            # store new observations in the vehicles and traffic lights class
+        # collect subscription information from sumo
+        with profiler.phase("subscriptions"):
+            vehicle_obs, id_lists, tls_obs = self.subscriptions.get_results()
+
+        # store new observations in the vehicles and traffic lights class
+        with profiler.phase("vehicles_update"):
             self.vehicles.update(vehicle_obs, id_lists, self)
-            self.traffic_lights.update(tls_obs)
+        self.traffic_lights.update(tls_obs)
+        self.aggregates.clear()
 
-            # update the colors of vehicles
-            self.update_vehicle_colors()
+        # update the colors of vehicles
+        self.update_vehicle_colors()
 
-            # collect list of sorted vehicle ids
+        # collect list of sorted vehicle ids
+        with profiler.phase("sort_by_position"):
             self.sorted_ids, self.sorted_extra_data = self.sort_by_position()
 
-            # crash encodes whether the simulator experienced a collision
-            crash = \
-                self.traci_connection.simulation.getStartingTeleportNumber() \
-                != 0
+        # update the measurements of the detectors
+        self.detectors.update(self.vehicles)
 
-            # stop collecting new simulation steps if there is a collision
-            if crash:
-                break
+        # record the trajectories of the vehicles (if requested)
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record(self)
 
-        # collect information of the state of the network based on the
-        # environment class used
-        self.state = np.asarray(self.get_state()).T
+        # crash encodes whether the simulator experienced a collision
+        return self.traci_connection.simulation.getStartingTeleportNumber() \
+            != 0
+
+    def _finish_pending_step(self):
+        """Collects the results of a simulation step begun by step_async and
+        not yet finished (see the "pipeline_steps" env_params).
+
+        Returns
+        -------
+        bool
+            whether the simulator experienced a collision during that step
+        """
+        if self.async_connection is None or \
+                not self.async_connection.pending:
+            return False
+        self.async_connection.finish_step()
+        return self._update_step_results()
+
+    def _get_step_output(self, rl_actions, crash):
+        """Computes the observation and reward at the end of a step.
 
-        # collect observation new state associated with action
-        next_observation = list(self.state)
+        Returns
+        -------
+        see the step method
+        """
+        # collect information of the state of the network based on the
+        # environment class used, and the observation associated with it
+        with self.profiler.phase("get_state"):
+            next_observation = self._compute_observation()
 
         # compute the reward
-        reward = self.compute_reward(self.state, rl_actions, fail=crash)
+        with self.profiler.phase("compute_reward"):
+            reward = self.compute_reward(self.state, rl_actions, fail=crash)
+
+        self.profiler.end_step()
 
         return next_observation, reward, crash, {}
 
@@ -461,18 +693,47 @@ class Env(gym.Env, Serializable):
             the initial observation of the space. The initial reward is assumed
             to be zero.
         """
+        # collect the results of a simulation step left running by
+        # step_async, before any other command is sent to sumo
+        self._finish_pending_step()
+
+        # measurements of the detectors do not carry over to the next rollout
+        self.detectors.reset()
+
+        # write the profile of the steps of the previous rollout (if
+        # requested)
+        self._dump_profile()
+
+        # steps recorded from now on belong to a new rollout
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.new_rollout()
+
         # reset the time counter
         self.time_counter = 0
 
         if self.sumo_params.restart_instance or self.step_counter > 2e6:
             self.step_counter = 0
             # issue a random seed to induce randomness into the next rollout
-            self.sumo_params.seed = random.randint(0, 1e5)
+            # (the seed of the instance started ahead of time, if any)
+            if self.warm_seed is not None:
+                self.sumo_params.seed = self.warm_seed
+            else:
+                self.sumo_params.seed = random.randint(0, 1e5)
             # modify the vehicles class to match initial data
             self.vehicles = deepcopy(self.initial_vehicles)
             # restart the sumo instance
             self.restart_sumo(self.sumo_params)
 
+        # restore the state of the network at the end of the warm-up steps
+        # of the first rollout (see the "snapshot_reset" env_params), unless
+        # the scenario was rebuilt since then (e.g. with a new ring length),
+        # in which case the snapshot is taken again at the end of this reset
+        if self.snapshot is not None:
+            if self.snapshot_key == self._get_snapshot_key():
+                return self.restore_snapshot()
+            self.snapshot = None
+            self.snapshot_key = None
+
         # perform shuffling (if requested)
         if self.starting_position_shuffle or self.vehicle_arrangement_shuffle:
             if self.starting_position_shuffle:
@@ -513,7 +774,7 @@ class Env(gym.Env, Serializable):
         for veh_id in self.traci_connection.vehicle.getIDList():
             try:
                 self.traci_connection.vehicle.remove(veh_id)
-                self.traci_connection.vehicle.unsubscribe(veh_id)
+                self.subscriptions.unsubscribe_vehicle(veh_id)
                 self.vehicles.remove(veh_id)
             except Exception:
                 print("Error during start: {}".format(traceback.format_exc()))
@@ -550,13 +811,12 @@ class Env(gym.Env, Serializable):
         self.traci_connection.simulationStep()
 
         # collect subscription information from sumo
-        vehicle_obs = self.traci_connection.vehicle.getSubscriptionResults()
-        id_lists = self.traci_connection.simulation.getSubscriptionResults()
-        tls_obs = self.traci_connection.trafficlight.getSubscriptionResults()
+        vehicle_obs, id_lists, tls_obs = self.subscriptions.get_results()
 
         # store new observations in the vehicles and traffic lights class
         self.vehicles.update(vehicle_obs, id_lists, self)
         self.traffic_lights.update(tls_obs)
+        self.aggregates.clear()
 
         # update the colors of vehicles
         self.update_vehicle_colors()
@@ -574,19 +834,117 @@ class Env(gym.Env, Serializable):
         # collect list of sorted vehicle ids
         self.sorted_ids, self.sorted_extra_data = self.sort_by_position()
 
-        # collect information of the state of the network based on the
-        # environment class used
-        self.state = np.asarray(self.get_state()).T
+        # measure the initial state of the network with the detectors
+        self.detectors.update(self.vehicles)
 
-        # observation associated with the reset (no warm-up steps)
-        observation = list(self.state)
+        # collect information of the state of the network based on the
+        # environment class used, and the observation associated with the
+        # reset (no warm-up steps)
+        observation = self._compute_observation()
 
         # perform (optional) warm-up steps before training
         for _ in range(self.env_params.warmup_steps):
             observation, _, _, _ = self.step(rl_actions=[])
 
+        # store the state of the network to start the next rollouts from (if
+        # requested)
+        if self.env_params.snapshot_reset and not \
+                (self.starting_position_shuffle or
+                 self.vehicle_arrangement_shuffle) and \
+                hasattr(self.traci_connection.simulation, "saveState"):
+            self.save_snapshot(observation)
+
         return observation
 
+    def save_snapshot(self, observation):
+        """Stores the current state of the network, to be restored by the
+        next calls to reset.
+
+        The state of sumo is saved into a state file, and the states of the
+        vehicles and traffic lights classes, as well as the other variables
+        of the environment modified by the step method, are copied.
+        Environments that modify additional variables during a rollout can
+        extend this method and restore_snapshot.
+
+        Parameters
+        ----------
+        observation: list
+            observation of the environment in its current state
+        """
+        if self.snapshot_file is None:
+            fd, self.snapshot_file = tempfile.mkstemp(
+                prefix="{}-".format(self.scenario.name), suffix=".state.xml")
+            os.close(fd)
+        self.traci_connection.simulation.saveState(self.snapshot_file)
+        self.snapshot_key = self._get_snapshot_key()
+
+        self.snapshot = deepcopy({
+            "vehicles": self.vehicles,
+            "traffic_lights": self.traffic_lights,
+            "detectors": self.detectors,
+            "time_counter": self.time_counter,
+            "prev_last_lc": self.prev_last_lc,
+            "sorted_ids": self.sorted_ids,
+            "sorted_extra_data": self.sorted_extra_data,
+            "state": self.state,
+            "observation": observation,
+        })
+
+    def _get_snapshot_key(self):
+        """Identifies the network a snapshot is taken in: the scenario
+        object, and the version of its configuration files (which are
+        regenerated when a scenario is rebuilt under the same name)."""
+        try:
+            cfg_version = os.stat(self.scenario.cfg).st_mtime_ns
+        except OSError:
+            cfg_version = None
+        return self.scenario, self.scenario.cfg, cfg_version
+
+    def restore_snapshot(self):
+        """Restores the state of the network stored by save_snapshot.
+
+        The state of sumo is loaded from the state file in a single command.
+        Since sumo discards all subscriptions and the speed and lane change
+        modes of the vehicles when loading a state, these are sent to sumo
+        again.
+
+        Returns
+        -------
+        list
+            observation of the environment in the restored state
+        """
+        self.traci_connection.simulation.loadState(self.snapshot_file)
+
+        snapshot = deepcopy(self.snapshot)
+        self.vehicles = snapshot["vehicles"]
+        self.traffic_lights = snapshot["traffic_lights"]
+        self.detectors.restore(snapshot["detectors"])
+        self.time_counter = snapshot["time_counter"]
+        self.prev_last_lc = snapshot["prev_last_lc"]
+        self.sorted_ids = snapshot["sorted_ids"]
+        self.sorted_extra_data = snapshot["sorted_extra_data"]
+        self.state = snapshot["state"]
+        self.aggregates.clear()
+
+        veh_ids = self.vehicles.get_ids()
+        self.subscriptions.subscribe(veh_ids, self.traffic_lights.get_ids())
+        with self.traci_batcher.defer():
+            for veh_id in veh_ids:
+                self.traci_connection.vehicle.setSpeedMode(
+                    veh_id, self.vehicles.get_speed_mode(veh_id))
+                self.traci_connection.vehicle.setLaneChangeMode(
+                    veh_id, self.vehicles.get_lane_change_mode(veh_id))
+        self.traci_batcher.flush()
+
+        # the colors of the vehicles are reset by sumo as well
+        self.update_vehicle_colors()
+
+        if self.observation_buffer is not None:
+            self.observation_buffer[...] = snapshot["observation"]
+            self.state = self.observation_buffer
+            return self.observation_buffer
+        return snapshot["observation"]
+
     def additional_command(self):
         """Additional commands that may be performed by the step method."""
         pass
@@ -609,6 +967,40 @@ class Env(gym.Env, Serializable):
     def _apply_rl_actions(self, rl_actions):
         raise NotImplementedError
 
+    def get_controlled_actions(self, veh_ids):
+        """Computes the accelerations of flow-controlled vehicles.
+
+        The vehicles are grouped by controller class and parameters (see
+        BaseController.batch_key), and the actions of the vehicles in each
+        group are computed in a single batch (see
+        BaseController.get_action_batch).
+
+        Parameters
+        ----------
+        veh_ids: list of str
+            names of the flow-controlled vehicles
+
+        Returns
+        -------
+        list of float
+            acceleration of every vehicle, or None if the acceleration of the
+            vehicle is left to sumo
+        """
+        groups = OrderedDict()
+        for i, veh_id in enumerate(veh_ids):
+            accel_contr = self.vehicles.get_acc_controller(veh_id)
+            groups.setdefault(accel_contr.batch_key(), []).append(i)
+
+        accel = [None] * len(veh_ids)
+        for key, indices in groups.items():
+            controller_class = key[0]
+            actions = controller_class.get_action_batch(
+                self, [veh_ids[i] for i in indices])
+            for i, action in zip(indices, actions):
+                accel[i] = action
+
+        return accel
+
     def apply_acceleration(self, veh_ids, acc):
         """Applies the acceleration requested by a vehicle in sumo.
 
@@ -623,11 +1015,12 @@ class Env(gym.Env, Serializable):
         acc: numpy ndarray or list of float
             requested accelerations from the vehicles
         """
-        for i, vid in enumerate(veh_ids):
-            if acc[i] is not None:
-                this_vel = self.vehicles.get_speed(vid)
-                next_vel = max([this_vel + acc[i]*self.sim_step, 0])
-                self.traci_connection.vehicle.slowDown(vid, next_vel, 1)
+        with self.traci_batcher.defer():
+            for i, vid in enumerate(veh_ids):
+                if acc[i] is not None:
+                    this_vel = self.vehicles.get_speed(vid)
+                    next_vel = max([this_vel + acc[i]*self.sim_step, 0])
+                    self.traci_connection.vehicle.slowDown(vid, next_vel, 1)
 
     def apply_lane_change(self, veh_ids, direction):
         """Applies an instantaneous lane-change to a set of vehicles, while
@@ -652,26 +1045,27 @@ class Env(gym.Env, Serializable):
             raise ValueError(
                 "Direction values for lane changes may only be: -1, 0, or 1.")
 
-        for i, veh_id in enumerate(veh_ids):
-            # check for no lane change
-            if direction[i] == 0:
-                continue
-
-            # compute the target lane, and clip it so vehicle don't try to lane
-            # change out of range
-            this_lane = self.vehicles.get_lane(veh_id)
-            this_edge = self.vehicles.get_edge(veh_id)
-            target_lane = min(max(this_lane + direction[i], 0),
-                              self.scenario.num_lanes(this_edge) - 1)
-
-            # perform the requested lane action action in TraCI
-            if target_lane != this_lane:
-                self.traci_connection.vehicle.changeLane(
-                    veh_id, int(target_lane), 100000)
-
-                if veh_id in self.vehicles.get_rl_ids():
-                    self.prev_last_lc[veh_id] = \
-                        self.vehicles.get_state(veh_id, "last_lc")
+        with self.traci_batcher.defer():
+            for i, veh_id in enumerate(veh_ids):
+                # check for no lane change
+                if direction[i] == 0:
+                    continue
+
+                # compute the target lane, and clip it so vehicle don't try to
+                # lane change out of range
+                this_lane = self.vehicles.get_lane(veh_id)
+                this_edge = self.vehicles.get_edge(veh_id)
+                target_lane = min(max(this_lane + direction[i], 0),
+                                  self.scenario.num_lanes(this_edge) - 1)
+
+                # perform the requested lane action action in TraCI
+                if target_lane != this_lane:
+                    self.traci_connection.vehicle.changeLane(
+                        veh_id, int(target_lane), 100000)
+
+                    if veh_id in self.vehicles.get_rl_ids():
+                        self.prev_last_lc[veh_id] = \
+                            self.vehicles.get_state(veh_id, "last_lc")
 
     def choose_routes(self, veh_ids, route_choices):
         """Updates the route choice of vehicles in the network.
@@ -685,10 +1079,11 @@ class Env(gym.Env, Serializable):
             edge the vehicle is currently on. If a value of None is provided,
             the vehicle does not update its route
         """
-        for i, veh_id in enumerate(veh_ids):
-            if route_choices[i] is not None:
-                self.traci_connection.vehicle.setRoute(
-                    vehID=veh_id, edgeList=route_choices[i])
+        with self.traci_batcher.defer():
+            for i, veh_id in enumerate(veh_ids):
+                if route_choices[i] is not None:
+                    self.traci_connection.vehicle.setRoute(
+                        vehID=veh_id, edgeList=route_choices[i])
 
     def get_x_by_id(self, veh_id):
         """Provides a 1-dimensional representation of the position of a vehicle
@@ -745,19 +1140,23 @@ class Env(gym.Env, Serializable):
         if self.sumo_params.sumo_binary != "sumo-gui":
             return
 
-        for veh_id in self.vehicles.get_rl_ids():
-            # color rl vehicles red
-            self.traci_connection.vehicle.setColor(vehID=veh_id,
-                                                   color=(255, 0, 0, 255))
-
-        for veh_id in self.vehicles.get_human_ids():
-            if veh_id in self.vehicles.get_observed_ids():
-                # color observed human-driven vehicles cyan
-                color = (0, 255, 255, 255)
-            else:
-                # color unobserved human-driven vehicles white
-                color = (255, 255, 255, 255)
-            self.traci_connection.vehicle.setColor(vehID=veh_id, color=color)
+        # the color commands are sent along with the next command issued to
+        # sumo (see flow.core.traci_batching.TraCICommandBatcher)
+        with self.traci_batcher.defer():
+            for veh_id in self.vehicles.get_rl_ids():
+                # color rl vehicles red
+                self.traci_connection.vehicle.setColor(vehID=veh_id,
+                                                       color=(255, 0, 0, 255))
+
+            for veh_id in self.vehicles.get_human_ids():
+                if veh_id in self.vehicles.get_observed_ids():
+                    # color observed human-driven vehicles cyan
+                    color = (0, 255, 255, 255)
+                else:
+                    # color unobserved human-driven vehicles white
+                    color = (255, 255, 255, 255)
+                self.traci_connection.vehicle.setColor(vehID=veh_id,
+                                                       color=color)
 
         # clear the list of observed vehicles
         for veh_id in self.vehicles.get_observed_ids():
@@ -776,6 +1175,86 @@ class Env(gym.Env, Serializable):
         """
         raise NotImplementedError
 
+    def write_state(self, out):
+        """Writes the state of the simulation as perceived by the RL agent
+        into a preallocated array (see the "preallocate_observations"
+        env_params).
+
+        The default implementation copies the output of get_state.
+        Environments may override this method to fill the array in place,
+        without building intermediate lists.
+
+        Parameters
+        ----------
+        out: numpy ndarray
+            array of shape get_observation_shape() the state is written into
+        """
+        out[...] = np.reshape(np.asarray(self.get_state(), dtype=out.dtype).T,
+                              out.shape)
+
+    def get_observation_shape(self):
+        """Returns the shape of the arrays observations are written into.
+
+        This is the shape of the observation space if it is a Box, or the
+        total size of its components if it is a Tuple of Boxes, whose
+        observations are concatenated in order.
+
+        Raises
+        ------
+        ValueError
+            if the observation space is neither a Box nor a Tuple of Boxes
+        """
+        space = self.observation_space
+        if isinstance(space, gym.spaces.Box):
+            return tuple(space.shape)
+        if isinstance(space, gym.spaces.Tuple) and all(
+                isinstance(s, gym.spaces.Box) for s in space.spaces):
+            return (sum(int(np.prod(s.shape)) for s in space.spaces),)
+        raise ValueError("Observations can only be written into arrays for "
+                         "Box observation spaces, or Tuples of Boxes.")
+
+    def set_observation_buffer(self, buffer=None):
+        """Sets the array observations are written into.
+
+        The array is returned as the observation by step and reset, and is
+        overwritten at every step. This may be used to write the observations
+        of several environments directly into a shared array (e.g. the rows
+        of a numpy array, or an array in shared memory).
+
+        Parameters
+        ----------
+        buffer: numpy ndarray, optional
+            array of shape get_observation_shape(). Defaults to a new float32
+            array
+
+        Raises
+        ------
+        ValueError
+            if the array does not have the shape of the observations
+        """
+        shape = self.get_observation_shape()
+        if buffer is None:
+            buffer = np.zeros(shape, dtype=np.float32)
+        elif buffer.shape != shape:
+            raise ValueError("Expected an observation buffer of shape {}, got "
+                             "{}.".format(shape, buffer.shape))
+        self.observation_buffer = buffer
+
+    def _compute_observation(self):
+        """Computes the state of the network, and returns the observation
+        associated with it (the observation buffer, if any, or a list)."""
+        if self.observation_buffer is None and \
+                self.env_params.preallocate_observations:
+            self.set_observation_buffer()
+
+        if self.observation_buffer is not None:
+            self.write_state(self.observation_buffer)
+            self.state = self.observation_buffer
+            return self.observation_buffer
+
+        self.state = np.asarray(self.get_state()).T
+        return list(self.state)
+
     @property
     def action_space(self):
         """Identifies the dimensions and bounds of the action space (needed for
@@ -836,7 +1315,44 @@ class Env(gym.Env, Serializable):
         self._close()
 
     def _close(self):
+        if self.async_connection is not None and \
+                self.async_connection.pending:
+            self.async_connection.finish_step()
         self.traci_connection.close()
+        self.sumo_pool.close()
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.close()
+        self._dump_profile()
+        if self.snapshot_file is not None and \
+                os.path.exists(self.snapshot_file):
+            os.remove(self.snapshot_file)
+
+    def get_profile(self):
+        """Returns the time spent in the phases of the steps of the current
+        rollout (see flow.core.profiling.StepProfiler.get_profile).
+
+        This requires the "profile" or "profile_path" sumo_params to be set.
+        """
+        return self.profiler.get_profile()
+
+    def _get_num_round_trips(self):
+        """Number of round-trips with sumo performed so far through the
+        current TraCI connection."""
+        if self.traci_batcher is None:
+            return 0
+        return self.traci_batcher.num_round_trips
+
+    def _dump_profile(self):
+        """Writes the profile of the steps performed since the last reset to
+        profile_path (if requested), and removes the measurements."""
+        path = self.sumo_params.profile_path
+        if path is not None and self.profiler.num_steps > 0:
+            ensure_dir(path)
+            self.profiler.dump(os.path.join(
+                path, "{0}-profile-{1}.json".format(self.scenario.name,
+                                                    self.num_profiles)))
+            self.num_profiles += 1
+        self.profiler.reset()
 
     def teardown_sumo(self):
         try:
@@ -4,7 +4,6 @@ from flow.controllers.routing_controllers import ContinuousRouter
 from flow.core.params import InFlows, NetParams
 from flow.core.vehicles import Vehicles
 
-from collections import defaultdict
 from copy import deepcopy
 
 import numpy as np
@@ -73,8 +72,15 @@ ADDITIONAL_NET_PARAMS = {
     "scaling": 1  # the factor multiplying number of lanes.
 }
 
-START_RECORD_TIME = 0.0
-PERIOD = 10.0
+# edges of the bottleneck, and edge following it
+BOTTLENECK_EDGES = ["3", "4"]
+EDGE_AFTER_BOTTLENECK = "5"
+BOTTLENECK_LENGTH = 280
+
+# edge whose number of vehicles is fed back to the ramp meter, and number of
+# steps this number is averaged over
+EDGE_RAMP_METER_DETECTOR = "4"
+RAMP_METER_WINDOW = 10
 
 
 class BottleneckEnv(Env):
@@ -103,7 +109,6 @@ class BottleneckEnv(Env):
         env_add_params = self.env_params.additional_params
         # tells how scaled the number of lanes are
         self.scaling = scenario.net_params.additional_params.get("scaling")
-        self.edge_dict = defaultdict(list)
         self.cars_waiting_for_toll = dict()
         self.cars_before_ramp = dict()
         self.toll_wait_time = np.abs(
@@ -118,9 +123,6 @@ class BottleneckEnv(Env):
             env_params.get_additional_param("disable_ramp_metering")
         self.rl_id_list = deepcopy(self.vehicles.get_rl_ids())
 
-        self.next_period = START_RECORD_TIME / self.sim_step
-        self.cars_arrived = 0
-
         # values for the ramp meter
         self.n_crit = env_add_params.get("n_crit", 8)
         self.q_max = env_add_params.get("q_max", 1100)
@@ -137,50 +139,28 @@ class BottleneckEnv(Env):
         self.red_min = 2
         self.feedback_coeff = env_add_params.get("feedback_coeff", 20)
 
-        self.smoothed_num = np.zeros(10)  # averaged number of vehs in '4'
-        self.outflow_index = 0
+        # averaged number of vehs in '4', used by the ramp meter
+        self.detectors.add("ramp_meter", edges=EDGE_RAMP_METER_DETECTOR,
+                           window=RAMP_METER_WINDOW * self.sim_step)
+
+        # number of vehs in every lane of the bottleneck, and their speed
+        for edge in BOTTLENECK_EDGES:
+            for lane in range(self.scenario.num_lanes(edge)):
+                self.detectors.add("{}_{}".format(edge, lane), edges=edge,
+                                   lanes=[lane])
+        self.detectors.add("bottleneck", edges=BOTTLENECK_EDGES)
+        self.detectors.add("bottleneck_outflow",
+                           edges=BOTTLENECK_EDGES + [EDGE_AFTER_BOTTLENECK])
 
     def additional_command(self):
         # print(self.vehicles.get_outflow_rate(100))
         super().additional_command()
-        # build a list of vehicles and their edges and positions
-        self.edge_dict = defaultdict(list)
-        # update the dict with all the edges in edge_list
-        # so we can look forward for edges
-        self.edge_dict.update(
-            (k, [[] for _ in range(MAX_LANES * self.scaling)])
-            for k in EDGE_LIST)
-        for veh_id in self.vehicles.get_ids():
-            try:
-                edge = self.vehicles.get_edge(veh_id)
-                if edge not in self.edge_dict:
-                    self.edge_dict.update(
-                        {edge: [[] for _ in range(MAX_LANES * self.scaling)]})
-                lane = self.vehicles.get_lane(veh_id)  # integer
-                pos = self.vehicles.get_position(veh_id)
-                self.edge_dict[edge][lane].append((veh_id, pos))
-            except:
-                pass
         if not self.disable_tb:
             self.apply_toll_bridge_control()
         if not self.disable_ramp_metering:
             self.ramp_meter_lane_change_control()
             self.alinea()
 
-        # compute the outflow
-        veh_ids = self.vehicles.get_ids_by_edge('4')
-        self.smoothed_num[self.outflow_index] = len(veh_ids)
-        self.outflow_index = \
-            (self.outflow_index + 1) % self.smoothed_num.shape[0]
-
-        if self.time_counter > self.next_period:
-            self.density = self.cars_arrived  # / (PERIOD/self.sim_step)
-            # print(self.density)
-            self.next_period += PERIOD / self.sim_step
-            self.cars_arrived = 0
-
-        self.cars_arrived += self.vehicles.get_num_arrived()
-
     def ramp_meter_lane_change_control(self):
         cars_that_have_left = []
         for veh_id in self.cars_before_ramp:
@@ -198,10 +178,11 @@ class BottleneckEnv(Env):
             self.cars_before_ramp.__delitem__(veh_id)
 
         for lane in range(NUM_RAMP_METERS * self.scaling):
-            cars_in_lane = self.edge_dict[EDGE_BEFORE_RAMP_METER][lane]
+            cars_in_lane = self.vehicles.get_ids_by_lane(
+                EDGE_BEFORE_RAMP_METER, lane)
 
-            for car in cars_in_lane:
-                veh_id, pos = car
+            for veh_id in cars_in_lane:
+                pos = self.vehicles.get_position(veh_id)
                 if pos > RAMP_METER_AREA:
                     if veh_id not in self.cars_waiting_for_toll:
                         traci_veh = self.traci_connection.vehicle
@@ -225,8 +206,8 @@ class BottleneckEnv(Env):
             self.feedback_timer = 0
             # now implement the integral controller update
             # find all the vehicles in an edge
-            q_update = self.feedback_coeff * (self.n_crit -
-                                              np.average(self.smoothed_num))
+            q_update = self.feedback_coeff * (
+                self.n_crit - self.detectors["ramp_meter"].num_vehicles())
             self.q = np.clip(self.q + q_update,
                              a_min=self.q_min, a_max=self.q_max)
             # convert q to cycle time
@@ -270,10 +251,11 @@ class BottleneckEnv(Env):
         traffic_light_states = ["G"] * NUM_TOLL_LANES * self.scaling
 
         for lane in range(NUM_TOLL_LANES * self.scaling):
-            cars_in_lane = self.edge_dict[EDGE_BEFORE_TOLL][lane]
+            cars_in_lane = self.vehicles.get_ids_by_lane(EDGE_BEFORE_TOLL,
+                                                         lane)
 
-            for car in cars_in_lane:
-                veh_id, pos = car
+            for veh_id in cars_in_lane:
+                pos = self.vehicles.get_position(veh_id)
                 if pos > TOLL_BOOTH_AREA:
                     if veh_id not in self.cars_waiting_for_toll:
                         # Disable lane changes inside Toll Area
@@ -319,20 +301,17 @@ class BottleneckEnv(Env):
         return self.vehicles.get_outflow_rate(sample_period)
 
     def get_bottleneck_density(self, lanes=None):
-        BOTTLE_NECK_LEN = 280
-        bottleneck_ids = self.vehicles.get_ids_by_edge(['3', '4'])
+        """Returns the number of vehicles per meter in the bottleneck, or in
+        a subset of its lanes (formatted as "<edge>_<lane>")."""
         if lanes:
-            veh_ids = [veh_id for veh_id in bottleneck_ids
-                       if str(self.vehicles.get_edge(veh_id)) + "_" +
-                       str(self.vehicles.get_lane(veh_id)) in lanes]
+            num_vehicles = sum(self.detectors[lane].num_vehicles()
+                               for lane in lanes if lane in self.detectors)
         else:
-            veh_ids = self.vehicles.get_ids_by_edge(['3', '4'])
-        return len(veh_ids) / BOTTLE_NECK_LEN
+            num_vehicles = self.detectors["bottleneck"].num_vehicles()
+        return num_vehicles / BOTTLENECK_LENGTH
 
     def get_avg_bottleneck_velocity(self):
-        veh_ids = self.vehicles.get_ids_by_edge(['3', '4', '5'])
-        return sum(self.vehicles.get_speed(veh_ids)) / len(veh_ids) \
-            if len(veh_ids) != 0 else 0
+        return self.detectors["bottleneck_outflow"].mean_speed()
 
     # Dummy action and observation spaces
     @property
@@ -390,6 +369,10 @@ class BottleNeckAccelEnv(BottleneckEnv):
         super().__init__(env_params, sumo_params, scenario)
         self.add_rl_if_exit = env_params.get_additional_param("add_rl_if_exit")
 
+        # average speed and density of every edge, used in the observations
+        for edge in self.scenario.get_edge_list():
+            self.detectors.add("edge_" + edge, edges=edge)
+
     @property
     def observation_space(self):
         num_edges = len(self.scenario.get_edge_list())
@@ -502,12 +485,10 @@ class BottleNeckAccelEnv(BottleneckEnv):
         # per edge data (average speed, density
         edge_obs = []
         for edge in self.scenario.get_edge_list():
-            veh_ids = self.vehicles.get_ids_by_edge(edge)
-            if len(veh_ids) > 0:
-                avg_speed = (sum(self.vehicles.get_speed(veh_ids))
-                             / len(veh_ids)) / self.max_speed
-                density = len(veh_ids) / self.scenario.edge_length(edge)
-                edge_obs += [avg_speed, density]
+            detector = self.detectors["edge_" + edge]
+            if detector.num_vehicles() > 0:
+                edge_obs += [detector.mean_speed() / self.max_speed,
+                             detector.density()]
             else:
                 edge_obs += [0, 0]
 
@@ -706,64 +687,58 @@ class DesiredVelocityEnv(BottleneckEnv):
                    dtype=np.float32)
 
     def get_state(self):
+        state = np.zeros(self.observation_space.shape)
+        self.write_state(state)
+        return state
+
+    def write_state(self, out):
         # action space is number of vehicles in each segment in each lane,
         # number of rl vehicles in each segment in each lane
         # mean speed in each segment, and mean rl speed in each
         # segment in each lane
-        num_vehicles_list = []
-        num_rl_vehicles_list = []
-        vehicle_speeds_list = []
-        rl_speeds_list = []
         NUM_VEHICLE_NORM = 20
+        n = (out.shape[0] - 1) // 4
+        num_vehicles = out[:n]
+        num_rl_vehicles = out[n:2 * n]
+        vehicle_speeds = out[2 * n:3 * n]
+        rl_vehicle_speeds = out[3 * n:4 * n]
+        out[:] = 0
+
+        rl_ids = set(self.vehicles.get_rl_ids())
+        offset = 0
         for i, edge in enumerate(EDGE_LIST):
             num_lanes = self.scenario.num_lanes(edge)
-            num_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            num_rl_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
-            rl_vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
+            num_segments = self.num_obs_segments[i]
             ids = self.vehicles.get_ids_by_edge(edge)
-            lane_list = self.vehicles.get_lane(ids)
-            pos_list = self.vehicles.get_position(ids)
-            for i, id in enumerate(ids):
-                segment = np.searchsorted(self.obs_slices[edge],
-                                          pos_list[i]) - 1
-                if id in self.vehicles.get_rl_ids():
-                    rl_vehicle_speeds[segment, lane_list[i]] \
-                        += self.vehicles.get_speed(id)
-                    num_rl_vehicles[segment, lane_list[i]] += 1
-                else:
-                    vehicle_speeds[segment, lane_list[i]] \
-                        += self.vehicles.get_speed(id)
-                    num_vehicles[segment, lane_list[i]] += 1
-
-            # normalize
-
-            num_vehicles /= NUM_VEHICLE_NORM
-            num_rl_vehicles /= NUM_VEHICLE_NORM
-            num_vehicles_list += num_vehicles.flatten().tolist()
-            num_rl_vehicles_list += num_rl_vehicles.flatten().tolist()
-            vehicle_speeds_list += vehicle_speeds.flatten().tolist()
-            rl_speeds_list += rl_vehicle_speeds.flatten().tolist()
-
-        unnorm_veh_list = np.asarray(num_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        unnorm_rl_list = np.asarray(num_rl_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        # compute the mean speed if the speed isn't zero
-        num_rl = len(num_rl_vehicles_list)
-        num_veh = len(num_vehicles_list)
-        mean_speed = np.nan_to_num([vehicle_speeds_list[i] / unnorm_veh_list[i]
-                                    if int(unnorm_veh_list[i]) else 0
-                                    for i in range(num_veh)])
-        mean_speed_norm = mean_speed / 50
-        mean_rl_speed = np.nan_to_num([rl_speeds_list[i] / unnorm_rl_list[i]
-                                       if int(unnorm_rl_list[i]) else 0
-                                       for i in range(num_rl)
-                                       ]) / 50
-        outflow = np.asarray(self.vehicles.get_outflow_rate(20 * self.sim_step)
-                             / 2000.0)
-        return np.concatenate((num_vehicles_list, num_rl_vehicles_list,
-                               mean_speed_norm, mean_rl_speed, [outflow]))
+            if ids:
+                # index of the segment and lane of every vehicle, vehicles
+                # before the first slice being counted in the last segment
+                segments = (np.searchsorted(self.obs_slices[edge],
+                                            self.vehicles.get_position(ids))
+                            - 1) % num_segments
+                index = offset + segments * num_lanes + \
+                    np.asarray(self.vehicles.get_lane(ids))
+                speeds = np.asarray(self.vehicles.get_speed(ids))
+                is_rl = np.array([veh_id in rl_ids for veh_id in ids])
+
+                np.add.at(rl_vehicle_speeds, index[is_rl], speeds[is_rl])
+                np.add.at(num_rl_vehicles, index[is_rl], 1)
+                np.add.at(vehicle_speeds, index[~is_rl], speeds[~is_rl])
+                np.add.at(num_vehicles, index[~is_rl], 1)
+            offset += num_segments * num_lanes
+
+        # compute the mean speed if the speed isn't zero, and normalize
+        np.divide(vehicle_speeds, num_vehicles, out=vehicle_speeds,
+                  where=num_vehicles > 0)
+        np.divide(rl_vehicle_speeds, num_rl_vehicles, out=rl_vehicle_speeds,
+                  where=num_rl_vehicles > 0)
+        vehicle_speeds /= 50
+        rl_vehicle_speeds /= 50
+        num_vehicles /= NUM_VEHICLE_NORM
+        num_rl_vehicles /= NUM_VEHICLE_NORM
+
+        out[4 * n] = self.vehicles.get_outflow_rate(20 * self.sim_step) \
+            / 2000.0
 
     def _apply_rl_actions(self, actions):
         """
@@ -92,7 +92,7 @@ class GreenWaveEnv(Env):
         edge_num = Box(low=0., high=1, shape=(self.vehicles.num_vehicles,),
                        dtype=np.float32)
         traffic_lights = Box(low=0., high=np.inf,
-                             shape=(3 * self.rows * self.cols),
+                             shape=(3 * self.rows * self.cols,),
                              dtype=np.float32)
         return Tuple((speed, dist_to_intersec, edge_num, traffic_lights))
 
@@ -116,6 +116,31 @@ class GreenWaveEnv(Env):
                  self.last_change.flatten().tolist()]
         return np.array(state)
 
+    def write_state(self, out):
+        # compute the normalizers
+        max_speed = max(self.scenario.speed_limit(edge)
+                        for edge in self.scenario.get_edge_list())
+        max_dist = max(self.scenario.short_length,
+                       self.scenario.long_length,
+                       self.scenario.inner_length)
+
+        # the speeds, distances to the intersection and edges of the
+        # vehicles are followed by the states of the traffic lights. Entries
+        # of vehicles that left the network are set to zero.
+        num_vehicles = (out.shape[0] - self.last_change.size) // 3
+        ids = self.vehicles.get_ids()[:num_vehicles]
+        num_ids = len(ids)
+
+        out[:] = 0
+        out[:num_ids] = np.divide(self.vehicles.get_speed(ids), max_speed)
+        for i, veh_id in enumerate(ids):
+            out[num_vehicles + i] = \
+                self.get_distance_to_intersection(veh_id) / max_dist
+            out[2 * num_vehicles + i] = \
+                self._convert_edge(self.vehicles.get_edge(veh_id)) / (
+                    self.scenario.num_edges - 1)
+        out[3 * num_vehicles:] = self.last_change.ravel()
+
     def _apply_rl_actions(self, rl_actions):
         # convert values less than 0.5 to zero and above to 1. 0's indicate
         # that should not switch the direction
@@ -232,6 +232,49 @@ class LaneChangeAccelPOEnv(LaneChangeAccelEnv):
 
             return np.array(obs)
 
+    def write_state(self, out):
+        # normalizers
+        max_speed = 30
+        num_lanes = self.num_lanes
+        rl_ids = self.vehicles.get_rl_ids()
+
+        out[:] = 0
+        self.visible = []
+        for i, rl_id in enumerate(rl_ids):
+            # headways, tailways, and speeds of the lane leaders and followers
+            # of the rl vehicle, set to 1000 since the absence of a vehicle
+            # implies a large headway
+            obs = out[4 * num_lanes * i:4 * num_lanes * (i + 1)]
+            headway = obs[:num_lanes]
+            tailway = obs[num_lanes:2 * num_lanes]
+            vel_in_front = obs[2 * num_lanes:3 * num_lanes]
+            vel_behind = obs[3 * num_lanes:]
+            headway[:] = 1000
+            tailway[:] = 1000
+
+            lane_leaders = self.vehicles.get_lane_leaders(rl_id)
+            lane_followers = self.vehicles.get_lane_followers(rl_id)
+            lane_headways = self.vehicles.get_lane_headways(rl_id)
+            lane_tailways = self.vehicles.get_lane_tailways(rl_id)
+            headway[:len(lane_headways)] = lane_headways
+            tailway[:len(lane_tailways)] = lane_tailways
+
+            for j, lane_leader in enumerate(lane_leaders):
+                if lane_leader != '':
+                    vel_in_front[j] = self.vehicles.get_speed(lane_leader) \
+                        / max_speed
+            for j, lane_follower in enumerate(lane_followers):
+                if lane_follower != '':
+                    vel_behind[j] = self.vehicles.get_speed(lane_follower) \
+                        / max_speed
+
+            self.visible.extend(lane_leaders)
+            self.visible.extend(lane_followers)
+
+            # add the speed for the ego rl vehicle
+            out[4 * num_lanes * len(rl_ids) + i] = \
+                self.vehicles.get_speed(rl_id)
+
     def additional_command(self):
         # specify observed vehicles
         for veh_id in self.visible:
@@ -6,7 +6,6 @@ from gym.spaces.tuple_space import Tuple
 
 import random
 import numpy as np
-from scipy.optimize import fsolve
 
 ADDITIONAL_ENV_PARAMS = {
     # maximum acceleration of autonomous vehicles
@@ -147,6 +146,9 @@ class WaveAttenuationEnv(Env):
 
             return error
 
+        # scipy is slow to import, and only needed here
+        from scipy.optimize import fsolve
+
         v_guess = 4.
         v_eq_max = fsolve(v_eq_max_function, v_guess)[0]
 
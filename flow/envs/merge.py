@@ -104,6 +104,11 @@ class WaveAttenuationMergePOEnv(Env):
             self.apply_acceleration([rl_id], [rl_actions[i]])
 
     def get_state(self, rl_id=None, **kwargs):
+        observation = np.zeros(5 * self.num_rl)
+        self.write_state(observation)
+        return observation
+
+    def write_state(self, out):
         self.leader = []
         self.follower = []
 
@@ -111,7 +116,7 @@ class WaveAttenuationMergePOEnv(Env):
         max_speed = 20
         max_length = 50
 
-        observation = [0 for _ in range(5 * self.num_rl)]
+        out[:] = 0
         for i, rl_id in enumerate(self.rl_veh):
             this_speed = self.vehicles.get_speed(rl_id)
             lead_id = self.vehicles.get_leader(rl_id)
@@ -136,13 +141,11 @@ class WaveAttenuationMergePOEnv(Env):
                 follow_speed = self.vehicles.get_speed(follower)
                 follow_head = self.vehicles.get_headway(follower)
 
-            observation[5 * i + 0] = this_speed / max_speed
-            observation[5 * i + 1] = (lead_speed - this_speed) / max_speed
-            observation[5 * i + 2] = lead_head / max_length
-            observation[5 * i + 3] = (this_speed - follow_speed) / max_speed
-            observation[5 * i + 4] = follow_head / max_length
-
-        return observation
+            out[5 * i + 0] = this_speed / max_speed
+            out[5 * i + 1] = (lead_speed - this_speed) / max_speed
+            out[5 * i + 2] = lead_head / max_length
+            out[5 * i + 3] = (this_speed - follow_speed) / max_speed
+            out[5 * i + 4] = follow_head / max_length
 
     def compute_reward(self, state, rl_actions, **kwargs):
         # return a reward of 0 if a collision occurred
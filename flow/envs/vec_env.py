@@ -0,0 +1,206 @@
+"""Vectorized environment stepping several flow environments in parallel.
+
+Each environment owns its own sumo process, connected to through its own
+port. Most of the time spent in a call to step is spent waiting for sumo to
+advance the simulation, during which the python process is idle. The VecEnv
+steps all of its environments in separate threads, so that their sumo
+instances advance concurrently (the GIL is released while waiting on the
+TraCI sockets), and returns the observations, rewards and dones of all
+environments as stacked numpy arrays.
+
+Alternatively, the environments may be stepped within a single thread,
+through an asyncio event loop interleaving the waits of the environments on
+their sumo instances (see Env.step_async).
+
+If all environments preallocate their observations (see the
+"preallocate_observations" env_params), they write their observations
+directly into the rows of a single array, which is returned by step and
+reset without stacking the observations.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class VecEnv:
+
+    def __init__(self, env_fns, num_threads=None, asynchronous=False):
+        """Instantiates a vectorized environment.
+
+        Parameters
+        ----------
+        env_fns : list<callable or flow.envs.Env>
+            environments to be stepped in parallel, or functions with no
+            arguments returning these environments. Each environment starts
+            its own sumo instance. Environments are created sequentially,
+            since environments of the same scenario share their
+            configuration files.
+        num_threads : int, optional
+            number of threads used to step the environments, defaults to the
+            number of environments
+        asynchronous : bool, optional
+            specifies whether the environments are stepped through an asyncio
+            event loop (using Env.step_async) rather than in separate threads
+
+        Attributes
+        ----------
+        envs : list<flow.envs.Env>
+            environments stepped by this vectorized environment
+        num_envs : int
+            number of environments
+        """
+        if len(env_fns) == 0:
+            raise ValueError("VecEnv requires at least one environment.")
+
+        self.num_envs = len(env_fns)
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_threads or self.num_envs)
+
+        self.envs = [fn() if callable(fn) else fn for fn in env_fns]
+
+        self.asynchronous = asynchronous
+        self._loop = asyncio.new_event_loop() if asynchronous else None
+
+        # the observations of the environments are stacked along a new first
+        # axis, so they must all lie in the same space
+        self.action_space = self.envs[0].action_space
+        self.observation_space = self.envs[0].observation_space
+
+        # array the environments write their observations into, if they all
+        # preallocate their observations
+        self.observations = None
+        if all(env.env_params.preallocate_observations for env in self.envs):
+            self.observations = np.zeros(
+                (self.num_envs,) + self.envs[0].get_observation_shape(),
+                dtype=np.float32)
+            for env, buffer in zip(self.envs, self.observations):
+                env.set_observation_buffer(buffer)
+
+        self.closed = False
+
+    def reset(self):
+        """Resets all environments.
+
+        Returns
+        -------
+        numpy ndarray
+            initial observations of the environments, stacked along the first
+            axis
+        """
+        obs = self._map(lambda env: env.reset(), self.envs)
+        return self._stack(obs)
+
+    def step(self, actions):
+        """Advances all environments by one step.
+
+        Environments that are done at the end of the step are reset. In this
+        case, the returned observation is the initial observation of the next
+        rollout, and the last observation of the rollout is stored under
+        "terminal_observation" in the info dict of the environment.
+
+        An environment is done if it experienced a collision, or if it
+        reached the horizon specified in its env_params.
+
+        Parameters
+        ----------
+        actions : list or numpy ndarray
+            actions of each environment, indexed by the position of the
+            environment in envs
+
+        Returns
+        -------
+        observations : numpy ndarray
+            observations of the environments, stacked along the first axis
+        rewards : numpy ndarray
+            rewards of the environments
+        dones : numpy ndarray
+            whether each environment has ended its rollout
+        infos : list<dict>
+            diagnostic information of each environment
+        """
+        if len(actions) != self.num_envs:
+            raise ValueError("Expected {} actions, got {}."
+                             .format(self.num_envs, len(actions)))
+
+        if self.asynchronous:
+            results = self._loop.run_until_complete(
+                self._step_all_async(actions))
+        else:
+            results = self._map(lambda args: self._step_env(*args),
+                                zip(self.envs, actions))
+        obs, rewards, dones, infos = zip(*results)
+
+        return self._stack(obs), \
+            np.array(rewards, dtype=float), \
+            np.array(dones, dtype=bool), \
+            list(infos)
+
+    def close(self):
+        """Terminates the sumo instances of all environments."""
+        if self.closed:
+            return
+        self._map(lambda env: env.terminate(), self.envs)
+        self._executor.shutdown()
+        if self._loop is not None:
+            self._loop.close()
+        self.closed = True
+
+    @staticmethod
+    def _step_env(env, action):
+        """Steps a single environment, and resets it if it is done."""
+        obs, reward, done, info = env.step(action)
+        done = bool(done) or env.time_counter >= env.env_params.horizon
+
+        if done:
+            info = dict(info)
+            # the observation buffer of the environment is overwritten by
+            # the reset
+            info["terminal_observation"] = \
+                obs.copy() if obs is env.observation_buffer else obs
+            obs = env.reset()
+
+        return obs, reward, done, info
+
+    async def _step_all_async(self, actions):
+        """Steps all environments concurrently within the event loop."""
+        return await asyncio.gather(
+            *[self._step_env_async(env, action, self._loop)
+              for env, action in zip(self.envs, actions)])
+
+    @staticmethod
+    async def _step_env_async(env, action, loop):
+        """Steps a single environment as a coroutine, and resets it if it is
+        done."""
+        obs, reward, done, info = await env.step_async(action, loop)
+        done = bool(done) or env.time_counter >= env.env_params.horizon
+
+        if done:
+            info = dict(info)
+            # the observation buffer of the environment is overwritten by
+            # the reset
+            info["terminal_observation"] = \
+                obs.copy() if obs is env.observation_buffer else obs
+            obs = env.reset()
+
+        return obs, reward, done, info
+
+    def _stack(self, obs):
+        """Stacks the observations of the environments along a new first
+        axis. If the environments wrote their observations into the rows of
+        the observations array, this array is returned (and is overwritten
+        by the next call to step or reset)."""
+        if self.observations is not None:
+            return self.observations
+        return np.stack([np.asarray(ob) for ob in obs])
+
+    def _map(self, fn, iterable):
+        """Applies fn to every element of iterable in the thread pool, and
+        returns the results in order.
+
+        Exceptions raised in any of the threads are raised again here."""
+        return list(self._executor.map(fn, iterable))
+
+    def __len__(self):
+        return self.num_envs
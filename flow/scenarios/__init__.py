@@ -1,25 +1,9 @@
-# base scenario class
-from flow.scenarios.base_scenario import Scenario
-
-# custom generators
-from flow.scenarios.bottleneck.gen import BottleneckGenerator
-from flow.scenarios.figure8.gen import Figure8Generator
-from flow.scenarios.grid.gen import SimpleGridGenerator
-from flow.scenarios.highway.gen import HighwayGenerator
-from flow.scenarios.loop.gen import CircleGenerator
-from flow.scenarios.merge.gen import MergeGenerator
-from flow.scenarios.netfile.gen import NetFileGenerator
-from flow.scenarios.loop_merge.gen import TwoLoopOneMergingGenerator
+"""Scenarios and generators of flow.
 
-# custom scenarios
-from flow.scenarios.bottleneck.scenario import BottleneckScenario
-from flow.scenarios.figure8.figure8_scenario import Figure8Scenario
-from flow.scenarios.grid.grid_scenario import SimpleGridScenario
-from flow.scenarios.highway.scenario import HighwayScenario
-from flow.scenarios.loop.loop_scenario import LoopScenario
-from flow.scenarios.merge.scenario import MergeScenario
-from flow.scenarios.netfile.scenario import NetFileScenario
-from flow.scenarios.loop_merge.scenario import TwoLoopsOneMergingScenario
+The classes are imported from their modules the first time they are accessed
+(see flow.core.lazy_import).
+"""
+from flow.core.lazy_import import lazy_attributes
 
 # base scenario class
 __all__ = ["Scenario"]
@@ -33,3 +17,28 @@ __all__ += ["BottleneckGenerator", "Figure8Generator", "SimpleGridGenerator",
 __all__ += ["BottleneckScenario", "Figure8Scenario", "SimpleGridScenario",
             "HighwayScenario", "LoopScenario", "MergeScenario",
             "NetFileScenario", "TwoLoopsOneMergingScenario"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, globals(), {
+    # base scenario class
+    "Scenario": "flow.scenarios.base_scenario",
+
+    # custom generators
+    "BottleneckGenerator": "flow.scenarios.bottleneck.gen",
+    "Figure8Generator": "flow.scenarios.figure8.gen",
+    "SimpleGridGenerator": "flow.scenarios.grid.gen",
+    "HighwayGenerator": "flow.scenarios.highway.gen",
+    "CircleGenerator": "flow.scenarios.loop.gen",
+    "MergeGenerator": "flow.scenarios.merge.gen",
+    "NetFileGenerator": "flow.scenarios.netfile.gen",
+    "TwoLoopOneMergingGenerator": "flow.scenarios.loop_merge.gen",
+
+    # custom scenarios
+    "BottleneckScenario": "flow.scenarios.bottleneck.scenario",
+    "Figure8Scenario": "flow.scenarios.figure8.figure8_scenario",
+    "SimpleGridScenario": "flow.scenarios.grid.grid_scenario",
+    "HighwayScenario": "flow.scenarios.highway.scenario",
+    "LoopScenario": "flow.scenarios.loop.loop_scenario",
+    "MergeScenario": "flow.scenarios.merge.scenario",
+    "NetFileScenario": "flow.scenarios.netfile.scenario",
+    "TwoLoopsOneMergingScenario": "flow.scenarios.loop_merge.scenario",
+})
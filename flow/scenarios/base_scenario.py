@@ -1,3 +1,4 @@
+import bisect
 import logging
 import random
 import numpy as np
@@ -67,6 +68,10 @@ class Scenario(Serializable):
         self._edges, self._connections = self.generator.generate_net(
             self.net_params, self.traffic_lights)
 
+        # compiled representation of the network, if provided by the
+        # generator (see flow.core.compiled_net)
+        self.compiled_net = self.generator.compiled_net
+
         # list of edges and internal links (junctions)
         self._edge_list = [edge_id for edge_id in self._edges.keys()
                            if edge_id[0] != ":"]
@@ -102,6 +107,14 @@ class Scenario(Serializable):
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
 
+        # position index of the network, used by get_edge and get_x: the
+        # sorted starting positions of the edges, and the offset of every edge
+        # looked up so far (see _get_x_offset)
+        self._edgestart_edges = [edge for edge, _ in self.total_edgestarts]
+        self._edgestart_pos = [pos for _, pos in self.total_edgestarts]
+        self._edgestart_array = np.array(self._edgestart_pos, dtype=float)
+        self._x_offsets = {}
+
         # length of the network, or the portion of the network in
         # which cars are meant to be distributed
         # (may be overridden by subclass __init__())
@@ -181,9 +194,33 @@ class Scenario(Serializable):
             1st element: edge name (such as bottom, right, etc.)
             2nd element: relative position on edge
         """
-        for (edge, start_pos) in reversed(self.total_edgestarts):
-            if x >= start_pos:
-                return edge, x - start_pos
+        i = bisect.bisect_right(self._edgestart_pos, x) - 1
+        if i >= 0:
+            return self._edgestart_edges[i], x - self._edgestart_pos[i]
+
+    def get_edge_batch(self, xs):
+        """Vectorized version of get_edge.
+
+        Parameters
+        ----------
+        xs: array_like
+            absolute positions in the network
+
+        Returns
+        -------
+        edges: list<str>
+            names of the edges (None for positions before the first edge)
+        positions: numpy ndarray
+            relative positions on the edges (nan for positions before the
+            first edge)
+        """
+        xs = np.asarray(xs, dtype=float)
+        indices = np.searchsorted(self._edgestart_array, xs, side="right") - 1
+        edges = [self._edgestart_edges[i] if i >= 0 else None
+                 for i in indices]
+        positions = np.where(indices >= 0,
+                             xs - self._edgestart_array[indices], np.nan)
+        return edges, positions
 
     def get_x(self, edge, position):
         """Given an edge name and relative position, return the absolute
@@ -206,16 +243,72 @@ class Scenario(Serializable):
         if len(edge) == 0:
             return -1001
 
+        try:
+            offset, relative = self._x_offsets[edge]
+        except KeyError:
+            offset, relative = self._get_x_offset(edge)
+        return offset + position if relative else offset
+
+    def get_x_batch(self, edges, positions):
+        """Vectorized version of get_x.
+
+        Parameters
+        ----------
+        edges: list<str>
+            names of the edges
+        positions: array_like
+            relative positions on the edges
+
+        Returns
+        -------
+        numpy ndarray
+            absolute positions with respect to some global reference
+        """
+        x_offsets = self._x_offsets
+        offsets = np.empty(len(edges))
+        relative = np.empty(len(edges), dtype=bool)
+        for i, edge in enumerate(edges):
+            if len(edge) == 0:
+                offsets[i], relative[i] = -1001, False
+                continue
+            try:
+                offsets[i], relative[i] = x_offsets[edge]
+            except KeyError:
+                offsets[i], relative[i] = self._get_x_offset(edge)
+        return np.where(relative, offsets + np.asarray(positions, dtype=float),
+                        offsets)
+
+    def _get_x_offset(self, edge):
+        """Computes, and caches, the absolute position of the start of an
+        edge.
+
+        Returns
+        -------
+        float
+            absolute position of the start of the edge
+        bool
+            whether the relative position on the edge should be added to the
+            returned position (False for edges whose position is
+            approximated)
+
+        Raises
+        ------
+        KeyError
+            if the edge is not an internal link and is not in the network
+        """
         if edge[0] == ":":
             try:
-                return self.internal_edgestarts_dict[edge] + position
+                offset = (self.internal_edgestarts_dict[edge], True)
             except KeyError:
                 # in case several internal links are being generalized for
                 # by a single element (for backwards compatibility)
                 edge_name = edge.rsplit("_", 1)[0]
-                return self.total_edgestarts_dict.get(edge_name, -1001)
+                offset = (self.total_edgestarts_dict.get(edge_name, -1001),
+                          False)
         else:
-            return self.total_edgestarts_dict[edge] + position
+            offset = (self.total_edgestarts_dict[edge], True)
+        self._x_offsets[edge] = offset
+        return offset
 
     def generate_starting_positions(self, num_vehicles=None, **kwargs):
         """Generates starting positions for vehicles in the network.
@@ -562,6 +655,8 @@ class Scenario(Serializable):
         """Returns the length of a given edge/junction. Returns -1001 if edge
         not found."""
         try:
+            if self.compiled_net is not None:
+                return self.compiled_net.edge_length(edge_id)
             return self._edges[edge_id]["length"]
         except KeyError:
             print('Error in edge length with key', edge_id)
@@ -571,6 +666,8 @@ class Scenario(Serializable):
         """Returns the speed limit of a given edge/junction. Returns -1001 if
         edge not found."""
         try:
+            if self.compiled_net is not None:
+                return self.compiled_net.speed_limit(edge_id)
             return self._edges[edge_id]["speed"]
         except KeyError:
             print('Error in speed limit with key', edge_id)
@@ -580,6 +677,8 @@ class Scenario(Serializable):
         """Returns the number of lanes of a given edge/junction. Returns -1001
         if edge not found."""
         try:
+            if self.compiled_net is not None:
+                return self.compiled_net.num_lanes(edge_id)
             return self._edges[edge_id]["lanes"]
         except KeyError:
             print('Error in num lanes with key', edge_id)
@@ -598,6 +697,8 @@ class Scenario(Serializable):
         edges may also be internal links (junctions). Returns an empty list if
         there are no edge/lane pairs in front."""
         try:
+            if self.compiled_net is not None:
+                return self.compiled_net.next_edge(edge, lane)
             return self._connections["next"][edge][lane]
         except KeyError:
             return []
@@ -607,6 +708,8 @@ class Scenario(Serializable):
         may also be internal links (junctions). Returns an empty list if there
         are no edge/lane pairs behind."""
         try:
+            if self.compiled_net is not None:
+                return self.compiled_net.prev_edge(edge, lane)
             return self._connections["prev"][edge][lane]
         except KeyError:
             return []
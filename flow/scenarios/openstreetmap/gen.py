@@ -51,8 +51,9 @@ class OpenStreetMapGenerator(Generator):
         # name of the .net.xml file (located in cfg_path)
         self.netfn = netfn
 
-        # collect data from the generated network configuration file
-        edges_dict, conn_dict = self._import_edges_from_net()
+        # collect data from the compiled representation of the network
+        # configuration file
+        edges_dict, conn_dict = self._import_compiled_net()
 
         return edges_dict, conn_dict
 
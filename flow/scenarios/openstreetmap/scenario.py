@@ -37,7 +37,7 @@ class OpenStreetMapScenario(Scenario):
             edgestarts.append((edge_id, self.length))
             # increment the total length of the network with the length of the
             # current edge
-            self.length += self._edges[edge_id]["length"]
+            self.length += self.edge_length(edge_id)
 
         return edgestarts
 
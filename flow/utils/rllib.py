@@ -194,16 +194,18 @@ def get_flow_params(config):
 
     # convert all parameters from dict to their object form
     sumo = SumoParams()
-    sumo.__dict__ = flow_params["sumo"].copy()
+    sumo.__dict__.update(flow_params["sumo"])
 
     net = NetParams()
-    net.__dict__ = flow_params["net"].copy()
+    net.__dict__.update(flow_params["net"])
     net.in_flows = InFlows()
     if flow_params["net"]["in_flows"]:
         net.in_flows.__dict__ = flow_params["net"]["in_flows"].copy()
 
+    # parameters missing from configurations stored by older versions of flow
+    # keep their default values
     env = EnvParams()
-    env.__dict__ = flow_params["env"].copy()
+    env.__dict__.update(flow_params["env"])
 
     initial = InitialConfig()
     if "initial" in flow_params:
@@ -21,7 +21,7 @@ from ray.tune.registry import get_registry, register_env
 
 from flow.utils.rllib import make_create_env, get_flow_params
 from flow.core.util import get_rllib_config
-from flow.core.util import emission_to_csv
+from flow.core.util import emission_to_csv, emission_to_npz
 
 EXAMPLE_USAGE = """
 example usage:
@@ -54,6 +54,9 @@ parser.add_argument('--num_rollouts', type=int, default=1,
 parser.add_argument('--emission_to_csv', action='store_true',
                     help='Specifies whether to convert the emission file '
                          'created by sumo into a csv file')
+parser.add_argument('--emission_to_npz', action='store_true',
+                    help='Specifies whether to convert the emission file '
+                         'created by sumo into a columnar npz file')
 
 if __name__ == "__main__":
     args = parser.parse_args()
@@ -131,12 +134,15 @@ if __name__ == "__main__":
     # terminate the environment
     env.terminate()
 
-    # if prompted, convert the emission file into a csv file
-    if args.emission_to_csv:
+    # if prompted, convert the emission file into a csv or npz file
+    if args.emission_to_csv or args.emission_to_npz:
         dir_path = os.path.dirname(os.path.realpath(__file__))
         emission_filename = "{0}-emission.xml".format(scenario.name)
 
         emission_path = \
             "{0}/test_time_rollout/{1}".format(dir_path, emission_filename)
 
-        emission_to_csv(emission_path)
+        if args.emission_to_csv:
+            emission_to_csv(emission_path)
+        if args.emission_to_npz:
+            emission_to_npz(emission_path)
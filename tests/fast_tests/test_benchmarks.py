@@ -0,0 +1,91 @@
+import unittest
+import os
+import json
+import tempfile
+
+from flow.benchmarks.run import run_benchmarks, compare, main, METRICS
+from flow.benchmarks.imports import run_import_benchmarks
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Tests the throughput benchmarks of flow.benchmarks.run."""
+
+    def test_run(self):
+        """Ensures that the results of a benchmark are reported."""
+        results = run_benchmarks(names=["sugiyama"], sizes=[5], horizon=10,
+                                 num_resets=1, isolate=False)
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertEqual(result["name"], "sugiyama")
+        self.assertEqual(result["size"], 5)
+        self.assertEqual(result["num_steps"], 10)
+        for metric in METRICS:
+            self.assertGreater(result[metric], 0)
+
+        self.assertRaises(ValueError, run_benchmarks, names=["unknown"])
+
+    def test_compare(self):
+        """Ensures that regressions are detected, within a tolerance."""
+        baseline = [{"name": "sugiyama", "size": 22, "build_time": 1.,
+                     "start_time": 1., "reset_latency": 0.1,
+                     "steps_per_sec": 100., "peak_rss": 200.}]
+        results = [{"name": "sugiyama", "size": 22, "build_time": 1.1,
+                    "start_time": 2., "reset_latency": 0.1,
+                    "steps_per_sec": 50., "peak_rss": 150.},
+                   {"name": "sugiyama", "size": 88, "build_time": 10.,
+                    "start_time": 10., "reset_latency": 10.,
+                    "steps_per_sec": 1., "peak_rss": 1000.}]
+
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertListEqual(
+            sorted((r["size"], r["metric"]) for r in regressions),
+            [(22, "start_time"), (22, "steps_per_sec")])
+        self.assertListEqual(compare(results, baseline, tolerance=1.5), [])
+
+        failed = [{"name": "sugiyama", "size": 22, "error": "Error()"}]
+        regressions = compare(failed, baseline)
+        self.assertListEqual([r["metric"] for r in regressions], ["error"])
+
+    def test_cli(self):
+        """Ensures that the results are written to a json file, and that the
+        exit status reports regressions."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.json")
+            args = ["sugiyama", "--sizes", "5", "--horizon", "5",
+                    "--num_resets", "1", "--no_isolate"]
+            self.assertEqual(main(args + ["--output", output]), 0)
+            with open(output) as f:
+                results = json.load(f)
+            self.assertEqual(results[0]["num_steps"], 5)
+
+            # a baseline with a much higher throughput
+            baseline = os.path.join(tmp, "baseline.json")
+            results[0]["steps_per_sec"] *= 100
+            with open(baseline, "w") as f:
+                json.dump(results, f)
+            self.assertEqual(main(args + ["--output", output,
+                                          "--baseline", baseline]), 1)
+
+
+class TestImportBenchmarks(unittest.TestCase):
+    """Tests the import-time benchmarks of flow.benchmarks.imports."""
+
+    def test_run(self):
+        """Ensures that the import time and the heavy modules loaded are
+        reported, and that a single environment is imported without the
+        dependencies of the others."""
+        results = run_import_benchmarks(names=["flow", "one_env"], repeats=1)
+        self.assertListEqual([r["name"] for r in results],
+                             ["flow", "one_env"])
+        for result in results:
+            self.assertGreater(result["min_time"], 0)
+        self.assertNotIn("gym", results[0]["modules"])
+        self.assertNotIn("scipy", results[1]["modules"])
+
+        self.assertRaises(ValueError, run_import_benchmarks, names=["unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,10 @@ class TestCFMController(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(requested_accel, expected_accel)
 
+        # the batch actions match the actions of the individual vehicles
+        batch_accel = CFMController.get_action_batch(self.env, ids)
+        np.testing.assert_array_almost_equal(batch_accel, expected_accel)
+
 
 class TestBCMController(unittest.TestCase):
     """
@@ -108,6 +112,10 @@ class TestBCMController(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(requested_accel, expected_accel)
 
+        # the batch actions match the actions of the individual vehicles
+        batch_accel = BCMController.get_action_batch(self.env, ids)
+        np.testing.assert_array_almost_equal(batch_accel, expected_accel)
+
 
 class TestOVMController(unittest.TestCase):
     """
@@ -154,6 +162,10 @@ class TestOVMController(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(requested_accel, expected_accel)
 
+        # the batch actions match the actions of the individual vehicles
+        batch_accel = OVMController.get_action_batch(self.env, ids)
+        np.testing.assert_array_almost_equal(batch_accel, expected_accel)
+
 
 class TestLinearOVM(unittest.TestCase):
     """
@@ -202,6 +214,10 @@ class TestLinearOVM(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(requested_accel, expected_accel)
 
+        # the batch actions match the actions of the individual vehicles
+        batch_accel = LinearOVM.get_action_batch(self.env, ids)
+        np.testing.assert_array_almost_equal(batch_accel, expected_accel)
+
 
 class TestIDMController(unittest.TestCase):
     """
@@ -249,6 +265,10 @@ class TestIDMController(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(requested_accel, expected_accel)
 
+        # the batch actions match the actions of the individual vehicles
+        batch_accel = IDMController.get_action_batch(self.env, ids)
+        np.testing.assert_array_almost_equal(batch_accel, expected_accel)
+
         # set the perceived headway to zero
         test_headways = [0, 0, 0, 0, 0]
         for i, veh_id in enumerate(ids):
@@ -260,6 +280,45 @@ class TestIDMController(unittest.TestCase):
          for veh_id in ids]
 
 
+class TestActionBatches(unittest.TestCase):
+    """
+    Tests that the actions computed in batches by the environment match the
+    actions computed by the controllers of the individual vehicles, including
+    noise and failsafes.
+    """
+    def test_batch_matches_individual_actions(self):
+        vehicles = Vehicles()
+        for i, (controller, params) in enumerate([
+                (IDMController, {"noise": 0.2}),
+                (IDMController, {"v0": 10, "fail_safe": "instantaneous"}),
+                (OVMController, {"fail_safe": "safe_velocity"}),
+                (LinearOVM, {"fail_safe": "instantaneous"}),
+                (BCMController, {}),
+                (CFMController, {"fail_safe": "safe_velocity"})]):
+            vehicles.add(
+                veh_id="test_%d" % i,
+                acceleration_controller=(controller, params),
+                routing_controller=(ContinuousRouter, {}),
+                num_vehicles=3)
+
+        env, scenario = ring_road_exp_setup(vehicles=vehicles)
+        env.reset()
+
+        for _ in range(20):
+            env.step(rl_actions=[])
+
+            ids = env.vehicles.get_controlled_ids()
+            np.random.seed(0)
+            expected = [env.vehicles.get_acc_controller(veh_id).get_action(
+                env) for veh_id in ids]
+            np.random.seed(0)
+            actual = env.get_controlled_actions(ids)
+
+            np.testing.assert_array_almost_equal(actual, expected)
+
+        env.terminate()
+
+
 class TestInstantaneousFailsafe(unittest.TestCase):
     """
     Tests that the instantaneous failsafe of the base acceleration controller
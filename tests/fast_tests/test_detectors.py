@@ -0,0 +1,155 @@
+import unittest
+import os
+
+from flow.core.params import EnvParams
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+
+from tests.setup_scripts import ring_road_exp_setup
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestDetectors(unittest.TestCase):
+    """Tests the virtual loop detectors of the environments (see
+    flow.core.detectors)."""
+
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=8)
+        self.env, self.scenario = ring_road_exp_setup(vehicles=vehicles)
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_add(self):
+        """Ensures that the length of the detectors is computed from the
+        edges they cover, and that invalid detectors are rejected."""
+        detectors = self.env.detectors
+        length = self.scenario.edge_length("bottom")
+
+        detector = detectors.add("bottom", edges="bottom")
+        self.assertEqual(detector.length, length)
+        self.assertEqual(detector.window_steps, 1)
+        detector = detectors.add("segment", edges=["bottom", "right"],
+                                 start=10, end=20, window=1)
+        self.assertAlmostEqual(detector.length, 20)
+        self.assertEqual(detector.window_steps, 10)
+
+        self.assertIn("bottom", detectors)
+        self.assertListEqual(list(detectors), ["bottom", "segment"])
+        self.assertEqual(len(detectors), 2)
+
+        self.assertRaises(ValueError, detectors.add, "bottom", edges="top")
+        self.assertRaises(ValueError, detectors.add, "unknown",
+                          edges="unknown")
+
+    def test_measurements(self):
+        """Ensures that the measurements of the detectors match the states of
+        the vehicles in their segments."""
+        env = self.env
+        env.detectors.add("bottom", edges="bottom")
+        env.detectors.add("lane", edges=["bottom", "right"], lanes=[0],
+                          start=5, end=50)
+        env.detectors.add("window", edges="bottom", window=0.5)
+        length = self.scenario.edge_length("bottom")
+
+        env.reset()
+        counts = []
+        for _ in range(30):
+            env.step(rl_actions=[])
+            ids = env.vehicles.get_ids_by_edge("bottom")
+            counts.append(len(ids))
+
+            detector = env.detectors["bottom"]
+            self.assertSetEqual(detector.ids, set(ids))
+            self.assertEqual(detector.num_vehicles(), len(ids))
+            self.assertEqual(detector.density(), len(ids) / length)
+            if ids:
+                self.assertEqual(
+                    detector.mean_speed(),
+                    sum(env.vehicles.get_speed(ids)) / len(ids))
+            else:
+                self.assertEqual(detector.mean_speed(), 0)
+
+            lane_ids = [
+                veh_id for veh_id in env.vehicles.get_ids_by_edge(
+                    ["bottom", "right"])
+                if env.vehicles.get_lane(veh_id) == 0 and
+                5 <= env.vehicles.get_position(veh_id) <= 50]
+            self.assertSetEqual(env.detectors["lane"].ids, set(lane_ids))
+
+            self.assertAlmostEqual(env.detectors["window"].num_vehicles(),
+                                   sum(counts[-5:]) / len(counts[-5:]))
+
+        # the measurements do not carry over to the next rollout
+        env.reset()
+        ids = env.vehicles.get_ids_by_edge("bottom")
+        self.assertEqual(env.detectors["window"].num_steps, 1)
+        self.assertEqual(env.detectors["window"].num_vehicles(), len(ids))
+
+    def test_flow(self):
+        """Ensures that the flow is computed from the vehicles leaving the
+        segment."""
+        env = self.env
+        detector = env.detectors.add("bottom", edges="bottom", window=1000)
+
+        env.reset()
+        exits = 0
+        for _ in range(500):
+            prev_ids = set(env.vehicles.get_ids_by_edge("bottom"))
+            env.step(rl_actions=[])
+            ids = set(env.vehicles.get_ids_by_edge("bottom"))
+            exits += len(prev_ids - ids)
+
+        self.assertGreater(exits, 0)
+        # the reset is counted as a step as well
+        self.assertAlmostEqual(detector.flow(),
+                               3600 * exits / (501 * env.sim_step))
+
+    def test_snapshot_reset(self):
+        """Ensures that the measurements of the detectors are restored with
+        the state of the network, and that detectors added after the state
+        was saved are kept."""
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=8)
+        env_params = EnvParams(warmup_steps=10, snapshot_reset=True,
+                               additional_params=ADDITIONAL_ENV_PARAMS)
+        env, _ = ring_road_exp_setup(vehicles=vehicles,
+                                     env_params=env_params)
+
+        bottom = env.detectors.add("bottom", edges="bottom", window=100)
+        env.reset()
+        self.assertIsNotNone(env.snapshot)
+        ids = bottom.ids
+
+        right = env.detectors.add("right", edges="right", window=100)
+        for _ in range(10):
+            env.step(rl_actions=[])
+
+        env.reset()
+        self.assertIs(env.detectors["bottom"], bottom)
+        self.assertIs(env.detectors["right"], right)
+        # the reset and the warm-up steps were measured before the state was
+        # saved
+        self.assertEqual(bottom.num_steps, 11)
+        self.assertSetEqual(bottom.ids, ids)
+        self.assertEqual(right.num_steps, 0)
+
+        env.step(rl_actions=[])
+        self.assertEqual(right.num_steps, 1)
+
+        env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,16 @@
+import asyncio
+import json
+import tempfile
 import unittest
 
 from flow.core.params import SumoParams, EnvParams, InitialConfig, \
     NetParams, SumoCarFollowingParams
 from flow.core.vehicles import Vehicles
+from flow.core.profiling import PHASES
 
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
 from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
 
 from tests.setup_scripts import ring_road_exp_setup
@@ -392,5 +397,393 @@ class TestSimsPerStep(unittest.TestCase):
         self.assertEqual(t2 - t1, sims_per_step)
 
 
+class TestCommandBatching(unittest.TestCase):
+
+    """Ensures that batching the set commands sent to sumo during a step does
+    not modify the outcome of the simulation, and that round-trips with sumo
+    are saved."""
+
+    def test_it_works(self):
+        def run(batching):
+            vehicles = Vehicles()
+            vehicles.add(veh_id="idm",
+                         acceleration_controller=(IDMController, {}),
+                         routing_controller=(ContinuousRouter, {}),
+                         num_vehicles=10)
+            env, scenario = ring_road_exp_setup(vehicles=vehicles)
+            env.traci_batcher.enabled = batching
+            env.reset()
+            for _ in range(20):
+                env.step(rl_actions=[])
+            speeds = env.vehicles.get_speed(env.vehicles.get_ids())
+            counters = env.traci_batcher.get_counters()
+            env.terminate()
+            return speeds, counters
+
+        speeds, counters = run(batching=True)
+        expected_speeds, expected_counters = run(batching=False)
+
+        np.testing.assert_array_almost_equal(speeds, expected_speeds)
+
+        # the 10 acceleration commands of every step are sent in a single
+        # message
+        self.assertEqual(counters["num_batched"], 10 * 20)
+        self.assertEqual(counters["num_messages"], 20)
+        self.assertEqual(counters["round_trips_saved"], 9 * 20)
+        self.assertEqual(expected_counters["num_batched"], 0)
+
+
+class TestWarmStart(unittest.TestCase):
+
+    """Ensures that, when sumo is restarted upon reset, the instance used
+    after a reset is started ahead of time, with the seed used by the
+    rollout."""
+
+    def test_it_works(self):
+        sumo_params = SumoParams(sim_step=0.1, restart_instance=True)
+        env, _ = ring_road_exp_setup(sumo_params=sumo_params)
+        self.assertEqual(env.sumo_pool.num_idle, 1)
+
+        for i in range(3):
+            warm_seed = env.warm_seed
+            env.reset()
+            self.assertEqual(env.sumo_params.seed, warm_seed)
+            self.assertEqual(env.sumo_pool.num_warm_hits, i + 1)
+            self.assertEqual(env.sumo_pool.num_idle, 1)
+            env.step(rl_actions=[])
+        self.assertEqual(env.sumo_pool.num_cold_starts, 1)
+
+        env.terminate()
+        self.assertEqual(env.sumo_pool.num_idle, 0)
+
+    def test_outdated(self):
+        """Ensures that instances started with other parameters are not
+        used."""
+        sumo_params = SumoParams(sim_step=0.1, restart_instance=True)
+        env, _ = ring_road_exp_setup(sumo_params=sumo_params)
+        idle_proc = env.sumo_pool._idle[0][1]
+
+        # the seed of the instance started ahead of time is not used
+        env.restart_sumo(sumo_params)
+        self.assertEqual(env.sumo_pool.num_cold_starts, 2)
+        self.assertIsNotNone(idle_proc.poll())
+
+        # the instance started ahead of time uses another teleport time
+        env.sumo_params.seed = env.warm_seed
+        env.sumo_params.teleport_time = 10
+        env.restart_sumo(env.sumo_params)
+        self.assertEqual(env.sumo_pool.num_cold_starts, 3)
+        self.assertEqual(env.sumo_pool.num_warm_hits, 0)
+
+        env.terminate()
+
+    def test_no_restart(self):
+        """Ensures that no instance is started ahead of time if sumo is not
+        restarted upon reset."""
+        env, _ = ring_road_exp_setup()
+        env.reset()
+        self.assertEqual(env.sumo_pool.num_idle, 0)
+        env.terminate()
+
+
+class TestSnapshotReset(unittest.TestCase):
+
+    """Ensures that resets restoring the state of the network after the
+    warm-up steps of the first rollout start all rollouts from the same
+    state."""
+
+    @staticmethod
+    def make_env(**kwargs):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=10)
+        vehicles.add(veh_id="rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     speed_mode="aggressive",
+                     num_vehicles=1)
+        env_params = EnvParams(warmup_steps=50, snapshot_reset=True,
+                               additional_params=ADDITIONAL_ENV_PARAMS,
+                               **kwargs)
+        env, _ = ring_road_exp_setup(vehicles=vehicles, env_params=env_params)
+        return env
+
+    def test_it_works(self):
+        env = self.make_env()
+
+        rollouts = []
+        for _ in range(3):
+            obs = env.reset()
+            self.assertEqual(env.time_counter, 50)
+            for _ in range(10):
+                obs, reward, _, _ = env.step(rl_actions=[1])
+            speeds = env.vehicles.get_speed(env.vehicles.get_ids())
+            rollouts.append((obs, reward, speeds))
+            self.assertIsNotNone(env.snapshot)
+
+            # the lane graph of the network is not copied, nor rebuilt
+            if len(rollouts) == 1:
+                lane_graph = env.vehicles._lane_graph
+            self.assertIs(env.vehicles._lane_graph, lane_graph)
+            self.assertIs(lane_graph.scenario, env.scenario)
+
+        for obs, reward, speeds in rollouts[1:]:
+            np.testing.assert_array_almost_equal(obs, rollouts[0][0])
+            self.assertAlmostEqual(reward, rollouts[0][1])
+            np.testing.assert_array_almost_equal(speeds, rollouts[0][2])
+
+        # the speed mode of the vehicles is restored in sumo
+        self.assertEqual(env.traci_connection.vehicle.getSpeedMode("rl_0"),
+                         env.vehicles.get_speed_mode("rl_0"))
+
+        snapshot_file = env.snapshot_file
+        env.terminate()
+        self.assertFalse(os.path.exists(snapshot_file))
+
+    def test_new_scenario(self):
+        """Ensures that the snapshot is taken again if the scenario is
+        rebuilt in between rollouts (e.g. with a new ring length)."""
+        env = self.make_env()
+        env.reset()
+        old_key = env.snapshot_key
+
+        # rebuild the ring with a different length, as done by
+        # WaveAttenuationEnv.reset
+        scenario = env.scenario
+        net_params = NetParams(additional_params={
+            "length": 260, "lanes": 1, "speed_limit": 30, "resolution": 40})
+        env.scenario = scenario.__class__(
+            scenario.name, scenario.generator_class, scenario.vehicles,
+            net_params, scenario.initial_config)
+        env.restart_sumo(env.sumo_params)
+
+        rollouts = []
+        for _ in range(2):
+            obs = env.reset()
+            self.assertEqual(env.time_counter, 50)
+            self.assertIs(env.snapshot_key[0], env.scenario)
+            self.assertNotEqual(env.snapshot_key, old_key)
+
+            # the vehicles match the state of the new network in sumo
+            for veh_id in env.vehicles.get_ids():
+                self.assertAlmostEqual(
+                    env.vehicles.get_position(veh_id),
+                    env.traci_connection.vehicle.getLanePosition(veh_id))
+            rollouts.append(obs)
+
+        np.testing.assert_array_almost_equal(rollouts[1], rollouts[0])
+        env.terminate()
+
+    def test_shuffle(self):
+        """Ensures that no snapshot is used if the initial positions of the
+        vehicles are shuffled."""
+        env = self.make_env(starting_position_shuffle=True)
+        env.reset()
+        env.reset()
+        self.assertIsNone(env.snapshot)
+        env.terminate()
+
+
+class TestStepAsync(unittest.TestCase):
+
+    """Ensures that environments stepped as coroutines (Env.step_async) match
+    environments stepped synchronously, with and without pipelined steps."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    @staticmethod
+    def make_env(sims_per_step=1, pipeline_steps=False):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=10)
+        env_params = EnvParams(sims_per_step=sims_per_step,
+                               pipeline_steps=pipeline_steps,
+                               additional_params=ADDITIONAL_ENV_PARAMS)
+        env, _ = ring_road_exp_setup(vehicles=vehicles, env_params=env_params)
+        env.reset()
+        return env
+
+    def test_it_works(self):
+        env = self.make_env()
+        async_env = self.make_env()
+
+        async def run():
+            for _ in range(20):
+                await async_env.step_async(rl_actions=[], loop=self.loop)
+
+        for _ in range(20):
+            env.step(rl_actions=[])
+        self.loop.run_until_complete(run())
+
+        self.assertFalse(async_env.async_connection.pending)
+        self.assertEqual(async_env.time_counter, env.time_counter)
+        ids = env.vehicles.get_ids()
+        np.testing.assert_array_almost_equal(
+            async_env.vehicles.get_speed(ids), env.vehicles.get_speed(ids))
+        np.testing.assert_array_almost_equal(
+            async_env.vehicles.get_position(ids),
+            env.vehicles.get_position(ids))
+
+        env.terminate()
+        async_env.terminate()
+
+    def test_pipelined(self):
+        env = self.make_env(sims_per_step=3)
+        async_env = self.make_env(sims_per_step=3, pipeline_steps=True)
+
+        for _ in range(5):
+            env.step(rl_actions=[])
+            self.loop.run_until_complete(
+                async_env.step_async(rl_actions=[], loop=self.loop))
+
+            # the last simulation step is still running in sumo
+            self.assertTrue(async_env.async_connection.pending)
+            self.assertEqual(async_env.time_counter, env.time_counter)
+
+        # collect the results of the last simulation step, as done on reset
+        async_env._finish_pending_step()
+        self.assertFalse(async_env.async_connection.pending)
+        ids = env.vehicles.get_ids()
+        np.testing.assert_array_almost_equal(
+            async_env.vehicles.get_speed(ids), env.vehicles.get_speed(ids))
+
+        async_env.reset()
+        self.assertEqual(async_env.time_counter, 0)
+
+        env.terminate()
+        async_env.terminate()
+
+    def test_step_after_pipelined(self):
+        """Ensures that a synchronous step collects the results of a
+        simulation step left running by step_async."""
+        env = self.make_env(sims_per_step=3)
+        async_env = self.make_env(sims_per_step=3, pipeline_steps=True)
+
+        for _ in range(2):
+            env.step(rl_actions=[])
+        self.loop.run_until_complete(
+            async_env.step_async(rl_actions=[], loop=self.loop))
+        self.assertTrue(async_env.async_connection.pending)
+        async_env.step(rl_actions=[])
+
+        self.assertFalse(async_env.async_connection.pending)
+        self.assertEqual(async_env.time_counter, env.time_counter)
+        ids = env.vehicles.get_ids()
+        np.testing.assert_array_almost_equal(
+            async_env.vehicles.get_speed(ids), env.vehicles.get_speed(ids))
+
+        env.terminate()
+        async_env.terminate()
+
+
+class TestProfiling(unittest.TestCase):
+
+    """Ensures that the time spent in the phases of the steps and the
+    round-trips with sumo are measured when requested, and written to a json
+    file at the end of every rollout."""
+
+    def test_it_works(self):
+        tmp = tempfile.TemporaryDirectory()
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=10)
+        env, scenario = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_step=0.1, profile_path=tmp.name),
+            vehicles=vehicles)
+        env.reset()
+        for _ in range(20):
+            env.step(rl_actions=[])
+
+        profile = env.get_profile()
+        self.assertSetEqual(set(profile), set(["step"] + PHASES))
+        for phase in ["step"] + PHASES:
+            self.assertEqual(profile[phase]["count"], 20)
+            self.assertEqual(sum(profile[phase]["histogram"]), 20)
+            self.assertGreater(profile[phase]["total"], 0)
+            self.assertLessEqual(profile[phase]["total"],
+                                 profile["step"]["total"])
+
+        # one message for the batched accelerations, one for the simulation
+        # step, and one for the teleports
+        self.assertEqual(profile["traci_commands"]["round_trips"], 20)
+        self.assertEqual(profile["simulation_step"]["round_trips"], 20)
+        self.assertEqual(profile["step"]["round_trips"], 60)
+
+        env.reset()
+        self.assertEqual(env.get_profile()["step"]["count"], 0)
+        env.step(rl_actions=[])
+        env.terminate()
+
+        path = os.path.join(tmp.name, "{}-profile-0.json".format(
+            scenario.name))
+        with open(path) as f:
+            self.assertEqual(json.load(f), profile)
+        path = os.path.join(tmp.name, "{}-profile-1.json".format(
+            scenario.name))
+        with open(path) as f:
+            self.assertEqual(json.load(f)["step"]["count"], 1)
+        tmp.cleanup()
+
+    def test_disabled(self):
+        env, _ = ring_road_exp_setup()
+        env.reset()
+        env.step(rl_actions=[])
+        self.assertEqual(env.get_profile()["step"]["count"], 0)
+        env.terminate()
+
+
+class TestObservationBuffer(unittest.TestCase):
+
+    """Ensures that observations are written into preallocated arrays when
+    requested, and that these contain the same values as the observations
+    returned otherwise."""
+
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        self.env, _ = ring_road_exp_setup(vehicles=vehicles)
+
+    def tearDown(self):
+        self.env.terminate()
+
+    def test_it_works(self):
+        env = self.env
+        obs = env.reset()
+        self.assertIsInstance(obs, list)
+
+        # the observations of the speeds and positions of the vehicles are
+        # concatenated
+        self.assertTupleEqual(env.get_observation_shape(), (10,))
+        buffer = np.zeros(10, dtype=np.float32)
+        env.set_observation_buffer(buffer)
+        self.assertRaises(ValueError, env.set_observation_buffer,
+                          np.zeros(5))
+
+        for _ in range(5):
+            expected_obs = np.ravel(np.asarray(env.get_state()).T)
+            obs, _, _, _ = env.step(rl_actions=[])
+            self.assertIs(obs, buffer)
+            self.assertIs(env.state, buffer)
+        np.testing.assert_array_almost_equal(
+            obs, np.ravel(np.asarray(env.get_state()).T), decimal=5)
+        self.assertFalse(np.allclose(obs, expected_obs))
+
+        obs = env.reset()
+        self.assertIs(obs, buffer)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 import os
+import tempfile
 
 from flow.core.experiment import SumoExperiment
+from flow.core.params import SumoParams
 from tests.setup_scripts import ring_road_exp_setup
 import numpy as np
 
@@ -57,5 +59,42 @@ class TestNumRuns(unittest.TestCase):
         np.testing.assert_array_almost_equal(vel1, vel2)
 
 
+class TestParallelRuns(unittest.TestCase):
+    """
+    Tests that runs spread over a pool of processes are each performed with
+    their own sumo instance, and that their results are all reported.
+    """
+
+    def runTest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sumo_params = SumoParams(sim_step=0.1, sumo_binary="sumo",
+                                     emission_path=tmp, seed=10)
+            env, scenario = ring_road_exp_setup(sumo_params=sumo_params)
+            exp = SumoExperiment(env, scenario)
+
+            completed = []
+            summary = exp.run(num_runs=3, num_steps=10, convert_to_csv=True,
+                              num_workers=2, callback=completed.append)
+
+            # every run is reported once, as soon as it completes
+            self.assertEqual(len(completed), 3)
+            self.assertListEqual([r["run"] for r in summary["runs"]],
+                                 [0, 1, 2])
+            self.assertListEqual(sorted(r["run"] for r in completed),
+                                 [0, 1, 2])
+            self.assertEqual(len(summary["returns"]), 3)
+            self.assertAlmostEqual(summary["average_return"],
+                                   sum(summary["returns"]) / 3)
+
+            # every run has its own seed and emission file
+            self.assertListEqual([r["seed"] for r in summary["runs"]],
+                                 [10, 11, 12])
+            for r in summary["runs"]:
+                path = r["emission_path"]
+                self.assertIn("run_{}".format(r["run"]), path)
+                self.assertTrue(os.path.isfile(path))
+                self.assertTrue(os.path.isfile(path[:-3] + "csv"))
+
+
 if __name__ == '__main__':
     unittest.main()
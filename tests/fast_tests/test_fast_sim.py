@@ -0,0 +1,109 @@
+import unittest
+import os
+import numpy as np
+
+from flow.core.params import SumoParams, NetParams
+from flow.core.vehicles import Vehicles
+from flow.core.fast_sim import FastSimulation
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.routing_controllers import ContinuousRouter
+
+from tests.setup_scripts import ring_road_exp_setup, figure_eight_exp_setup
+
+os.environ["TEST_FLAG"] = "True"
+
+
+def make_vehicles(rl_speed_mode="no_collide"):
+    vehicles = Vehicles()
+    vehicles.add(veh_id="idm",
+                 acceleration_controller=(IDMController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=10)
+    vehicles.add(veh_id="rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 speed_mode=rl_speed_mode,
+                 num_vehicles=1)
+    return vehicles
+
+
+class TestFastSimulation(unittest.TestCase):
+    """Tests the in-process simulation of single-lane closed loops
+    (SumoParams(simulator="fast"))."""
+
+    def test_ring(self):
+        """Ensures that vehicles drive along the ring without colliding, and
+        that their states are consistent with the scenario."""
+        sumo_params = SumoParams(sim_step=0.1, simulator="fast")
+        env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                            vehicles=make_vehicles())
+        self.assertIsInstance(env.traci_connection, FastSimulation)
+
+        env.reset()
+        for _ in range(200):
+            _, _, crash, _ = env.step(rl_actions=[1])
+            self.assertFalse(crash)
+
+        ids = env.vehicles.get_ids()
+        self.assertEqual(len(ids), 11)
+        speeds = np.array(env.vehicles.get_speed(ids))
+        self.assertTrue(np.all(speeds > 0))
+
+        # headways are consistent with the absolute positions of the vehicles
+        for veh_id in ids:
+            leader = env.vehicles.get_leader(veh_id)
+            gap = (env.get_x_by_id(leader) - env.get_x_by_id(veh_id)) % \
+                scenario.length - env.vehicles.get_length(leader)
+            self.assertAlmostEqual(env.vehicles.get_headway(veh_id), gap)
+
+        env.terminate()
+
+    def test_figure_eight(self):
+        """Ensures that the loop of the figure eight includes its internal
+        edges."""
+        sumo_params = SumoParams(sim_step=0.1, simulator="fast")
+        env, scenario = figure_eight_exp_setup(sumo_params=sumo_params,
+                                               vehicles=make_vehicles())
+        sim = env.traci_connection
+        self.assertIn(":center_intersection_1", sim.edges)
+        self.assertEqual(len(set(sim.edges)), len(sim.edges))
+
+        env.reset()
+        edges = set()
+        for _ in range(500):
+            env.step(rl_actions=[0])
+            edges.update(env.vehicles.get_edge(env.vehicles.get_ids()))
+        self.assertIn(":center_intersection_1", edges)
+
+        env.terminate()
+
+    def test_collisions(self):
+        """Ensures that vehicles ignoring all safety checks collide."""
+        sumo_params = SumoParams(sim_step=0.1, simulator="fast")
+        env, _ = ring_road_exp_setup(
+            sumo_params=sumo_params,
+            vehicles=make_vehicles(rl_speed_mode="aggressive"))
+
+        env.reset()
+        crashed = False
+        for _ in range(200):
+            _, _, crash, _ = env.step(rl_actions=[20])
+            if crash:
+                crashed = True
+                break
+        self.assertTrue(crashed)
+
+        env.terminate()
+
+    def test_multi_lane(self):
+        """Ensures that multi-lane networks are rejected."""
+        sumo_params = SumoParams(sim_step=0.1, simulator="fast")
+        net_params = NetParams(additional_params={
+            "length": 230, "lanes": 2, "speed_limit": 30, "resolution": 40})
+        self.assertRaises(ValueError, ring_road_exp_setup,
+                          sumo_params=sumo_params, net_params=net_params)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import os
+import subprocess
+import sys
+
+import flow.envs
+import flow.scenarios
+import flow.controllers
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestLazyImport(unittest.TestCase):
+    """Tests the lazy loading of the classes of flow.envs, flow.scenarios and
+    flow.controllers."""
+
+    def test_attributes(self):
+        """Ensures that every exported class is available, and is the class
+        defined in its module."""
+        from flow.envs.loop.loop_accel import AccelEnv
+        self.assertIs(flow.envs.AccelEnv, AccelEnv)
+
+        for package in [flow.envs, flow.scenarios, flow.controllers]:
+            for name in package.__all__:
+                self.assertEqual(getattr(package, name).__name__, name)
+            self.assertTrue(set(package.__all__) <= set(dir(package)))
+
+        self.assertRaises(AttributeError, getattr, flow.envs, "UnknownEnv")
+
+    def test_deferred_imports(self):
+        """Ensures that importing one environment does not import the
+        modules of the others, nor scipy."""
+        script = "import sys\n" \
+                 "from flow.envs import AccelEnv\n" \
+                 "print('flow.envs.loop.wave_attenuation' in sys.modules, " \
+                 "'flow.envs.bottleneck_env' in sys.modules, " \
+                 "'scipy' in sys.modules)"
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.decode().split(), ["False", "False", "False"])
+
+    def test_util(self):
+        """Ensures that importing flow.core.util does not import the
+        controllers, nor gym."""
+        script = "import sys\n" \
+                 "import flow.core.util\n" \
+                 "print('flow.controllers.car_following_models' in " \
+                 "sys.modules, 'gym' in sys.modules)"
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.decode().split(), ["False", "False"])
+
+
+if __name__ == '__main__':
+    unittest.main()
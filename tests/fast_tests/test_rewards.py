@@ -0,0 +1,110 @@
+import unittest
+import os
+
+import numpy as np
+
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.core import rewards
+from flow.core.params import EnvParams
+from flow.core.vehicles import Vehicles
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+
+from tests.setup_scripts import ring_road_exp_setup
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestRewards(unittest.TestCase):
+    """Tests the reward functions of flow.core.rewards, and the per-step
+    aggregates they are computed from."""
+
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=8)
+        vehicles.add(veh_id="rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=2)
+        env_params = EnvParams(additional_params=ADDITIONAL_ENV_PARAMS)
+        self.env, _ = ring_road_exp_setup(vehicles=vehicles,
+                                          env_params=env_params)
+        self.env.reset()
+        for _ in range(20):
+            self.env.step(rl_actions=[1, 1])
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_aggregates(self):
+        """Ensures that the aggregates match the states of the vehicles, and
+        that they are computed again after every step."""
+        env = self.env
+        ids = env.vehicles.get_ids()
+        np.testing.assert_array_almost_equal(env.aggregates.speeds,
+                                             env.vehicles.get_speed(ids))
+        np.testing.assert_array_almost_equal(env.aggregates.headways,
+                                             env.vehicles.get_headway(ids))
+        self.assertListEqual(
+            [env.aggregates.ids[i] for i in env.aggregates.rl_indices],
+            env.vehicles.get_rl_ids())
+
+        # the arrays are shared within a step
+        speeds = env.aggregates.speeds
+        self.assertIs(env.aggregates.speeds, speeds)
+
+        env.step(rl_actions=[1, 1])
+        self.assertIsNot(env.aggregates.speeds, speeds)
+        np.testing.assert_array_almost_equal(env.aggregates.speeds,
+                                             env.vehicles.get_speed(ids))
+
+    def test_rewards(self):
+        """Compares the reward functions with their definitions."""
+        env = self.env
+        ids = env.vehicles.get_ids()
+        rl_ids = env.vehicles.get_rl_ids()
+        vel = np.array(env.vehicles.get_speed(ids))
+        target = env.env_params.additional_params["target_velocity"]
+
+        expected = max(np.linalg.norm([target] * len(ids)) -
+                       np.linalg.norm(vel - target), 0)
+        self.assertAlmostEqual(rewards.desired_velocity(env), expected)
+        self.assertEqual(rewards.desired_velocity(env, fail=True), 0)
+        self.assertAlmostEqual(
+            rewards.max_edge_velocity(env, env.scenario.get_edge_list()),
+            expected)
+
+        self.assertAlmostEqual(
+            rewards.rl_forward_progress(env, gain=0.1),
+            0.1 * sum(abs(v) for v in env.vehicles.get_speed(rl_ids)))
+
+        # all edges of the ring have a speed limit of 30 m/s
+        expected = max(env.sim_step * len(vel) -
+                       env.sim_step * sum((30 - vel) / 30), 0)
+        self.assertAlmostEqual(rewards.min_delay(env), expected)
+
+        headways = env.vehicles.get_headway(rl_ids)
+        threshold = max(headways)
+        expected = -sum((threshold - h) / threshold for h in headways)
+        self.assertAlmostEqual(
+            rewards.punish_small_rl_headways(env, threshold), expected)
+
+        follower_headways = [
+            env.vehicles.get_headway(env.vehicles.get_follower(veh_id))
+            for veh_id in rl_ids]
+        self.assertAlmostEqual(
+            rewards.reward_rl_opening_headways(env, reward_gain=0.1),
+            0.1 * sum(follower_headways))
+
+        self.assertEqual(rewards.punish_queues_in_lane(env, "bottom", 0),
+                         -len(env.vehicles.get_ids_by_edge("bottom")))
+        self.assertEqual(rewards.punish_rl_lane_changes(env), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
 import unittest
 import os
+import pickle
+import shutil
+import tempfile
 import numpy as np
 
+from flow.core import compiled_net, net_cache
 from flow.core.params import InitialConfig, NetParams
 from flow.core.vehicles import Vehicles
+from flow.scenarios.loop.gen import CircleGenerator
+from flow.scenarios.loop.loop_scenario import LoopScenario
 
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import IDMController
@@ -69,6 +75,41 @@ class TestGetEdge(unittest.TestCase):
             self.scenario.get_edge(x2), (":bottom_lower_ring", 0.1))
 
 
+class TestPositionBatch(unittest.TestCase):
+    """
+    Tests that the vectorized get_x_batch and get_edge_batch functions return
+    the same values as get_x and get_edge (figure 8).
+    """
+
+    def setUp(self):
+        # create the environment and scenario classes for a figure eight
+        env, self.scenario = figure_eight_exp_setup()
+
+    def tearDown(self):
+        # free data used by the class
+        self.scenario = None
+
+    def test_get_x_batch(self):
+        edges = [edge for edge, _ in self.scenario.total_edgestarts] + \
+            [":center_intersection_3", ""]
+        positions = np.linspace(0, 10, len(edges))
+        expected = [self.scenario.get_x(edge, pos)
+                    for edge, pos in zip(edges, positions)]
+        np.testing.assert_array_almost_equal(
+            self.scenario.get_x_batch(edges, positions), expected)
+        self.assertEqual(len(self.scenario.get_x_batch([], [])), 0)
+
+    def test_get_edge_batch(self):
+        xs = np.linspace(-1, self.scenario.length + 1, 101)
+        edges, positions = self.scenario.get_edge_batch(xs)
+        self.assertIsNone(edges[0])
+        self.assertTrue(np.isnan(positions[0]))
+        for x, edge, pos in zip(xs[1:], edges[1:], positions[1:]):
+            expected_edge, expected_pos = self.scenario.get_edge(x)
+            self.assertEqual(edge, expected_edge)
+            self.assertAlmostEqual(pos, expected_pos)
+
+
 class TestEvenStartPos(unittest.TestCase):
     """
     Tests the function gen_even_start_pos in base_scenario.py. This function
@@ -770,5 +811,132 @@ class TestNextPrevEdge(unittest.TestCase):
         self.assertTrue(len(prev_edge) == 0)
 
 
+class TestNetCache(unittest.TestCase):
+    """
+    Tests that networks generated from the same inputs are loaded from the
+    net cache instead of being generated by netconvert again.
+    """
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.default_cache_path = net_cache.CACHE_PATH
+        net_cache.CACHE_PATH = self.cache_path
+
+    def tearDown(self):
+        net_cache.CACHE_PATH = self.default_cache_path
+        shutil.rmtree(self.cache_path)
+
+    @staticmethod
+    def make_scenario(length=230, use_net_cache=True):
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        net_params = NetParams(
+            additional_params={"length": length, "lanes": 1,
+                               "speed_limit": 30, "resolution": 40},
+            use_net_cache=use_net_cache)
+        return LoopScenario(name="RingRoadCacheTest",
+                            generator_class=CircleGenerator,
+                            vehicles=vehicles,
+                            net_params=net_params,
+                            initial_config=InitialConfig())
+
+    def test_it_works(self):
+        scenario = self.make_scenario()
+        self.assertFalse(scenario.generator.net_from_cache)
+        self.assertEqual(len(os.listdir(self.cache_path)), 1)
+
+        cached_scenario = self.make_scenario()
+        self.assertTrue(cached_scenario.generator.net_from_cache)
+        self.assertEqual(cached_scenario._edges, scenario._edges)
+        self.assertEqual(cached_scenario._connections, scenario._connections)
+        self.assertEqual(cached_scenario.length, scenario.length)
+        self.assertTrue(os.path.isfile(
+            cached_scenario.net_params.cfg_path +
+            cached_scenario.generator.netfn))
+
+        # networks generated from other parameters are not reused
+        other_scenario = self.make_scenario(length=260)
+        self.assertFalse(other_scenario.generator.net_from_cache)
+        self.assertEqual(len(os.listdir(self.cache_path)), 2)
+
+    def test_disabled(self):
+        self.make_scenario(use_net_cache=False)
+        scenario = self.make_scenario(use_net_cache=False)
+        self.assertFalse(scenario.generator.net_from_cache)
+        self.assertEqual(len(os.listdir(self.cache_path)), 0)
+
+
+class TestCompiledNet(unittest.TestCase):
+    """
+    Tests that the compiled representation of a .net.xml file contains the
+    same edges and connections as the parsed file, and that it is compiled
+    again when the file changes.
+    """
+
+    def setUp(self):
+        # the figure eight contains internal links and multiple connections
+        env, self.scenario = figure_eight_exp_setup()
+        env.terminate()
+        generator = self.scenario.generator
+        self.edges, self.connections = generator._import_edges_from_net()
+
+        self.tmp = tempfile.mkdtemp()
+        self.net_file = os.path.join(self.tmp, "figure8.net.xml")
+        shutil.copyfile(os.path.join(generator.cfg_path, generator.netfn),
+                        self.net_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_it_works(self):
+        net = compiled_net.load(self.net_file, no_internal_links=False)
+        self.assertTrue(os.path.isdir(compiled_net.get_path(self.net_file)))
+        self.assertIsInstance(net.edge_ids, np.memmap)
+
+        self.assertDictEqual(dict(net.edges), self.edges)
+        for direction in ["next", "prev"]:
+            self.assertDictEqual(dict(net.connections[direction]),
+                                 self.connections[direction])
+
+        # the scenario returns the same values when using the compiled
+        # network
+        expected = [(self.scenario.edge_length(edge),
+                     self.scenario.num_lanes(edge),
+                     self.scenario.next_edge(edge, 0),
+                     self.scenario.prev_edge(edge, 0))
+                    for edge in self.edges]
+        self.scenario.compiled_net = net
+        actual = [(self.scenario.edge_length(edge),
+                   self.scenario.num_lanes(edge),
+                   self.scenario.next_edge(edge, 0),
+                   self.scenario.prev_edge(edge, 0))
+                  for edge in self.edges]
+        self.assertListEqual(actual, expected)
+        self.assertEqual(self.scenario.edge_length("unknown"), -1001)
+        self.assertListEqual(self.scenario.next_edge("unknown", 0), [])
+
+        # compiled networks are memory-mapped again when unpickled
+        net = pickle.loads(pickle.dumps(net))
+        self.assertIsInstance(net.edge_ids, np.memmap)
+        self.assertDictEqual(dict(net.edges), self.edges)
+
+    def test_recompile(self):
+        net = compiled_net.load(self.net_file, no_internal_links=False)
+        edge = next(iter(self.edges))
+
+        # modify the length of an edge in the .net.xml file
+        with open(self.net_file) as f:
+            contents = f.read()
+        length = 'length="{:.2f}"'.format(net.edge_length(edge))
+        with open(self.net_file, "w") as f:
+            f.write(contents.replace(length, 'length="1234.00"'))
+
+        net = compiled_net.load(self.net_file, no_internal_links=False)
+        self.assertEqual(net.edge_length(edge), 1234)
+
+
 if __name__ == '__main__':
     unittest.main()
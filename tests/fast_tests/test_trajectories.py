@@ -0,0 +1,109 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.core.trajectories import TrajectoryRecorder
+from flow.core.util import load_emission_npz
+
+from tests.setup_scripts import ring_road_exp_setup
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    """Tests the recording of the trajectories of vehicles from within flow
+    (see the "trajectory_path" sumo_params)."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_recorded_states(self):
+        """Ensures that the recorded states match the states of the vehicles
+        at every step, and that steps are recorded at the requested
+        interval."""
+        sumo_params = SumoParams(sim_step=0.1,
+                                 trajectory_path=self.tmp.name,
+                                 trajectory_interval=2)
+        vehicles = Vehicles()
+        vehicles.add(veh_id="idm",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=4)
+        env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                            vehicles=vehicles)
+        # use small buffers, so that several row groups are written
+        env.trajectory_recorder.close()
+        path = env.trajectory_recorder.path
+        env.trajectory_recorder = TrajectoryRecorder(path, interval=2,
+                                                     chunk_size=7)
+
+        ids = env.vehicles.get_ids()
+        expected = {}
+        env.reset()
+        for _ in range(10):
+            env.step(rl_actions=[])
+            if env.time_counter % 2 == 0:
+                expected[env.time_counter] = (
+                    env.vehicles.get_speed(ids), env.vehicles.get_edge(ids))
+        env.reset()
+        env.step(rl_actions=[])
+        env.step(rl_actions=[])
+        env.terminate()
+
+        self.assertEqual(path, os.path.join(
+            self.tmp.name, "{}-trajectory.npz".format(scenario.name)))
+        data = load_emission_npz(path)
+        self.assertListEqual(
+            sorted(data.keys()),
+            sorted(["rollout", "time", "id", "speed", "position", "edge",
+                    "lane", "absolute_position"]))
+        self.assertEqual(len(data["time"]), 6 * len(ids))
+        self.assertGreater(env.trajectory_recorder.num_rows, 7)
+        self.assertListEqual(sorted(set(data["rollout"])), [0, 1])
+
+        for time_counter, (speeds, edges) in expected.items():
+            rows = (data["rollout"] == 0) & \
+                np.isclose(data["time"], time_counter * 0.1)
+            self.assertListEqual(list(data["id"][rows]), ids)
+            self.assertListEqual(list(data["edge"][rows]), edges)
+            np.testing.assert_allclose(data["speed"][rows], speeds,
+                                       rtol=1e-6)
+
+        # rows may be filtered by vehicle
+        data = load_emission_npz(path, columns=["id"], veh_ids=[ids[0]])
+        self.assertEqual(len(data["id"]), 6)
+
+    def test_fields(self):
+        """Ensures that only the requested fields are recorded, and that
+        unknown fields are rejected."""
+        path = os.path.join(self.tmp.name, "trajectory.npz")
+        self.assertRaises(ValueError, TrajectoryRecorder, path,
+                          fields=["unknown"])
+
+        sumo_params = SumoParams(sim_step=0.1,
+                                 trajectory_path=self.tmp.name,
+                                 trajectory_fields=["headway", "leader"])
+        env, _ = ring_road_exp_setup(sumo_params=sumo_params)
+        env.reset()
+        env.step(rl_actions=[])
+        env.step(rl_actions=[])
+        path = env.trajectory_recorder.path
+        env.terminate()
+
+        data = load_emission_npz(path)
+        self.assertListEqual(sorted(data.keys()),
+                             ["headway", "id", "leader", "rollout", "time"])
+        self.assertEqual(len(data["id"]), 2)
+        self.assertTrue(set(data["leader"]) <= set(data["id"]) | {""})
+
+
+if __name__ == '__main__':
+    unittest.main()
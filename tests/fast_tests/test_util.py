@@ -1,8 +1,14 @@
 import unittest
 import csv
+import json
 import os
+import tempfile
 
-from flow.core.util import emission_to_csv
+import numpy as np
+
+from flow.core.util import emission_to_csv, emission_to_npz, \
+    load_emission_npz
+from flow.utils.rllib import get_flow_params
 from flow.utils.warnings import deprecation_warning
 
 os.environ["TEST_FLAG"] = "True"
@@ -47,6 +53,97 @@ class TestEmissionToCSV(unittest.TestCase):
         # I don't think is a problem
         self.assertEqual(len(dict1), 104)
 
+        # rows are sorted by vehicle id, and by time for every vehicle
+        keys = [(row["id"], float(row["time"])) for row in dict1]
+        self.assertListEqual(keys, sorted(keys))
+
+
+class TestEmissionToCSVChunks(unittest.TestCase):
+
+    """Tests that the external merge sort performed by emission_to_csv when
+    the emission file does not fit in a single chunk produces the same csv
+    file, and that rows may be left in the order of the emission file."""
+
+    def test_it_works(self):
+        current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
+        emission_path = current_path + "/test_files/test-emission.xml"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            emission_to_csv(emission_path, tmp + "/full.csv")
+            emission_to_csv(emission_path, tmp + "/chunks.csv", chunk_size=7)
+            emission_to_csv(emission_path, tmp + "/unsorted.csv", sort=False)
+
+            with open(tmp + "/full.csv") as f:
+                full = f.read()
+            with open(tmp + "/chunks.csv") as f:
+                chunks = f.read()
+            with open(tmp + "/unsorted.csv") as f:
+                unsorted = list(csv.DictReader(f))
+
+        self.assertEqual(full, chunks)
+        self.assertEqual(len(unsorted), 104)
+        times = [float(row["time"]) for row in unsorted]
+        self.assertListEqual(times, sorted(times))
+
+
+class TestEmissionToNPZ(unittest.TestCase):
+
+    """Tests that the npz files generated by emission_to_npz contain the same
+    rows as the csv files, and that rows may be filtered by time and
+    vehicle."""
+
+    def setUp(self):
+        current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
+        emission_path = current_path + "/test_files/test-emission.xml"
+
+        self.tmp = tempfile.TemporaryDirectory()
+        emission_to_csv(emission_path, self.tmp.name + "/e.csv")
+        with open(self.tmp.name + "/e.csv") as f:
+            self.rows = list(csv.DictReader(f))
+        # the csv rows are sorted by vehicle, the npz rows by time
+        self.rows.sort(key=lambda row: float(row["time"]))
+        self.path = emission_to_npz(emission_path, self.tmp.name + "/e.npz",
+                                    row_group_size=10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_all_rows(self):
+        data = load_emission_npz(self.path)
+        self.assertEqual(len(data["time"]), 104)
+        self.assertEqual(data["x"].dtype, np.float32)
+        for col in ["time", "x", "speed"]:
+            np.testing.assert_allclose(
+                data[col], [float(row[col]) for row in self.rows], rtol=1e-6)
+        for col in ["id", "edge_id", "lane_number"]:
+            self.assertListEqual([str(v) for v in data[col]],
+                                 [row[col] for row in self.rows])
+
+    def test_filters(self):
+        veh_id = self.rows[0]["id"]
+        data = load_emission_npz(self.path, columns=["time", "id"],
+                                 time_range=(0.2, 0.5), veh_ids=[veh_id])
+        expected = [float(row["time"]) for row in self.rows
+                    if row["id"] == veh_id and
+                    0.2 <= float(row["time"]) <= 0.5]
+        self.assertListEqual(sorted(data.keys()), ["id", "time"])
+        self.assertGreater(len(expected), 0)
+        np.testing.assert_allclose(data["time"], expected)
+        self.assertTrue(np.all(data["id"] == veh_id))
+
+        # filters matching no rows return empty columns
+        data = load_emission_npz(self.path, veh_ids=["unknown"])
+        self.assertEqual(len(data["id"]), 0)
+        data = load_emission_npz(self.path, time_range=(1e6, 2e6))
+        self.assertEqual(len(data["x"]), 0)
+
+        # dictionary-encoded columns may be returned as codes
+        data = load_emission_npz(self.path, columns=["id"], decode=False)
+        self.assertEqual(data["id"].dtype, np.int32)
+
+        self.assertRaises(KeyError, load_emission_npz, self.path,
+                          columns=["unknown"])
+
 
 class TestWarnings(unittest.TestCase):
 
@@ -68,5 +165,34 @@ class TestWarnings(unittest.TestCase):
             deprecation_warning, Foo(), dep_from, dep_to)
 
 
+class TestGetFlowParams(unittest.TestCase):
+    """Tests the parameters loaded from the configuration of an rllib
+    experiment."""
+
+    def test_old_config(self):
+        """Ensures that parameters missing from configurations stored by
+        older versions of flow keep their default values."""
+        flow_params = {
+            "sumo": {"sim_step": 0.2},
+            "env": {"horizon": 100, "additional_params": {}},
+            "net": {"no_internal_links": False, "in_flows": None,
+                    "additional_params": {"length": 230}},
+            "veh": [],
+        }
+        config = {"env_config": {"flow_params": json.dumps(flow_params)}}
+
+        params = get_flow_params(config)
+
+        env = params["env"]
+        self.assertEqual(env.horizon, 100)
+        self.assertFalse(env.snapshot_reset)
+        self.assertFalse(env.preallocate_observations)
+
+        net = params["net"]
+        self.assertEqual(net.additional_params["length"], 230)
+        self.assertFalse(net.no_internal_links)
+        self.assertTrue(net.use_net_cache)
+
+
 if __name__ == '__main__':
     unittest.main()
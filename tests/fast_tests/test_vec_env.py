@@ -0,0 +1,142 @@
+import unittest
+import os
+import numpy as np
+
+from flow.core.params import EnvParams
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.envs import VecEnv
+
+from tests.setup_scripts import ring_road_exp_setup
+
+os.environ["TEST_FLAG"] = "True"
+
+
+def make_env(horizon=10, preallocate_observations=False):
+    vehicles = Vehicles()
+    vehicles.add(veh_id="idm",
+                 acceleration_controller=(IDMController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=3)
+    vehicles.add(veh_id="rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=1)
+    env_params = EnvParams(horizon=horizon,
+                           additional_params={"target_velocity": 8,
+                                              "max_accel": 1,
+                                              "max_decel": 1},
+                           preallocate_observations=preallocate_observations)
+    env, _ = ring_road_exp_setup(vehicles=vehicles, env_params=env_params)
+    return env
+
+
+class TestVecEnv(unittest.TestCase):
+    """Tests the stepping of several environments in parallel."""
+
+    def setUp(self):
+        self.vec_env = VecEnv([make_env, make_env, make_env])
+
+    def tearDown(self):
+        self.vec_env.close()
+
+    def test_ports(self):
+        """Ensures that every environment runs its own sumo instance."""
+        procs = [env.sumo_proc for env in self.vec_env.envs]
+        self.assertEqual(len(set(p.pid for p in procs)), 3)
+
+    def test_step(self):
+        """Ensures that the results of the environments are stacked, and that
+        they match the results of stepping each environment on its own."""
+        obs = self.vec_env.reset()
+        self.assertEqual(obs.shape[0], 3)
+
+        actions = np.array([[0.], [0.5], [1.]])
+        obs, rewards, dones, infos = self.vec_env.step(actions)
+        self.assertEqual(obs.shape[0], 3)
+        self.assertEqual(rewards.shape, (3,))
+        self.assertEqual(dones.dtype, bool)
+        self.assertEqual(len(infos), 3)
+
+        for i, env in enumerate(self.vec_env.envs):
+            np.testing.assert_array_almost_equal(obs[i], env.state)
+            self.assertEqual(env.time_counter, 1)
+
+    def test_auto_reset(self):
+        """Ensures that environments are reset once they reach the horizon."""
+        self.vec_env.reset()
+        actions = np.zeros((3, 1))
+        for _ in range(9):
+            _, _, dones, _ = self.vec_env.step(actions)
+            self.assertFalse(np.any(dones))
+
+        obs, _, dones, infos = self.vec_env.step(actions)
+        self.assertTrue(np.all(dones))
+        for i, env in enumerate(self.vec_env.envs):
+            self.assertIn("terminal_observation", infos[i])
+            self.assertEqual(env.time_counter, 0)
+            np.testing.assert_array_almost_equal(obs[i], env.state)
+
+    def test_asynchronous(self):
+        """Ensures that stepping the environments within an event loop
+        matches stepping them in separate threads."""
+        vec_env = VecEnv([make_env, make_env, make_env], asynchronous=True)
+        obs = vec_env.reset()
+        expected_obs = self.vec_env.reset()
+        np.testing.assert_array_almost_equal(obs, expected_obs)
+
+        actions = np.array([[0.], [0.5], [1.]])
+        for _ in range(12):
+            obs, rewards, dones, _ = vec_env.step(actions)
+            expected_obs, expected_rewards, expected_dones, _ = \
+                self.vec_env.step(actions)
+            np.testing.assert_array_almost_equal(obs, expected_obs)
+            np.testing.assert_array_almost_equal(rewards, expected_rewards)
+            np.testing.assert_array_equal(dones, expected_dones)
+
+        vec_env.close()
+
+    def test_preallocated_observations(self):
+        """Ensures that environments preallocating their observations write
+        them into the rows of a single array, and that these observations
+        match the stacked observations of the other environments."""
+        def make_preallocated_env():
+            return make_env(preallocate_observations=True)
+
+        vec_env = VecEnv([make_preallocated_env] * 3)
+        for i, env in enumerate(vec_env.envs):
+            self.assertTrue(np.shares_memory(env.observation_buffer,
+                                             vec_env.observations[i]))
+
+        obs = vec_env.reset()
+        expected_obs = self.vec_env.reset()
+        self.assertIs(obs, vec_env.observations)
+        self.assertEqual(obs.dtype, np.float32)
+        np.testing.assert_array_almost_equal(
+            obs, expected_obs.reshape(obs.shape), decimal=5)
+
+        actions = np.array([[0.], [0.5], [1.]])
+        for _ in range(10):
+            obs, _, dones, infos = vec_env.step(actions)
+            expected_obs, _, _, expected_infos = self.vec_env.step(actions)
+            np.testing.assert_array_almost_equal(
+                obs, expected_obs.reshape(obs.shape), decimal=5)
+
+        # the terminal observations are not overwritten by the reset
+        self.assertTrue(np.all(dones))
+        for info, expected_info in zip(infos, expected_infos):
+            np.testing.assert_array_almost_equal(
+                info["terminal_observation"],
+                np.ravel(expected_info["terminal_observation"]), decimal=5)
+
+        vec_env.close()
+
+    def test_num_actions(self):
+        """Ensures that one action must be provided per environment."""
+        self.assertRaises(ValueError, self.vec_env.step, np.zeros((2, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,10 +3,14 @@ import os
 import numpy as np
 
 from flow.core.vehicles import Vehicles
-from flow.core.params import SumoCarFollowingParams, NetParams, InitialConfig
+from flow.core.counters import RollingCounter
+from flow.core.lanes import LaneGraph, LaneIndex, lane_headways
+from flow.core.params import SumoCarFollowingParams, NetParams, \
+    InitialConfig, SumoParams
 from flow.controllers.car_following_models import IDMController, \
     SumoCarFollowingController
 from flow.controllers.lane_change_controllers import StaticLaneChanger
+from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.rlcontroller import RLController
 
 from tests.setup_scripts import ring_road_exp_setup
@@ -215,6 +219,186 @@ class TestMultiLaneData(unittest.TestCase):
         pass
 
 
+class TestLaneHeadways(unittest.TestCase):
+    """Tests the batch computation of lane leaders and followers in
+    flow.core.lanes."""
+
+    class _TwoEdgeLoop:
+        """Two-lane loop with edges "a" and "b" of length 100."""
+
+        def get_edge_list(self):
+            return ["a", "b"]
+
+        def get_junction_list(self):
+            return []
+
+        def num_lanes(self, edge):
+            return 2
+
+        def edge_length(self, edge):
+            return 100
+
+        def next_edge(self, edge, lane):
+            return [("b" if edge == "a" else "a", lane)]
+
+        def prev_edge(self, edge, lane):
+            return [("b" if edge == "a" else "a", lane)]
+
+    def test_lane_headways(self):
+        graph = LaneGraph(self._TwoEdgeLoop())
+        ids = ["ego", "same_lane", "last_in_lane", "next_edge", "missing"]
+        nodes = graph.nodes(["a", "a", "a", "b", ""], [0, 0, 1, 0, 0])
+        positions = [10, 50, 20, 30, 0]
+        lengths = [5] * 5
+
+        order, headways, tailways, leaders, followers = lane_headways(
+            graph, ids, nodes, positions, lengths, query=[0])
+
+        # vehicles that are not in the network are not sorted
+        self.assertListEqual([ids[i] for i in order],
+                             ["ego", "same_lane", "last_in_lane", "next_edge"])
+
+        # the only vehicle ahead in an adjacent lane is a valid leader
+        self.assertListEqual(leaders[0], ["same_lane", "last_in_lane"])
+        np.testing.assert_array_almost_equal(headways[0], [35, 5])
+
+        # followers are found by looking at the previous edges, all the way
+        # around the loop if needed
+        self.assertListEqual(followers[0], ["next_edge", "last_in_lane"])
+        np.testing.assert_array_almost_equal(tailways[0], [75, 185])
+
+
+class TestLaneIndex(unittest.TestCase):
+    """Tests the incremental edge/lane index in flow.core.lanes."""
+
+    def test_update(self):
+        index = LaneIndex()
+        pos = {"a": 20, "b": 10, "c": 5}
+        index.update(["a", "b", "c"], ["e1", "e1", "e2"], [0, 0, 1],
+                     pos.__getitem__)
+        self.assertListEqual(index.get_ids_by_lane("e1", 0), ["b", "a"])
+        self.assertListEqual(index.get_ids_by_edge("e2"), ["c"])
+        self.assertEqual(index.num_moved, 3)
+
+        # vehicles that do not move are not looked at, and the previous
+        # order is reused
+        version = index.version
+        pos.update({"a": 25, "b": 15, "c": 10})
+        index.update([], [], [], pos.__getitem__)
+        self.assertEqual(index.num_moved, 0)
+        self.assertEqual(index.version, version)
+
+        # lane changes, arrivals, and departures
+        pos.update({"a": 26, "c": 0, "d": 0})
+        index.remove("b")
+        index.update(["a", "c", "d"], ["e1", "e1", "e2"], [1, 0, 1],
+                     pos.__getitem__)
+        self.assertListEqual(index.get_ids_by_edge("e1"), ["c", "a"])
+        self.assertListEqual(index.get_ids_by_lane("e1", 1), ["a"])
+        self.assertListEqual(index.get_ids_by_edge("e2"), ["d"])
+        self.assertEqual(index.num_moved, 5)
+        self.assertGreater(index.version, version)
+
+        # vehicles are inserted between the vehicles of a lane
+        pos.update({"e": 10, "f": 5, "g": 20})
+        index.update(["e", "f", "g"], ["e2"] * 3, [1] * 3, pos.__getitem__)
+        self.assertListEqual(index.get_ids_by_lane("e2", 1),
+                             ["d", "f", "e", "g"])
+
+        # vehicles that changed order next to an inserted vehicle are
+        # re-sorted
+        pos.update({"d": 12, "h": 8})
+        index.update(["h"], ["e2"], [1], pos.__getitem__)
+        self.assertListEqual(index.get_ids_by_lane("e2", 1),
+                             ["f", "h", "e", "d", "g"])
+
+        # vehicles that exit the network are removed
+        index.update(["g"], [""], [0], pos.__getitem__)
+        self.assertListEqual(index.get_ids_by_lane("e2", 1),
+                             ["f", "h", "e", "d"])
+
+    def test_sorted_ids(self):
+        """Ensures that the order of all vehicles is only computed again
+        after vehicles move."""
+        graph = LaneGraph(TestLaneHeadways._TwoEdgeLoop())
+        pos = {"a": 20, "b": 10, "c": 5}
+        index = LaneIndex()
+        index.update(["a", "b", "c"], ["b", "a", "a"], [0, 0, 1],
+                     pos.__getitem__)
+        order = index.sorted_ids(graph)
+        self.assertListEqual(order, ["b", "c", "a"])
+        self.assertIs(index.sorted_ids(graph), order)
+
+        index.update(["c"], ["b"], [0], {"a": 20, "c": 30}.__getitem__)
+        self.assertListEqual(index.sorted_ids(graph), ["b", "a", "c"])
+
+    def test_matches_sorting(self):
+        """Ensures that the index and the lane data of the rl vehicles match
+        the ones computed from the states of all vehicles at every step, as
+        vehicles change lanes."""
+        for columnar in (False, True):
+            net_params = NetParams(additional_params={
+                "length": 230, "lanes": 3, "speed_limit": 30,
+                "resolution": 40})
+            vehicles = Vehicles(columnar=columnar)
+            vehicles.add(veh_id="idm",
+                         acceleration_controller=(IDMController, {}),
+                         routing_controller=(ContinuousRouter, {}),
+                         num_vehicles=15)
+            vehicles.add(veh_id="rl",
+                         acceleration_controller=(RLController, {}),
+                         routing_controller=(ContinuousRouter, {}),
+                         num_vehicles=3)
+            env, _ = ring_road_exp_setup(net_params=net_params,
+                                         vehicles=vehicles)
+            env.reset()
+
+            num_moved = 0
+            for t in range(200):
+                if t % 20 == 0:
+                    human_ids = env.vehicles.get_human_ids()
+                    env.apply_lane_change(human_ids,
+                                          [(-1) ** i for i in
+                                           range(len(human_ids))])
+                env.step(rl_actions=[1, 1, 1])
+                veh = env.vehicles
+                num_moved += veh._lane_index.num_moved
+                ids = veh.get_ids()
+                edges = list(veh.get_edge(ids))
+                lanes = list(veh.get_lane(ids))
+                positions = veh.get_position(ids)
+
+                for edge, lane in set(zip(edges, lanes)):
+                    expected = sorted(
+                        (pos, veh_id) for veh_id, e, l, pos in
+                        zip(ids, edges, lanes, positions)
+                        if e == edge and l == lane)
+                    self.assertListEqual(veh.get_ids_by_lane(edge, lane),
+                                         [veh_id for _, veh_id in expected])
+
+                graph = veh._get_lane_graph(env)
+                nodes = graph.nodes(edges, lanes)
+                rl_ids = veh.get_rl_ids()
+                query = [ids.index(veh_id) for veh_id in rl_ids]
+                _, headways, tailways, leaders, followers = lane_headways(
+                    graph, ids, nodes, positions, veh.get_length(ids), query)
+                for i, veh_id in enumerate(rl_ids):
+                    self.assertListEqual(veh.get_lane_leaders(veh_id),
+                                         leaders[i])
+                    self.assertListEqual(veh.get_lane_followers(veh_id),
+                                         followers[i])
+                    np.testing.assert_array_almost_equal(
+                        veh.get_lane_headways(veh_id), headways[i])
+                    np.testing.assert_array_almost_equal(
+                        veh.get_lane_tailways(veh_id), tailways[i])
+
+            # only the vehicles that changed edge or lane were moved
+            self.assertGreater(num_moved, 0)
+            self.assertLess(num_moved, 200 * len(ids))
+
+            env.terminate()
+
+
 class TestIdsByEdge(unittest.TestCase):
     """
     Tests the ids_by_edge() method
@@ -239,6 +423,115 @@ class TestIdsByEdge(unittest.TestCase):
         self.assertCountEqual(ids, expected_ids)
 
 
+class TestColumnarVehicles(unittest.TestCase):
+    """Tests the columnar storage of vehicle states (Vehicles(columnar=True)).
+    """
+
+    def test_slot_reuse(self):
+        """Ensures that the rows of removed vehicles are reused by new
+        vehicles, and that the table grows when it runs out of rows."""
+        vehicles = Vehicles(columnar=True)
+        vehicles.add("test", num_vehicles=3)
+        table = vehicles._table
+
+        row = table.row("test_1")
+        vehicles.remove("test_1")
+        self.assertEqual(table.row("test_1"), -1)
+        self.assertEqual(table.add("test_new"), row)
+
+        capacity = table.capacity
+        for i in range(capacity):
+            table.add("extra_%d" % i)
+        self.assertGreater(table.capacity, capacity)
+        self.assertEqual(len(table), capacity + 3)
+
+    def test_getters_match_dict_backend(self):
+        """Ensures that the columnar getters return the same values as the
+        dict-based getters, and that lists of ids return numpy arrays."""
+        def make_vehicles(columnar):
+            vehicles = Vehicles(columnar=columnar)
+            vehicles.add(veh_id="idm", acceleration_controller=(IDMController,
+                                                                {}),
+                         num_vehicles=10)
+            vehicles.add(veh_id="rl", acceleration_controller=(RLController,
+                                                               {}),
+                         num_vehicles=1)
+            return vehicles
+
+        env_dict, _ = ring_road_exp_setup(vehicles=make_vehicles(False))
+        env_col, _ = ring_road_exp_setup(vehicles=make_vehicles(True))
+
+        for env in (env_dict, env_col):
+            env.reset()
+            for _ in range(10):
+                env.step(rl_actions=[0])
+
+        ids = env_dict.vehicles.get_ids()
+        self.assertListEqual(ids, env_col.vehicles.get_ids())
+
+        for getter in ["get_speed", "get_position", "get_absolute_position",
+                       "get_headway", "get_length", "get_lane"]:
+            expected = getattr(env_dict.vehicles, getter)(ids)
+            actual = getattr(env_col.vehicles, getter)(ids)
+            self.assertIsInstance(actual, np.ndarray)
+            np.testing.assert_array_almost_equal(actual, expected)
+            self.assertAlmostEqual(getattr(env_col.vehicles, getter)(ids[0]),
+                                   expected[0])
+
+        for getter in ["get_edge", "get_leader", "get_follower"]:
+            expected = getattr(env_dict.vehicles, getter)(ids)
+            actual = getattr(env_col.vehicles, getter)(ids)
+            self.assertListEqual(list(actual), expected)
+
+        # missing vehicles are assigned the error value
+        np.testing.assert_array_equal(
+            env_col.vehicles.get_speed([ids[0], "missing"], error=-1),
+            [env_dict.vehicles.get_speed(ids[0]), -1])
+
+        env_dict.terminate()
+        env_col.terminate()
+
+
+class TestContextSubscriptions(unittest.TestCase):
+    """Tests the collection of vehicle states through a single context
+    subscription (SumoParams(subscription_mode="context"))."""
+
+    def test_matches_vehicle_subscriptions(self):
+        """Ensures that the states, leaders, and headways of the vehicles
+        match those obtained when subscribing every vehicle individually."""
+        envs = []
+        for mode in ["vehicle", "context"]:
+            vehicles = Vehicles()
+            vehicles.add(veh_id="idm", acceleration_controller=(IDMController,
+                                                                {}),
+                         num_vehicles=10)
+            vehicles.add(veh_id="rl", acceleration_controller=(RLController,
+                                                               {}),
+                         num_vehicles=1)
+            sumo_params = SumoParams(sim_step=0.1, subscription_mode=mode)
+            env, _ = ring_road_exp_setup(sumo_params=sumo_params,
+                                         vehicles=vehicles)
+            env.reset()
+            envs.append(env)
+
+        for _ in range(20):
+            for env in envs:
+                env.step(rl_actions=[1])
+
+            ids = envs[0].vehicles.get_ids()
+            self.assertListEqual(ids, envs[1].vehicles.get_ids())
+            for getter in ["get_speed", "get_position", "get_headway"]:
+                np.testing.assert_array_almost_equal(
+                    getattr(envs[1].vehicles, getter)(ids),
+                    getattr(envs[0].vehicles, getter)(ids))
+            for getter in ["get_edge", "get_leader", "get_follower"]:
+                self.assertListEqual(getattr(envs[1].vehicles, getter)(ids),
+                                     getattr(envs[0].vehicles, getter)(ids))
+
+        for env in envs:
+            env.terminate()
+
+
 class TestObservedIDs(unittest.TestCase):
     """Tests the observed_ids methods, which are used for visualization."""
 
@@ -269,5 +562,49 @@ class TestObservedIDs(unittest.TestCase):
         self.assertCountEqual(vehicles.get_observed_ids(), ["test_1"])
 
 
+class TestFlowRates(unittest.TestCase):
+    """Tests the inflow and outflow rates of the vehicles class, and the
+    rolling counters they are computed from."""
+
+    def test_rolling_counter(self):
+        counter = RollingCounter(capacity=5)
+        self.assertEqual(len(counter), 0)
+        self.assertEqual(counter.last(), 0)
+        self.assertEqual(counter.sum(3), 0)
+
+        counts = [3, 0, 1, 4, 1, 5, 9, 2, 6]
+        for i, count in enumerate(counts):
+            counter.append(count)
+            seen = counts[:i + 1][-5:]
+            self.assertEqual(len(counter), len(seen))
+            self.assertEqual(counter.last(), count)
+            for k in range(7):
+                self.assertEqual(counter.sum(k), sum(seen[-k:]) if k else 0)
+
+        counter.clear()
+        self.assertEqual(len(counter), 0)
+        counter.append(7)
+        self.assertEqual(counter.sum(5), 7)
+
+    def test_rates(self):
+        vehicles = Vehicles()
+        vehicles.sim_step = 0.5
+        self.assertEqual(vehicles.get_outflow_rate(10), 0)
+
+        arrived = [1, 0, 2, 3]
+        for count in arrived:
+            vehicles._num_arrived.append(count)
+            vehicles._num_departed.append(1)
+
+        self.assertEqual(vehicles.get_num_arrived(), 3)
+        # last two steps (1 second)
+        self.assertAlmostEqual(vehicles.get_outflow_rate(1), 3600 * 5)
+        # windows longer than the history, or of less than one step, cover
+        # all steps
+        self.assertAlmostEqual(vehicles.get_outflow_rate(100), 3600 * 3)
+        self.assertAlmostEqual(vehicles.get_outflow_rate(0.1), 3600 * 3)
+        self.assertAlmostEqual(vehicles.get_inflow_rate(1), 3600 * 2)
+
+
 if __name__ == '__main__':
     unittest.main()